@@ -9,52 +9,34 @@ import threading
 import os
 from PIL import Image, ImageTk
 import webbrowser
-import pandas as pd
 from io import BytesIO
 import re
 import asyncio
 import aiohttp
-from playwright.async_api import async_playwright
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import spacy
-from transformers import pipeline
-import cv2
-import pytesseract
-from langchain.llms import OpenAI
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
-import nltk
-from nltk.sentiment import SentimentIntensityAnalyzer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-import numpy as np
-from pytube import YouTube
-import moviepy.editor as mp
 import cssselect
 import lxml.html
 import html5lib
-from webdriver_manager.chrome import ChromeDriverManager
-import scrapy
-from scrapy.crawler import CrawlerProcess
-from scrapy.utils.project import get_project_settings
 import logging
 from pathlib import Path
 import shutil
 import tempfile
 import mimetypes
 import magic
-import chardet
 import concurrent.futures
 from urllib3.util.retry import Retry
 from requests.adapters import HTTPAdapter
 import time
 import random
 import string
+from parsing import make_soup, PARSER_BACKENDS, resolve_parser
+from text_encoding import decode_html, header_charset
+from capabilities import build_registry, WARM_CAPABILITIES
+from thumbnails import ThumbnailPipeline, DRAIN_INTERVAL_MS
+from virtual_view import VirtualTreeview, TableBrowser
+from extraction import extract_page
+from tables import typed_tables, export_tables, EXPORT_FORMATS
+from crawl_frontier import CrawlFrontier, crawl_dir_for, run_crawl, engine_page_loader, MAX_DEPTH
 
 # Load environment variables
 load_dotenv()
@@ -74,9 +56,8 @@ class ModernWebScraperGUI:
         # Configure root window
         self.root.configure(bg=self.bg_color)
         
-        # Initialize AI models and scraping tools
-        self.initialize_ai_models()
-        self.initialize_scraping_tools()
+        # NLP, OCR, video and browser support are imported on first use
+        self.capabilities = build_registry()
         
         # Configure style
         self.style = ttk.Style()
@@ -102,11 +83,37 @@ class ModernWebScraperGUI:
         self.scraped_data = {}
         self.current_url = ""
         self.is_scraping = False
+        self.table_records = []
+        self.crawl_links = []
+        self.pause_event = threading.Event()
         self.selenium_driver = None
-        self.playwright_browser = None
+        self.browser_pool = None
         self.download_dir = Path(tempfile.mkdtemp())
         self.session = self.create_session()
         
+        # Images are downloaded and decoded off the Tk thread; finished
+        # thumbnails are picked up here in small batches
+        self.thumbnails = ThumbnailPipeline()
+        self.thumbnail_batch = None
+        self.image_count = 0
+        self.root.after(DRAIN_INTERVAL_MS, self.drain_thumbnails)
+        
+        # Optionally load heavy capabilities once the window is showing
+        if WARM_CAPABILITIES:
+            self.root.after(500, self.warm_capabilities)
+        
+    def warm_capabilities(self):
+        def loaded(name, ok):
+            message = f"{name} support ready" if ok else f"{name} support unavailable"
+            self.root.after(0, lambda: self.status_var.set(message))
+        self.capabilities.warm(WARM_CAPABILITIES, on_done=loaded)
+        
+    def capability(self, name):
+        """Return a capability, telling the user when it has to be loaded first"""
+        if not self.capabilities.is_loaded(name):
+            self.root.after(0, lambda: self.status_var.set(f"Loading {name} support..."))
+        return self.capabilities.get(name)
+        
     def create_header(self):
         header_frame = ttk.Frame(self.main_frame)
         header_frame.pack(fill=tk.X, pady=(0, 20))
@@ -144,6 +151,11 @@ class ModernWebScraperGUI:
                                       style='Accent.TButton')
         self.scrape_button.pack(side=tk.LEFT, padx=5)
         
+        # Stops a crawl at its next checkpoint; scraping again resumes it
+        self.pause_button = ttk.Button(button_frame, text="⏸️ Pause",
+                                     command=self.pause_crawl, state='disabled')
+        self.pause_button.pack(side=tk.LEFT, padx=5)
+                
         self.save_button = ttk.Button(button_frame, text="💾 Save All", 
                                     command=self.save_all_content)
         self.save_button.pack(side=tk.LEFT, padx=5)
@@ -199,6 +211,16 @@ class ModernWebScraperGUI:
                                   textvariable=self.depth_var, width=5)
         depth_spinbox.pack(side=tk.LEFT)
         
+        # Add parser backend option
+        parser_frame = ttk.Frame(options_frame)
+        parser_frame.pack(side=tk.RIGHT, padx=20)
+        ttk.Label(parser_frame, text="🧩 Parser:").pack(side=tk.LEFT)
+        self.parser_var = tk.StringVar(value=resolve_parser())
+        parser_combobox = ttk.Combobox(parser_frame, values=PARSER_BACKENDS,
+                                     textvariable=self.parser_var,
+                                     state='readonly', width=12)
+        parser_combobox.pack(side=tk.LEFT)
+        
     def create_results_section(self):
         results_frame = ttk.Frame(self.main_frame)
         results_frame.pack(fill=tk.BOTH, expand=True, pady=10)
@@ -246,56 +268,61 @@ class ModernWebScraperGUI:
         return scrollable_frame
         
     def process_images(self, soup):
-        images = soup.find_all('img')
-        row = 0
-        col = 0
-        max_cols = 4
+        image_urls = []
         
-        for img in images:
-            try:
-                img_url = img.get('src', '')
-                if not img_url:
-                    continue
-                    
-                if not img_url.startswith(('http://', 'https://')):
-                    img_url = urljoin(self.current_url, img_url)
-                    
-                # Create image card
-                card_frame = ttk.Frame(self.tabs['images'], padding=10, 
-                                     style='Card.TFrame')
-                card_frame.grid(row=row, column=col, padx=10, pady=10, 
-                              sticky="nsew")
+        for img in soup.find_all('img'):
+            img_url = img.get('src', '')
+            if not img_url:
+                continue
                 
-                # Download image
-                response = self.session.get(img_url)
-                if response.status_code == 200:
-                    # Convert to PhotoImage
-                    img_data = Image.open(BytesIO(response.content))
-                    img_data.thumbnail((200, 200))
-                    photo = ImageTk.PhotoImage(img_data)
-                    
-                    # Create label with image
-                    label = ttk.Label(card_frame, image=photo)
-                    label.image = photo  # Keep reference
-                    label.pack()
-                    
-                    # Add URL label
-                    url_label = ttk.Label(card_frame, text=img_url, 
-                                        wraplength=200)
-                    url_label.pack()
-                    
-                    # Add download button
-                    download_btn = ttk.Button(card_frame, text="⬇️ Download",
-                                           command=lambda u=img_url: self.download_image(u))
-                    download_btn.pack(pady=5)
-                    
-                col += 1
-                if col >= max_cols:
-                    col = 0
-                    row += 1
-                    
-            except Exception as e:
-                print(f"Error processing image: {str(e)}")
+            if not img_url.startswith(('http://', 'https://')):
+                img_url = urljoin(self.current_url, img_url)
+                
+            image_urls.append(img_url)
+            
+        # Downloads and decoding run in the background; see drain_thumbnails
+        self.thumbnails.start(image_urls)
+        
+    def drain_thumbnails(self):
+        if self.thumbnail_batch != self.thumbnails.batch:
+            # A new scrape started: clear the previous image cards
+            for widget in self.tabs['images'].winfo_children():
+                widget.destroy()
+            self.thumbnail_batch = self.thumbnails.batch
+            self.image_count = 0
+            
+        self.thumbnails.drain(self.add_image_card)
+        self.root.after(DRAIN_INTERVAL_MS, self.drain_thumbnails)
+        
+    def add_image_card(self, img_url, thumbnail):
+        if thumbnail is None:
+            return
+            
+        max_cols = 4
+        row, col = divmod(self.image_count, max_cols)
+        self.image_count += 1
+        
+        # Create image card
+        card_frame = ttk.Frame(self.tabs['images'], padding=10, 
+                             style='Card.TFrame')
+        card_frame.grid(row=row, column=col, padx=10, pady=10, 
+                      sticky="nsew")
+        
+        # Create label with image
+        photo = ImageTk.PhotoImage(thumbnail)
+        label = ttk.Label(card_frame, image=photo)
+        label.image = photo  # Keep reference
+        label.pack()
+        
+        # Add URL label
+        url_label = ttk.Label(card_frame, text=img_url, 
+                            wraplength=200)
+        url_label.pack()
+        
+        # Add download button
+        download_btn = ttk.Button(card_frame, text="⬇️ Download",
+                               command=lambda u=img_url: self.download_image(u))
+        download_btn.pack(pady=5)
                 
     def download_image(self, url):
         try:
@@ -356,7 +383,7 @@ class ModernWebScraperGUI:
                 # Add video preview (thumbnail for YouTube)
                 if 'youtube' in src.lower():
                     try:
-                        yt = YouTube(src)
+                        yt = self.capability('video').YouTube(src)
                         thumbnail_url = yt.thumbnail_url
                         response = self.session.get(thumbnail_url)
                         if response.status_code == 200:
@@ -381,6 +408,62 @@ class ModernWebScraperGUI:
             except Exception as e:
                 print(f"Error processing video: {str(e)}")
                 
+    def create_links_tab(self):
+        frame = ttk.Frame(self.notebook)
+        self.notebook.add(frame, text="🔗 Links")
+        
+        # Only the rows on screen exist as Treeview items
+        view = VirtualTreeview(frame, columns=('URL', 'Link Text'), column_width=500)
+        view.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        return view
+        
+    def process_links(self, soup):
+        rows = []
+        for link in soup.find_all('a', href=True):
+            rows.append((urljoin(self.current_url, link['href']), link.get_text().strip()))
+            
+        # Widgets are only touched from the Tk main thread
+        self.root.after(0, self.tabs['links'].set_rows, rows)
+        
+    def create_tables_tab(self):
+        frame = ttk.Frame(self.notebook)
+        self.notebook.add(frame, text="📊 Tables")
+        
+        # Export every table of the page at once
+        export_frame = ttk.Frame(frame)
+        export_frame.pack(fill=tk.X, padx=10)
+        for fmt in EXPORT_FORMATS:
+            ttk.Button(export_frame, text=f"💾 Export {fmt.upper()}",
+                       command=lambda fmt=fmt: self.export_tables(fmt)).pack(side=tk.RIGHT, padx=5)
+        
+        # One virtual view shared by every table on the page
+        browser = TableBrowser(frame)
+        browser.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        return browser
+        
+    def process_tables(self, soup):
+        # Types are inferred per column, so numbers and dates sort as such
+        self.table_records = typed_tables(extract_page(soup, ('tables',))['tables'])
+        self.root.after(0, self.tabs['tables'].set_records, self.table_records)
+        
+    def export_tables(self, fmt):
+        records = self.table_records
+        if not records:
+            messagebox.showinfo("Export", "No tables to export")
+            return
+            
+        directory = filedialog.askdirectory()
+        if not directory:
+            return
+            
+        paths = export_tables(records, directory, fmt)
+        if len(paths) == len(records):
+            messagebox.showinfo("Export", f"Exported {len(paths)} tables to {directory}")
+        else:
+            messagebox.showerror("Export", f"Exported {len(paths)} of {len(records)} tables; see the log for errors")
+        
     def create_status_bar(self):
         status_frame = ttk.Frame(self.main_frame)
         status_frame.pack(fill=tk.X, pady=10)
@@ -406,24 +489,121 @@ class ModernWebScraperGUI:
             url = 'https://' + url
             
         self.current_url = url
+        
+        # Depth 1 scrapes the page itself; deeper crawls follow its links
+        depth = self.crawl_depth()
+        target, args = self.scrape_website, ()
+        if depth > 1:
+            crawl_dir = crawl_dir_for(url, depth)
+            if CrawlFrontier.exists(crawl_dir) and not messagebox.askyesno(
+                    "Resume crawl", f"An unfinished crawl of {url} was found. Resume it?"):
+                CrawlFrontier.remove(crawl_dir)
+            target, args = self.crawl_website, (CrawlFrontier(crawl_dir, url, depth),)
+            
         self.is_scraping = True
         self.status_var.set("Scraping...")
         self.progress_var.set(0)
         self.scrape_button.config(state='disabled')
         
         # Start scraping in a separate thread
-        threading.Thread(target=self.scrape_website, daemon=True).start()
+        threading.Thread(target=target, args=args, daemon=True).start()
         
+    def crawl_depth(self):
+        try:
+            return max(1, min(int(self.depth_var.get()), MAX_DEPTH))
+        except ValueError:
+            return 1
+            
+    def pause_crawl(self):
+        self.pause_event.set()
+        self.pause_button.config(state='disabled')
+        self.status_var.set("Pausing after the current pages...")
+        
+    def crawl_website(self, frontier):
+        self.pause_event.clear()
+        self.root.after(0, self.start_crawl_views)
+        self.root.after(0, lambda: self.pause_button.config(state='normal'))
+        parser = self.parser_var.get()
+        collectors = ('links', 'images', 'tables')
+        
+        def handle_page(url, depth, content):
+            page = extract_page(make_soup(content, parser, collectors), collectors)
+            links = [(urljoin(url, link['url']), link['text'].strip()) for link in page['links'] if link['url']]
+            images = [urljoin(url, img['src']) for img in page['images'] if img['src']]
+            tables = typed_tables(page['tables']) if self.options['tables'][1].get() else []
+            self.root.after(0, self.add_crawled_page, links, images, tables)
+            return [link for link, _ in links]
+            
+        def batch_done(stats):
+            # Progress is measured against everything found so far
+            total = stats['visited'] + stats['pending']
+            message = f"Crawled {stats['visited']} pages, {stats['pending']} queued"
+            self.root.after(0, self.refresh_crawl_views, message, 100 * stats['visited'] / max(1, total))
+            
+        status = 'failed'
+        try:
+            status = run_crawl(frontier, engine_page_loader(self.thumbnails.engine), handle_page,
+                               self.pause_event, batch_done)
+            if frontier.finished:
+                status = 'done'
+        except Exception as e:
+            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+        finally:
+            frontier.close()
+            if status == 'done':
+                CrawlFrontier.remove(frontier.directory)
+            self.root.after(0, self.finish_crawl, status)
+            
+    def start_crawl_views(self):
+        self.crawl_links = []
+        self.table_records = []
+        self.crawled_images = set()
+        self.thumbnails.start([])
+        
+    def add_crawled_page(self, links, images, tables):
+        # Images are added page by page; the links and tables views are
+        # refreshed once per batch
+        if self.options['images'][1].get():
+            new_images = [img_url for img_url in images if img_url not in self.crawled_images]
+            self.crawled_images.update(new_images)
+            self.thumbnails.extend(new_images)
+        self.crawl_links.extend(links)
+        self.table_records.extend(tables)
+        
+    def refresh_crawl_views(self, message, progress):
+        if self.options['links'][1].get():
+            self.tabs['links'].set_rows(self.crawl_links)
+        if self.options['tables'][1].get():
+            self.tabs['tables'].set_records(self.table_records)
+        self.progress_var.set(progress)
+        self.status_var.set(message)
+        
+    def finish_crawl(self, status):
+        self.is_scraping = False
+        self.scrape_button.config(state='normal')
+        self.pause_button.config(state='disabled')
+        if status == 'paused':
+            self.status_var.set("Crawl paused; scrape the same URL with the same depth to resume")
+        elif status == 'done':
+            self.progress_var.set(100)
+            self.status_var.set(f"Crawl completed! {self.status_var.get()}")
+        else:
+            self.status_var.set("Error occurred")
+                    
     def scrape_website(self):
         try:
             # Get page content using appropriate method
             if self.options['javascript'].get():
-                content = self.scrape_with_selenium()
+                # Pooled browsers stay up between scrapes
+                if self.browser_pool is None:
+                    self.browser_pool = self.capability('browser').get_browser_pool()
+                content = self.browser_pool.render(self.current_url)
             else:
                 response = self.session.get(self.current_url)
-                content = response.text
+                # Decoded once from the bytes; requests would run detection over the whole body
+                content = decode_html(response.content, header_charset(response.headers.get('Content-Type')))
                 
-            soup = BeautifulSoup(content, 'html.parser')
+            soup = make_soup(content, self.parser_var.get())
             
             # Process all content types
             self.process_all_content(soup)
@@ -443,8 +623,9 @@ class ModernWebScraperGUI:
         # Clean up resources
         if self.selenium_driver:
             self.selenium_driver.quit()
-        if self.playwright_browser:
-            asyncio.run(self.playwright_browser.close())
+        if self.browser_pool:
+            self.browser_pool.close()
+        self.thumbnails.close()
         # Clean up download directory
         if self.download_dir.exists():
             shutil.rmtree(self.download_dir)
@@ -1,19 +1,15 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response
 from flask_socketio import SocketIO
 import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse, urljoin
 import os
 import json
-from datetime import datetime
-import threading
 import tempfile
 from pathlib import Path
 import shutil
 from pytube import YouTube
 import asyncio
 import aiohttp
-from playwright.async_api import async_playwright
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
@@ -25,8 +21,21 @@ from requests.adapters import HTTPAdapter
 import re
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from functools import lru_cache
 import hashlib
+import itertools
+from fetch_engine import AsyncFetchEngine
+from extraction import collectors_for_options
+from tables import typed_tables, export_table, EXPORT_FORMATS
+from parse_pool import ParsePool
+from stream_parse import extract_stream
+from text_encoding import header_charset
+from response_cache import ResponseCache, get_header
+from blob_store import BlobStore
+from jobs import JobManager, JobQueueFull
+from scrape_store import ScrapeStore, SEARCH_LIMIT
+from browser_pool import get_browser_pool
+from content_export import export_files, stream_archive, resolve_export_dir, ARCHIVE_FORMATS, ARCHIVE_TYPES
+from crawl_frontier import CrawlFrontier, run_crawl, MAX_DEPTH, DEFAULT_MAX_PAGES
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key'
@@ -36,131 +45,154 @@ socketio = SocketIO(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Scrape store searched by /search; the command line tool and the crawl
+# workers write to it
+SEARCH_STORE = os.environ.get('SCRAPER_STORE', 'scraped_data.db')
+
+def crawl_depth(options):
+    """How many levels of links a job follows; 1 scrapes just its page"""
+    try:
+        return max(1, min(int(options.get('depth') or 1), MAX_DEPTH))
+    except (TypeError, ValueError):
+        return 1
+
+def page_collectors(options):
+    """Collectors for the enabled options, so only the parts of the tree they need are built"""
+    enabled = {name: options.get(name, True) for name in ('text', 'images', 'videos', 'metadata')}
+    enabled['links'] = enabled['text'] or crawl_depth(options) > 1
+    enabled['tables'] = options.get('tables', False)
+    return collectors_for_options(enabled)
+
+def page_file_name(stem, page):
+    # The first page keeps the single page file names; crawled pages are numbered
+    return f"{stem}_{page['number']}.json" if page['number'] else f"{stem}.json"
+
 class WebScraper:
     def __init__(self):
         self.session = self.create_session()
         self.download_dir = Path(tempfile.mkdtemp())
-        self.current_url = ""
-        self.scraped_data = {}
-        self.cache = {}
         self.executor = ThreadPoolExecutor(max_workers=10)
+        self.fetch_engine = AsyncFetchEngine()
+        # Pages are parsed in worker processes; fetching stays on threads
+        self.parse_pool = ParsePool()
+        self.response_cache = ResponseCache()
         
-        # Create subdirectories
+        # Create subdirectories. Each job writes its text, metadata and videos
+        # under jobs/<job id>; images are shared through the blob store
         self.images_dir = self.download_dir / "images"
-        self.videos_dir = self.download_dir / "videos"
-        self.text_dir = self.download_dir / "text"
-        self.metadata_dir = self.download_dir / "metadata"
+        self.jobs_dir = self.download_dir / "jobs"
         
         # Create directories if they don't exist
         self.images_dir.mkdir(exist_ok=True)
-        self.videos_dir.mkdir(exist_ok=True)
-        self.text_dir.mkdir(exist_ok=True)
-        self.metadata_dir.mkdir(exist_ok=True)
+        self.jobs_dir.mkdir(exist_ok=True)
+        
+        # Downloaded images are stored once per distinct content
+        self.blob_store = BlobStore(self.images_dir)
         
     def create_session(self):
         session = requests.Session()
         retries = Retry(
             total=3,
             backoff_factor=0.1,
-            status_forcelist=[500, 502, 503, 504]
+            status_forcelist=[429, 500, 502, 503, 504],
+            respect_retry_after_header=True
         )
         session.mount('http://', HTTPAdapter(max_retries=retries, pool_connections=100, pool_maxsize=100))
         session.mount('https://', HTTPAdapter(max_retries=retries, pool_connections=100, pool_maxsize=100))
         return session
 
-    @lru_cache(maxsize=1000)
-    def get_page_content(self, url):
+    def publish(self, job, event):
+        # Results go out to streaming HTTP clients and Socket.IO as they are produced
+        job.publish(event)
+        socketio.emit('scrape_item', dict(event, job_id=job.id))
+
+    def fetch_page(self, url, headers=None):
+        return self.fetch_engine.run(self.fetch_engine.fetch(url, headers))
+
+    def get_page_body(self, url):
         try:
-            response = self.session.get(url, timeout=10)
-            return response.text
+            # Served from the response cache, revalidated with the server when stale
+            return self.response_cache.fetch(url, self.fetch_page)
         except Exception as e:
             logger.error(f"Error fetching page: {str(e)}")
             return None
 
-    async def scrape_with_playwright(self, url):
-        async with async_playwright() as p:
-            browser = await p.chromium.launch()
-            page = await browser.new_page()
-            await page.goto(url, wait_until='networkidle', timeout=30000)
-            content = await page.content()
-            await browser.close()
-            return content
-
-    def process_images_parallel(self, soup):
-        images = soup.find_all('img')
+    def scrape_with_playwright(self, url):
+        # Rendered in a pooled, long-lived browser instead of launching one per page
+        try:
+            return get_browser_pool().render(url)
+        except Exception as e:
+            logger.error(f"Error rendering page: {str(e)}")
+            return None
+
+    def process_images_parallel(self, page, job):
+        image_urls = []
+
+        for img in page['images']:
+            img_url = img['src'] or ''
+            if not img_url:
+                continue
+
+            if not img_url.startswith(('http://', 'https://')):
+                img_url = urljoin(page['url'], img_url)
+
+            if img_url not in image_urls:
+                image_urls.append(img_url)
+
+        # All image downloads run concurrently on the shared event loop
+        return self.fetch_engine.run(self.download_images(image_urls, job))
+
+    async def download_images(self, image_urls, job):
         image_data = []
-        futures = []
 
-        def download_image(img):
+        async def download_image(img_url):
             try:
-                img_url = img.get('src', '')
-                if not img_url:
-                    return None
-                    
-                if not img_url.startswith(('http://', 'https://')):
-                    img_url = urljoin(self.current_url, img_url)
-                    
-                # Check cache first
-                cache_key = hashlib.md5(img_url.encode()).hexdigest()
-                if cache_key in self.cache:
-                    return self.cache[cache_key]
-                    
-                # Download image
-                response = self.session.get(img_url, timeout=10)
-                if response.status_code == 200:
-                    # Generate unique filename
-                    filename = f"{hashlib.md5(img_url.encode()).hexdigest()[:8]}_{os.path.basename(img_url)}"
-                    filepath = self.images_dir / filename
-                    
-                    with open(filepath, 'wb') as f:
-                        f.write(response.content)
-                        
-                    result = {
+                # Already downloaded images are answered from the blob store index
+                digest = await self.blob_store.download(self.fetch_engine, img_url)
+                if digest:
+                    return {
                         'url': img_url,
-                        'filename': filename,
-                        'path': str(filepath)
+                        'filename': os.path.basename(urlparse(img_url).path) or digest[:16],
+                        'sha256': digest,
+                        'path': str(self.blob_store.path_for(digest))
                     }
-                    self.cache[cache_key] = result
-                    return result
             except Exception as e:
                 logger.error(f"Error processing image: {str(e)}")
-                return None
-
-        # Submit all image downloads to thread pool
-        for img in images:
-            futures.append(self.executor.submit(download_image, img))
+            return None
 
         # Collect results as they complete
-        for future in as_completed(futures):
-            result = future.result()
+        tasks = [download_image(img_url) for img_url in image_urls]
+        for task in asyncio.as_completed(tasks):
+            result = await task
             if result:
                 image_data.append(result)
-                socketio.emit('progress_update', {'type': 'image', 'count': len(image_data)})
+                self.publish(job, {'type': 'image', 'item': result})
+                socketio.emit('progress_update', {'job_id': job.id, 'type': 'image', 'count': len(image_data)})
 
         return image_data
 
-    def process_videos_parallel(self, soup):
-        videos = soup.find_all(['video', 'iframe'])
+    def process_videos_parallel(self, page, job):
+        videos = page['videos']
         video_data = []
         futures = []
 
         def process_video(video):
             try:
-                if video.name == 'video':
-                    src = video.get('src', '')
+                if video['tag'] == 'video':
+                    src = video['src'] or ''
                     if not src:
                         return None
                 else:  # iframe
-                    src = video.get('src', '')
+                    src = video['src'] or ''
                     if not src or 'youtube' not in src.lower():
                         return None
                         
                 if not src.startswith(('http://', 'https://')):
-                    src = urljoin(self.current_url, src)
+                    src = urljoin(page['url'], src)
                     
                 # Generate unique filename
                 filename = f"{hashlib.md5(src.encode()).hexdigest()[:8]}_{os.path.basename(src)}"
-                filepath = self.videos_dir / filename
+                filepath = job.videos_dir / filename
                     
                 return {
                     'url': src,
@@ -181,114 +213,281 @@ class WebScraper:
             result = future.result()
             if result:
                 video_data.append(result)
-                socketio.emit('progress_update', {'type': 'video', 'count': len(video_data)})
+                self.publish(job, {'type': 'video', 'item': result})
+                socketio.emit('progress_update', {'job_id': job.id, 'type': 'video', 'count': len(video_data)})
 
         return video_data
 
-    def process_text(self, soup):
+    def process_text(self, page, job):
         text_data = {
-            'title': soup.find('title').text if soup.find('title') else '',
-            'paragraphs': [p.text.strip() for p in soup.find_all('p')],
+            'title': page['title'],
+            'paragraphs': [p.strip() for p in page['paragraphs']],
             'headings': {
-                'h1': [h.text.strip() for h in soup.find_all('h1')],
-                'h2': [h.text.strip() for h in soup.find_all('h2')],
-                'h3': [h.text.strip() for h in soup.find_all('h3')]
+                tag: [h.strip() for h in page['headings'][tag]]
+                for tag in ('h1', 'h2', 'h3')
             },
-            'links': [{'text': a.text.strip(), 'url': a.get('href', '')} 
-                     for a in soup.find_all('a', href=True)]
+            'links': [{'text': a['text'].strip(), 'url': a['url']}
+                     for a in page['links'] if a['url'] is not None]
         }
+        self.publish(job, {'type': 'links', 'items': text_data['links']})
+        self.publish(job, {'type': 'text', 'data': {name: value for name, value in text_data.items() if name != 'links'}})
         
         # Save text data to file
-        text_file = self.text_dir / "content.json"
+        text_file = job.text_dir / page_file_name('content', page)
         with open(text_file, 'w', encoding='utf-8') as f:
             json.dump(text_data, f, indent=2, ensure_ascii=False)
             
         return text_data
 
-    def process_metadata(self, soup):
+    def process_metadata(self, page, job):
         metadata = {
-            'description': soup.find('meta', attrs={'name': 'description'}).get('content', '') 
-                         if soup.find('meta', attrs={'name': 'description'}) else '',
-            'keywords': soup.find('meta', attrs={'name': 'keywords'}).get('content', '') 
-                       if soup.find('meta', attrs={'name': 'keywords'}) else '',
-            'author': soup.find('meta', attrs={'name': 'author'}).get('content', '') 
-                     if soup.find('meta', attrs={'name': 'author'}) else '',
-            'viewport': soup.find('meta', attrs={'name': 'viewport'}).get('content', '') 
-                       if soup.find('meta', attrs={'name': 'viewport'}) else ''
+            name: page['meta'].get(name, '')
+            for name in ('description', 'keywords', 'author', 'viewport')
         }
+        self.publish(job, {'type': 'metadata', 'data': metadata})
         
         # Save metadata to file
-        metadata_file = self.metadata_dir / "metadata.json"
+        metadata_file = job.metadata_dir / page_file_name('metadata', page)
         with open(metadata_file, 'w', encoding='utf-8') as f:
             json.dump(metadata, f, indent=2, ensure_ascii=False)
             
         return metadata
 
-    def scrape_website(self, url, options):
+    def process_tables(self, page, job):
+        # Column types are inferred once per column, not per cell
+        tables = typed_tables(page['tables'])
+        self.publish(job, {'type': 'tables', 'count': len(tables)})
+        
+        # Save each table as CSV with the rest of the job's output, numbered
+        # after the tables of pages crawled earlier
+        for index, table in enumerate(tables, page['first_table'] + 1):
+            export_table(table, job.output_dir / "tables" / f"table_{index}.csv", 'csv')
+            
+        return tables
+
+    def stream_page(self, url, collectors):
+        """
+        Parse a page while it downloads, for pages too large to hold whole:
+        each chunk is fed to the incremental parser as it arrives and the
+        body is never kept. Returns {'page', 'status', 'content_type',
+        'fetch_seconds', 'parse_seconds'} or None
+        """
+        started = time.perf_counter()
+        body = self.fetch_engine.open_stream(url)
         try:
-            self.current_url = url
-            self.scraped_data = {}
+            chunks = iter(body)
+            first = next(chunks, None)
+            if first is None and body.status != 200:
+                return None
+            content_type = get_header(body.headers, 'Content-Type')
+            charset = header_charset(content_type)
+            extractor = extract_stream(itertools.chain((first or b'',), chunks), charset, collectors)
+        finally:
+            # Stops the download when the page was cut short
+            body.close()
+        return {'page': extractor.page, 'status': body.status, 'content_type': content_type,
+                'parse_seconds': extractor.parse_seconds,
+                'fetch_seconds': time.perf_counter() - started - extractor.parse_seconds}
+
+    def load_page(self, url, options):
+        """
+        Get the page body, rendered in a browser when JavaScript is requested.
+        The body stays undecoded for the parse pool: returns {'content',
+        'encoding', 'status', 'content_type', 'fetch_seconds'} or None. With
+        the stream option the page is extracted as it downloads instead, see
+        stream_page().
+        """
+        if options.get('stream') and not options.get('javascript'):
+            return self.stream_page(url, page_collectors(options))
+        started = time.perf_counter()
+        if options.get('javascript'):
+            html = self.scrape_with_playwright(url)
+            result = {'content': html, 'encoding': None, 'status': 200, 'headers': {}} if html else None
+        else:
+            result = self.get_page_body(url)
+        if not result:
+            return None
+        return {'content': result['content'], 'encoding': result['encoding'],
+                'status': result['status'], 'content_type': get_header(result['headers'], 'Content-Type'),
+                'fetch_seconds': time.perf_counter() - started}
+
+    def add_timings(self, job, fetch_seconds, parse_seconds):
+        # Fetch and parse cost are summed over every page of the job
+        timings = job.scraped_data.setdefault('timings', {'pages': 0, 'fetch_seconds': 0.0, 'parse_seconds': 0.0})
+        timings['pages'] += 1
+        timings['fetch_seconds'] = round(timings['fetch_seconds'] + fetch_seconds, 4)
+        timings['parse_seconds'] = round(timings['parse_seconds'] + parse_seconds, 4)
+
+    def scrape_page(self, job, url, body, number=0, first_table=0):
+        """
+        Extract and process one page loaded by load_page(); returns the results
+        per option and the page record, whose links the crawl follows
+        """
+        options = job.options
+        collectors = page_collectors(options)
+        
+        if 'page' in body:
+            # Streamed pages were extracted while they downloaded
+            page, parse_seconds = body['page'], body['parse_seconds']
+        else:
+            # Parse and extract everything the enabled options need in one pass,
+            # in a worker process; only the extracted record comes back
+            page, parse_seconds = self.parse_pool.extract(body['content'], body['encoding'],
+                                                          options.get('parser'), collectors)
+        self.add_timings(job, body['fetch_seconds'], parse_seconds)
+        page.update(url=url, number=number, first_table=first_table)
+        
+        # Process content in parallel based on options
+        futures = {}
+        
+        if options.get('text', True):
+            futures[self.executor.submit(self.process_text, page, job)] = 'text'
             
-            # Get page content with caching
-            content = self.get_page_content(url)
-            if not content:
-                return False
-                
-            soup = BeautifulSoup(content, 'html.parser')
+        if options.get('images', True):
+            futures[self.executor.submit(self.process_images_parallel, page, job)] = 'images'
             
-            # Process content in parallel based on options
-            futures = []
+        if options.get('videos', True):
+            futures[self.executor.submit(self.process_videos_parallel, page, job)] = 'videos'
             
-            if options.get('text', True):
-                futures.append(self.executor.submit(self.process_text, soup))
-                
-            if options.get('images', True):
-                futures.append(self.executor.submit(self.process_images_parallel, soup))
+        if options.get('metadata', True):
+            futures[self.executor.submit(self.process_metadata, page, job)] = 'metadata'
+            
+        if 'tables' in collectors:
+            futures[self.executor.submit(self.process_tables, page, job)] = 'tables'
+        
+        # Collect results
+        results = {}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+        return results, page
+
+    def scrape_website(self, job):
+        try:
+            if crawl_depth(job.options) > 1:
+                return self.crawl_website(job)
                 
-            if options.get('videos', True):
-                futures.append(self.executor.submit(self.process_videos_parallel, soup))
+            body = self.load_page(job.url, job.options)
+            if not body:
+                return False
                 
-            if options.get('metadata', True):
-                futures.append(self.executor.submit(self.process_metadata, soup))
-            
-            # Collect results
-            for future in as_completed(futures):
-                result = future.result()
-                if isinstance(result, dict):
-                    self.scraped_data.update(result)
-                elif isinstance(result, list):
-                    if 'images' in self.scraped_data:
-                        self.scraped_data['images'].extend(result)
-                    else:
-                        self.scraped_data['images'] = result
-                    if 'videos' in self.scraped_data:
-                        self.scraped_data['videos'].extend(result)
-                    else:
-                        self.scraped_data['videos'] = result
-            
+            results, _ = self.scrape_page(job, job.url, body)
+            job.scraped_data.update(results)
             return True
             
         except Exception as e:
             logger.error(f"Error scraping website: {str(e)}")
+            job.error = str(e)
             return False
 
-    def save_all_content(self, save_dir):
+    def crawl_website(self, job):
+        """
+        Follow links from job.url to the requested depth. The frontier lives
+        in the job's directory, so a paused job resumes where it stopped.
+        """
+        options = job.options
+        frontier_dir = job.output_dir / "frontier"
+        if CrawlFrontier.exists(frontier_dir):
+            frontier = CrawlFrontier(frontier_dir)
+        else:
+            frontier = CrawlFrontier(frontier_dir, job.url, crawl_depth(options),
+                                     options.get('max_pages') or DEFAULT_MAX_PAGES)
+        data = job.scraped_data
+        data.setdefault('pages', [])
+        seen_images = {image['url'] for image in data.get('images', [])}
+
+        def load_page(url):
+            # robots.txt is read by the scheduler on the first request to a host
+            if not self.fetch_engine.scheduler.can_fetch(url):
+                logger.info(f"Skipping {url}: disallowed by robots.txt")
+                return None
+            body = self.load_page(url, options)
+            # Error pages and files that are not HTML are neither parsed nor
+            # followed, as in crawl_frontier.engine_page_loader
+            if body is None or body['status'] != 200:
+                return None
+            if 'html' not in (body['content_type'] or 'text/html'):
+                return None
+            return body
+
+        def handle_page(url, depth, body):
+            number = len(data['pages'])
+            results, page = self.scrape_page(job, url, body, number, len(data.get('tables', [])))
+            data['pages'].append({'url': url, 'depth': depth, 'title': page.get('title', '')})
+            self.publish(job, {'type': 'page', 'url': url, 'depth': depth, 'number': number + 1})
+            
+            # The seed page's text and metadata are the job's, as for a single
+            # page; every page's own are saved to its numbered files
+            for name in ('text', 'metadata'):
+                if name in results:
+                    data.setdefault(name, results[name])
+            for image in results.get('images', []):
+                if image['url'] not in seen_images:
+                    seen_images.add(image['url'])
+                    data.setdefault('images', []).append(image)
+            for name in ('videos', 'tables'):
+                if name in results:
+                    data.setdefault(name, []).extend(results[name])
+            return [link['url'] for link in page['links'] if link['url']]
+
+        def batch_done(stats):
+            data['crawl'] = stats
+            self.publish(job, {'type': 'crawl', 'stats': stats})
+
+        try:
+            status = run_crawl(frontier, load_page, handle_page, job.pause_requested, batch_done)
+            data['crawl'] = frontier.stats()
+            job.paused = status == 'paused' and not frontier.finished
+        finally:
+            frontier.close()
+        return bool(data['pages']) or job.paused
+
+    def image_export_name(self, image):
+        return 'images/' + Path(image['path']).relative_to(self.images_dir).as_posix()
+
+    def job_files(self, job, include_images=True):
+        """
+        Yield (path, relative name) for every file an export of the job holds
+        """
+        # All downloaded content of the job, but not a crawl's frontier
+        for item in sorted(job.output_dir.glob('**/*')):
+            if item.is_file() and item.relative_to(job.output_dir).parts[0] != 'frontier':
+                yield item, item.relative_to(job.output_dir).as_posix()
+        
+        if include_images:
+            for image in job.scraped_data.get('images', []):
+                yield Path(image['path']), self.image_export_name(image)
+
+    def export_data(self, job, include_images=True):
+        """
+        The job's scraped data as written into an export. Its file paths are
+        relative to the export, since the scraper's own directory is removed
+        when it exits; images left out of the export keep no path.
+        """
+        data = dict(job.scraped_data)
+        if 'images' in data:
+            data['images'] = [dict(image, path=self.image_export_name(image) if include_images else None)
+                              for image in data['images']]
+        if 'videos' in data:
+            data['videos'] = [dict(video, path=Path(video['path']).relative_to(job.output_dir).as_posix())
+                              if video.get('path') else video for video in data['videos']]
+        return data
+
+    def save_all_content(self, job, save_dir):
         try:
             # Create save directory
             save_path = Path(save_dir)
             save_path.mkdir(parents=True, exist_ok=True)
             
-            # Copy all downloaded content
-            for item in self.download_dir.glob('**/*'):
-                if item.is_file():
-                    rel_path = item.relative_to(self.download_dir)
-                    target_path = save_path / rel_path
-                    target_path.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(item, target_path)
+            # Files are reflinked or hardlinked where the filesystem allows,
+            # so a large media set is not stored twice
+            # Images are always exported with the job, as the blob store
+            # lives in a temporary directory
+            counts = export_files(self.job_files(job), save_path)
+            logger.info(f"Exported job {job.id} to {save_path}: {counts}")
                 
             # Save scraped data as JSON
             with open(save_path / 'scraped_data.json', 'w') as f:
-                json.dump(self.scraped_data, f, indent=2)
+                json.dump(self.export_data(job), f)
                 
             return True
             
@@ -298,10 +497,28 @@ class WebScraper:
 
     def __del__(self):
         self.executor.shutdown()
+        self.parse_pool.close()
+        self.fetch_engine.close()
         if self.download_dir.exists():
             shutil.rmtree(self.download_dir)
 
-scraper = WebScraper()
+# Built by init_app() rather than on import: parse workers import the main
+# script again (as __mp_main__), and must not start a scraper of their own
+scraper = None
+job_manager = None
+
+def job_finished(job):
+    socketio.emit('scraping_complete', {'job_id': job.id, 'success': job.status in ('done', 'paused'),
+                                        'status': job.status})
+
+def init_app():
+    """Build the scraper and its job manager once, before the app serves requests"""
+    global scraper, job_manager
+    if scraper is None:
+        scraper = WebScraper()
+        # Scrape requests are queued and served by a fixed pool of workers
+        job_manager = JobManager(scraper.scrape_website, scraper.jobs_dir, on_finished=job_finished)
+    return app
 
 @app.route('/')
 def index():
@@ -316,13 +533,147 @@ def scrape():
     if not url:
         return jsonify({'error': 'URL is required'}), 400
         
-    # Start scraping in a separate thread
-    def scraping_thread():
-        success = scraper.scrape_website(url, options)
-        socketio.emit('scraping_complete', {'success': success})
+    # Queue the job; refuse it when too many are already waiting
+    try:
+        job = job_manager.submit(url, options)
+    except JobQueueFull as e:
+        return jsonify({'error': f"Server busy: {str(e)}"}), 503, {'Retry-After': '5'}
+        
+    return jsonify({'message': 'Scraping started', 'job_id': job.id}), 202
+
+@app.route('/jobs')
+def list_jobs():
+    return jsonify({'jobs': job_manager.list(), 'stats': job_manager.stats()})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/stream')
+def job_stream(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
         
-    threading.Thread(target=scraping_thread).start()
-    return jsonify({'message': 'Scraping started'})
+    # One JSON object per line, sent as soon as each result is extracted
+    def generate():
+        for event in job.stream_events():
+            yield json.dumps(event) + '\n'
+            
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/jobs/<job_id>/pause', methods=['POST'])
+def pause_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job.finished:
+        return jsonify({'error': 'Job is not running', 'status': job.status}), 409
+    if crawl_depth(job.options) == 1:
+        return jsonify({'error': 'Only crawl jobs can be paused', 'status': job.status}), 409
+        
+    # The crawl stops after the batch in progress and saves its frontier
+    job.pause_requested.set()
+    return jsonify({'message': 'Pausing', 'job_id': job.id}), 202
+
+@app.route('/jobs/<job_id>/resume', methods=['POST'])
+def resume_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if job.status != 'paused':
+        return jsonify({'error': 'Job is not paused', 'status': job.status}), 409
+    try:
+        job_manager.resume(job)
+    except JobQueueFull as e:
+        return jsonify({'error': f"Server busy: {str(e)}"}), 503, {'Retry-After': '5'}
+    return jsonify({'message': 'Crawl resumed', 'job_id': job.id}), 202
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if not job.finished:
+        return jsonify({'error': 'Job is not finished', 'status': job.status}), 409
+    return jsonify(job.scraped_data)
+
+@app.route('/jobs/<job_id>/tables/<int:index>')
+def job_table(job_id, index):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if not job.finished:
+        return jsonify({'error': 'Job is not finished', 'status': job.status}), 409
+        
+    tables = job.scraped_data.get('tables', [])
+    if not 1 <= index <= len(tables):
+        return jsonify({'error': 'Unknown table'}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"Format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+        
+    # CSVs are written during the scrape; other formats on first request
+    path = job.output_dir / "tables" / f"table_{index}.{fmt}"
+    if not path.exists() and export_table(tables[index - 1], path, fmt) is None:
+        return jsonify({'error': f"Failed to export table as {fmt}"}), 500
+    return send_file(path, as_attachment=True)
+
+@app.route('/jobs/<job_id>/archive')
+def job_archive(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    if not job.finished:
+        return jsonify({'error': 'Job is not finished', 'status': job.status}), 409
+    fmt = request.args.get('format', 'zip')
+    if fmt not in ARCHIVE_FORMATS:
+        return jsonify({'error': f"Format must be one of {', '.join(ARCHIVE_FORMATS)}"}), 400
+        
+    # Built while it is sent, straight from the job's files and the blob store
+    include_images = request.args.get('media', '1') != '0'
+    scraped_data = json.dumps(scraper.export_data(job, include_images)).encode('utf-8')
+    archive = stream_archive(fmt, scraper.job_files(job, include_images), [('scraped_data.json', scraped_data)])
+    return Response(archive, mimetype=ARCHIVE_TYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=scrape_{job.id}.{fmt}'})
+
+@app.route('/search')
+def search():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query is required'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', SEARCH_LIMIT)), 100))
+    except ValueError:
+        return jsonify({'error': 'Limit must be a number'}), 400
+        
+    # A connection per request; SQLite connections stay on their own thread
+    store = ScrapeStore(SEARCH_STORE)
+    try:
+        results = store.search(query, limit)
+    finally:
+        store.close()
+    return jsonify({'query': query, 'results': [
+        {'alias': alias, 'url': url, 'title': title, 'snippet': snippet}
+        for alias, url, title, snippet in results
+    ]})
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(scraper.response_cache.stats())
+
+@app.route('/hosts/stats')
+def host_stats():
+    # Current concurrency limit, pacing and throttle counts for every host seen
+    return jsonify(scraper.fetch_engine.host_stats())
+
+@app.route('/parse/stats')
+def parse_stats():
+    # Pages parsed, in the pool or inline, and time spent parsing them
+    return jsonify(scraper.parse_pool.stats())
 
 @app.route('/download', methods=['POST'])
 def download():
@@ -331,10 +682,19 @@ def download():
     
     if not save_dir:
         return jsonify({'error': 'Save directory is required'}), 400
+    # The server only writes inside its export directory
+    save_path = resolve_export_dir(save_dir)
+    if save_path is None:
+        return jsonify({'error': 'Save directory must be inside the export directory'}), 400
+        
+    # Export the requested job, or the most recent finished one
+    job = job_manager.get(data['job_id']) if data.get('job_id') else job_manager.latest()
+    if job is None or not job.finished:
+        return jsonify({'error': 'No finished scrape job to save'}), 404
         
-    success = scraper.save_all_content(save_dir)
+    success = scraper.save_all_content(job, save_path)
     if success:
-        return jsonify({'message': 'Content saved successfully'})
+        return jsonify({'message': 'Content saved successfully', 'path': str(save_path)})
     else:
         return jsonify({'error': 'Failed to save content'}), 500
 
@@ -353,4 +713,5 @@ def download_video():
         return jsonify({'error': 'Failed to download video'}), 500
 
 if __name__ == '__main__':
+    init_app()
     socketio.run(app, debug=True) 
\ No newline at end of file
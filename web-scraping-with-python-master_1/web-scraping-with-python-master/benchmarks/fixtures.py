@@ -0,0 +1,115 @@
+import re
+import json
+import random
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+SCRAPED_DATA_FILE = PROJECT_DIR / 'scraped_data.json'
+
+# Synthetic page sizes in bytes, 10 KB to 10 MB
+SYNTHETIC_SIZES = (10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024)
+
+# Synthetic pages reuse this many distinct image URLs, so a scrape of the
+# largest page still downloads a bounded number of images
+DISTINCT_IMAGES = 50
+
+IMG_SRC_RE = re.compile(r'src="[^"]*"')
+SRCSET_RE = re.compile(r'\s+srcset="[^"]*"')
+
+WORDS = ('scraper', 'parser', 'network', 'request', 'history', 'battle', 'empire',
+         'science', 'river', 'market', 'python', 'archive', 'table', 'column',
+         'wiki', 'article', 'heading', 'paragraph', 'link', 'image')
+
+
+def wikipedia_page(scraped_data_file=SCRAPED_DATA_FILE):
+    """
+    Rebuild an HTML page from the Wikipedia record captured in scraped_data.json
+    (the raw anchor and image markup is stored there, the rest is plain text)
+    """
+    with open(scraped_data_file, 'r', encoding='utf-8') as f:
+        records = json.load(f)['scraped_data']
+    record = next(iter(records.values()))
+
+    parts = [
+        '<!DOCTYPE html><html><head><meta charset="utf-8">',
+        f"<title>{record['title']}</title>",
+        '<meta name="description" content="Rebuilt benchmark fixture">',
+        '</head><body>'
+    ]
+    for tag in ('h1', 'h2', 'h3'):
+        parts.extend(f"<{tag}>{text}</{tag}>" for text in record[f'all_{tag}_data'])
+    parts.extend(f"<p>{text}</p>" for text in record['all_p_data'])
+    parts.append('<div class="links">')
+    parts.extend(record['all_anchors'])
+    parts.append('</div><div class="images">')
+    parts.extend(record['all_images_data'])
+    parts.append('</div></body></html>')
+
+    # Point every image (anchors wrap images too) at the local server so the
+    # fixture never touches the network
+    counter = iter(range(10 ** 9))
+    page = SRCSET_RE.sub('', '\n'.join(parts))
+    return IMG_SRC_RE.sub(lambda m: f'src="/images/{next(counter) % DISTINCT_IMAGES}.png"', page)
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def synthetic_block(rng, index):
+    image = index % DISTINCT_IMAGES
+    rows = ''.join(
+        f"<tr><td>{rng.randint(1, 9999)}</td><td>{rng.choice(WORDS)}</td><td>2024-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}</td></tr>"
+        for _ in range(5))
+    return (
+        f"<section><h2>{sentence(rng, 4)}</h2><h3>{sentence(rng, 3)}</h3>"
+        f"<p>{sentence(rng)} <a href=\"/page/{index}\">{rng.choice(WORDS)}</a> {sentence(rng)}</p>"
+        f"<p>{sentence(rng, 20)}</p>"
+        f"<img src=\"/images/{image}.png\" alt=\"{rng.choice(WORDS)}\">"
+        f"<ul><li><a href=\"https://example.com/{index}\">{sentence(rng, 2)}</a></li>"
+        f"<li><a href=\"#section-{index}\">{sentence(rng, 2)}</a></li></ul>"
+        f"<table><tr><th>Id</th><th>Name</th><th>Date</th></tr>{rows}</table></section>\n"
+    )
+
+
+def synthetic_page(target_bytes, seed=0):
+    """
+    Build a page of roughly target_bytes with the mix of headings, paragraphs,
+    links, images and tables the extractors look for
+    """
+    rng = random.Random(seed)
+    head = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f'<title>Synthetic page {target_bytes}</title>'
+        '<meta name="description" content="Synthetic benchmark fixture">'
+        '<meta name="keywords" content="benchmark,scraper">'
+        '<meta name="viewport" content="width=device-width">'
+        '</head><body><h1>Synthetic benchmark page</h1>\n'
+    )
+    parts = [head]
+    size = len(head)
+    index = 0
+    while size < target_bytes:
+        block = synthetic_block(rng, index)
+        parts.append(block)
+        size += len(block)
+        index += 1
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+def build_corpus(sizes=SYNTHETIC_SIZES):
+    """
+    Return the fixture corpus as {name: html bytes}
+    """
+    corpus = {}
+    if SCRAPED_DATA_FILE.exists():
+        corpus['wikipedia_wwii'] = wikipedia_page().encode('utf-8')
+    for size in sizes:
+        corpus[f'synthetic_{size // 1024}kb'] = synthetic_page(size).encode('utf-8')
+    return corpus
+
+
+def image_bytes(index, size=2048):
+    """Deterministic stand-in image body"""
+    return bytes((index + i) % 256 for i in range(size))
@@ -0,0 +1,326 @@
+"""
+Offline benchmark suite for the scraper.
+
+Run from the project directory:
+
+    python -m benchmarks.run_benchmarks --output results.json
+    python -m benchmarks.run_benchmarks --compare results.json
+
+Every page comes from the fixture corpus (benchmarks/fixtures.py) served by a
+local HTTP server, so no network access is needed.
+"""
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+import subprocess
+from datetime import datetime
+
+from benchmarks.fixtures import build_corpus, SYNTHETIC_SIZES
+from benchmarks.server import CorpusServer
+from extraction import extract_page, COLLECTORS
+from parsing import make_soup, resolve_parser, PARSER_BACKENDS
+
+
+def read_rss_kb():
+    """
+    Return (current, peak) resident set size in KB from /proc/self/status, or
+    (None, None) where it is not available
+    """
+    sizes = {}
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in ('VmRSS', 'VmHWM'):
+                    sizes[name] = int(value.split()[0])
+    except (OSError, ValueError):
+        pass
+    return sizes.get('VmRSS'), sizes.get('VmHWM')
+
+
+def reset_peak_rss():
+    """
+    Restart the peak RSS from the current RSS (Linux 4.0+), so the next peak
+    read belongs to one benchmark rather than the whole process. Returns False
+    where the peak cannot be reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def measure(name, page, func, repeat, extra=None):
+    """
+    Time func() repeat times, then run it once more under tracemalloc to get
+    the peak Python allocation, and return a result record
+    """
+    rss_start, _ = read_rss_kb()
+    peak_reset = reset_peak_rss()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    _, peak_alloc = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # The peak since the reset; memory freed by earlier benchmarks but still
+    # held by the process is reused first, so this is growth beyond that
+    _, rss_peak = read_rss_kb()
+    if not peak_reset or rss_start is None or rss_peak is None:
+        rss_peak = None
+
+    mean = sum(timings) / len(timings)
+    result = {
+        'benchmark': name,
+        'page': page,
+        'runs': repeat,
+        'mean_ms': round(mean * 1000, 3),
+        'min_ms': round(min(timings) * 1000, 3),
+        'pages_per_sec': round(1 / mean, 3) if mean else None,
+        'peak_alloc_bytes': peak_alloc,
+        'peak_rss_kb': rss_peak,
+        'peak_rss_delta_kb': rss_peak - rss_start if rss_peak is not None else None
+    }
+    if extra:
+        result.update(extra)
+    print(f"{name:<40} {page:<20} {result['mean_ms']:>10.2f} ms {result['pages_per_sec'] or 0:>9.2f} pages/s",
+          file=sys.stderr)
+    return result
+
+
+def bench_parsing(corpus, parsers, repeat):
+    results = []
+    for page, html in corpus.items():
+        for parser in parsers:
+            results.append(measure(f'parse[{parser}]', page, lambda: make_soup(html, parser), repeat,
+                                   {'bytes': len(html)}))
+        # Metadata-only partial parse
+        results.append(measure('parse[partial:metadata]', page,
+                               lambda: make_soup(html, None, ('title', 'meta')), repeat, {'bytes': len(html)}))
+    return results
+
+
+def bench_extractors(corpus, repeat):
+    results = []
+    for page, html in corpus.items():
+        soup = make_soup(html)
+        for collector in COLLECTORS:
+            results.append(measure(f'extract[{collector}]', page,
+                                   lambda: extract_page(soup, (collector,)), repeat))
+        results.append(measure('extract[all]', page, lambda: extract_page(soup), repeat))
+    return results
+
+
+def bench_parse_pool(corpus, repeat):
+    """
+    The whole corpus parsed from its raw bytes on as many threads as the pool
+    has workers: first in the calling threads, then in the worker processes
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from parse_pool import ParsePool, PARSE_WORKERS
+
+    bodies = list(corpus.values())
+    threads = max(1, PARSE_WORKERS)
+    results = []
+    for workers in (0, PARSE_WORKERS):
+        pool = ParsePool(workers, inline_bytes=0)
+        try:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                def run():
+                    list(executor.map(lambda body: pool.extract(body, 'utf-8'), bodies))
+
+                results.append(measure(f'parse_pool[workers={workers}]', f'corpus ({len(bodies)} pages)',
+                                       run, repeat, {'pages': len(bodies), 'threads': threads}))
+        finally:
+            pool.close()
+    return results
+
+
+def bench_stream(corpus, repeat):
+    """
+    Every collector extracted from the raw bytes: parsed whole into a soup,
+    then fed to the streaming extractor chunk by chunk
+    """
+    from stream_parse import extract_stream, STREAM_CHUNK_SIZE
+
+    results = []
+    for page, html in corpus.items():
+        chunks = [html[i:i + STREAM_CHUNK_SIZE] for i in range(0, len(html), STREAM_CHUNK_SIZE)]
+        results.append(measure('stream[soup]', page, lambda: extract_page(make_soup(html, None, COLLECTORS)),
+                               repeat, {'bytes': len(html)}))
+        results.append(measure('stream[incremental]', page, lambda: extract_stream(chunks), repeat,
+                               {'bytes': len(html)}))
+    return results
+
+
+def bench_cli(corpus, repeat):
+    from web_scraping_command_line_tool import proccess_beautiful_soup_data, SCRAPED_COLLECTORS
+
+    results = []
+    for page, html in corpus.items():
+        def run():
+            proccess_beautiful_soup_data(make_soup(html, collectors=SCRAPED_COLLECTORS))
+
+        results.append(measure('cli.proccess_beautiful_soup_data', page, run, repeat))
+    return results
+
+
+def bench_gui(corpus, repeat):
+    """
+    The GUI's extraction path without any widgets: parse with the collectors
+    for all options enabled, extract, and build the text tab content
+    """
+    try:
+        from web_scraping_gui import WebScraperGUI
+    except ImportError as e:
+        print(f"Skipping GUI benchmarks: {str(e)}", file=sys.stderr)
+        return []
+    from extraction import collectors_for_options
+
+    collectors = collectors_for_options(
+        {'text': True, 'images': True, 'links': True, 'tables': True, 'metadata': True})
+    results = []
+    for page, html in corpus.items():
+        def run():
+            extracted = extract_page(make_soup(html, collectors=collectors), collectors)
+            WebScraperGUI.extract_text_content(None, extracted)
+
+        results.append(measure('gui.extract (headless)', page, run, repeat))
+    return results
+
+
+def bench_scrape_website(corpus, server, repeat):
+    import tempfile
+    import app
+    from jobs import Job
+    from response_cache import ResponseCache
+
+    app.init_app()
+    scraper = app.scraper
+
+    # Every run fetches the page over HTTP; the fixture server sends no validators
+    scraper.response_cache = ResponseCache(tempfile.mkdtemp(), default_ttl=0)
+    # The fixture server is local, so per-host pacing is lifted to measure the
+    # pipeline rather than the politeness rate
+    scraper.fetch_engine.scheduler.rate = float('inf')
+    scraper.fetch_engine.scheduler.burst = float('inf')
+    options = {'text': True, 'images': True, 'videos': True, 'metadata': True}
+
+    results = []
+    for page in corpus:
+        url = server.url_for(page)
+        timings = []
+
+        def run():
+            # Fresh blob store state each run, so images are downloaded again
+            scraper.blob_store.index.clear()
+            scraper.blob_store.refs.clear()
+            job = Job(url, options, scraper.jobs_dir)
+            if not scraper.scrape_website(job):
+                raise RuntimeError(f"Scrape of {url} failed: {job.error}")
+            timings.append(job.scraped_data['timings'])
+            job.cleanup()
+
+        server.reset_counters()
+        result = measure('app.WebScraper.scrape_website', page, run, repeat)
+        result['bytes_transferred_per_run'] = server.bytes_sent // (repeat + 1)
+        result['requests_per_run'] = server.requests // (repeat + 1)
+        # Page fetch and parse cost, reported apart from the end-to-end time
+        for name in ('fetch', 'parse'):
+            total = sum(timing[f'{name}_seconds'] for timing in timings)
+            result[f'{name}_ms'] = round(total * 1000 / len(timings), 3)
+        results.append(result)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_file, report):
+    """Print the mean time change of every benchmark present in both runs"""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {(r['benchmark'], r['page']): r for r in json.load(f)['results']}
+    print(f"{'benchmark':<40} {'page':<20} {'before ms':>10} {'after ms':>10} {'change':>8}")
+    for result in report['results']:
+        old = baseline.get((result['benchmark'], result['page']))
+        if old is None:
+            continue
+        change = (result['mean_ms'] - old['mean_ms']) / old['mean_ms'] * 100 if old['mean_ms'] else 0
+        print(f"{result['benchmark']:<40} {result['page']:<20} {old['mean_ms']:>10.2f} "
+              f"{result['mean_ms']:>10.2f} {change:>+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline scraper benchmarks")
+    parser.add_argument('--output', help="write the JSON report to this file")
+    parser.add_argument('--compare', help="compare against an earlier JSON report")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0, help="server latency per response in seconds")
+    parser.add_argument('--sizes', type=int, nargs='*', default=list(SYNTHETIC_SIZES),
+                        help="synthetic page sizes in bytes")
+    parser.add_argument('--parsers', nargs='*', default=['lxml', 'html.parser'], choices=PARSER_BACKENDS)
+    parser.add_argument('--suites', nargs='*', default=['parse', 'extract', 'pool', 'stream', 'cli', 'gui', 'scrape'],
+                        choices=['parse', 'extract', 'pool', 'stream', 'cli', 'gui', 'scrape'])
+    args = parser.parse_args(argv)
+
+    corpus = build_corpus(args.sizes)
+    parsers = sorted({resolve_parser(name) for name in args.parsers})
+    server = CorpusServer(corpus, latency=args.latency).start()
+
+    results = []
+    try:
+        if 'parse' in args.suites:
+            results += bench_parsing(corpus, parsers, args.repeat)
+        if 'extract' in args.suites:
+            results += bench_extractors(corpus, args.repeat)
+        if 'pool' in args.suites:
+            results += bench_parse_pool(corpus, args.repeat)
+        if 'stream' in args.suites:
+            results += bench_stream(corpus, args.repeat)
+        if 'cli' in args.suites:
+            results += bench_cli(corpus, args.repeat)
+        if 'gui' in args.suites:
+            results += bench_gui(corpus, args.repeat)
+        if 'scrape' in args.suites:
+            results += bench_scrape_website(corpus, server, args.repeat)
+    finally:
+        server.stop()
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'repeat': args.repeat,
+            'latency': args.latency,
+            'pages': {name: len(html) for name, html in corpus.items()},
+            'parsers': parsers
+        },
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        compare(args.compare, report)
+    if not args.output and not args.compare:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
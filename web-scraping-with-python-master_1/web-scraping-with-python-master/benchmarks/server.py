@@ -0,0 +1,81 @@
+import re
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from benchmarks.fixtures import image_bytes
+
+IMAGE_PATH_RE = re.compile(r'^/images/(\d+)\.png$')
+
+
+class FixtureHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections when a scrape opens
+    # dozens at once, and the client only retries after a second
+    request_queue_size = 1024
+
+
+class CorpusServer:
+    """
+    Local stand-in HTTP server for the fixture corpus. Pages are served from
+    /<name>.html and images from /images/<n>.png; every response is delayed by
+    latency seconds, and bytes sent are counted so benchmarks can report
+    transfer volume without any network access.
+    """
+
+    def __init__(self, corpus, latency=0.0, host='127.0.0.1', port=0):
+        self.corpus = corpus
+        self.latency = latency
+        self.bytes_sent = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body, content_type = server.lookup(self.path)
+                if server.latency:
+                    time.sleep(server.latency)
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with server.lock:
+                    server.bytes_sent += len(body)
+                    server.requests += 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = FixtureHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def lookup(self, path):
+        match = IMAGE_PATH_RE.match(path)
+        if match:
+            return image_bytes(int(match.group(1))), 'image/png'
+        name = path.lstrip('/')
+        if name.endswith('.html') and name[:-5] in self.corpus:
+            return self.corpus[name[:-5]], 'text/html; charset=utf-8'
+        return None, None
+
+    def url_for(self, name):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/{name}.html"
+
+    def reset_counters(self):
+        with self.lock:
+            self.bytes_sent = 0
+            self.requests = 0
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
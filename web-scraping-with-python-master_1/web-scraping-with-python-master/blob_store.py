@@ -0,0 +1,117 @@
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MAX_INDEX_ENTRIES = 50000
+
+
+class BlobStore:
+    """
+    Content-addressed store for downloaded media. Each blob is written once
+    under the SHA-256 of its bytes, so the same image served from several URLs
+    takes the disk space of one. A bounded URL -> digest index remembers what
+    has been downloaded; when a URL falls out of the index (least recently used
+    first) and no other URL points at its blob, the blob is deleted.
+    """
+
+    def __init__(self, root, max_index_entries=MAX_INDEX_ENTRIES):
+        self.root = Path(root)
+        self.tmp_dir = self.root / 'tmp'
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.max_index_entries = max_index_entries
+
+        self.index = OrderedDict()
+        self.refs = {}
+        self.lock = threading.Lock()
+
+    def path_for(self, digest):
+        return self.root / digest[:2] / digest
+
+    def lookup(self, url):
+        """Return the digest stored for url, or None"""
+        with self.lock:
+            digest = self.index.get(url)
+            if digest is not None:
+                self.index.move_to_end(url)
+            return digest
+
+    def contains(self, digest):
+        return self.path_for(digest).exists()
+
+    def put_file(self, url, tmp_path, digest):
+        """Move a fully written temp file into the store under its digest"""
+        path = self.path_for(digest)
+        with self.lock:
+            if path.exists():
+                # Same bytes already stored from another URL
+                os.remove(tmp_path)
+            else:
+                path.parent.mkdir(exist_ok=True)
+                os.replace(tmp_path, path)
+            self.link(url, digest)
+        return path
+
+    def link(self, url, digest):
+        # Caller holds the lock
+        old = self.index.get(url)
+        if old == digest:
+            # Stored again with the same bytes: still one reference
+            self.index.move_to_end(url)
+            return
+        # The new reference is taken before the old one is dropped, so a blob
+        # is never deleted while it is being relinked
+        self.refs[digest] = self.refs.get(digest, 0) + 1
+        self.index.pop(url, None)
+        self.index[url] = digest
+        if old is not None:
+            self.release(old)
+
+        while len(self.index) > self.max_index_entries:
+            _, evicted = self.index.popitem(last=False)
+            self.release(evicted)
+
+    def release(self, digest):
+        # Caller holds the lock
+        self.refs[digest] -= 1
+        if self.refs[digest] <= 0:
+            del self.refs[digest]
+            self.path_for(digest).unlink(missing_ok=True)
+
+    async def download(self, engine, url):
+        """
+        Stream url into the store through the fetch engine, hashing the bytes
+        as they arrive. Returns the digest, or None if the download failed.
+        """
+        digest = self.lookup(url)
+        if digest is not None and self.contains(digest):
+            return digest
+
+        hasher = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        with os.fdopen(fd, 'wb') as f:
+            def write(chunk):
+                hasher.update(chunk)
+                f.write(chunk)
+
+            status = await engine.stream(url, write)
+
+        if status != 200:
+            os.remove(tmp_path)
+            return None
+
+        digest = hasher.hexdigest()
+        self.put_file(url, tmp_path, digest)
+        return digest
+
+    def blobs(self):
+        """Yield (digest, path) for every blob currently referenced"""
+        with self.lock:
+            digests = list(self.refs)
+        for digest in digests:
+            yield digest, self.path_for(digest)
@@ -0,0 +1,189 @@
+import asyncio
+import atexit
+import logging
+import threading
+from playwright.async_api import async_playwright
+
+logger = logging.getLogger(__name__)
+
+MAX_BROWSERS = 2
+PAGES_PER_BROWSER = 4
+RECYCLE_AFTER = 200
+BLOCKED_RESOURCES = ('image', 'font', 'media')
+RENDER_TIMEOUT = 30000
+
+
+class BrowserSlot:
+    """One long-lived browser with its context and idle pages"""
+
+    def __init__(self, browser, context):
+        self.browser = browser
+        self.context = context
+        self.idle_pages = []
+        self.in_use = 0
+        self.navigations = 0
+        self.retiring = False
+
+
+class BrowserPool:
+    """
+    Keeps Chromium instances running between renders. Each browser serves up
+    to pages_per_browser pages at once and reuses them across navigations; a
+    browser is retired and replaced after recycle_after navigations so leaks
+    in long-running sessions stay bounded. Images, fonts and media can be
+    blocked during render since only the resulting HTML is used.
+
+    Playwright objects belong to the loop that created them, so the pool runs
+    its own event loop on a background thread; render() can be called from any
+    thread.
+    """
+
+    def __init__(self, max_browsers=MAX_BROWSERS, pages_per_browser=PAGES_PER_BROWSER,
+                 recycle_after=RECYCLE_AFTER, blocked_resources=BLOCKED_RESOURCES):
+        self.max_browsers = max_browsers
+        self.pages_per_browser = pages_per_browser
+        self.recycle_after = recycle_after
+        self.blocked_resources = set(blocked_resources or ())
+
+        self.playwright = None
+        self.slots = []
+        self.page_available = asyncio.Condition()
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def render(self, url, wait_until='networkidle', timeout=RENDER_TIMEOUT):
+        """Render url in a pooled page and return the resulting HTML"""
+        future = asyncio.run_coroutine_threadsafe(self.render_async(url, wait_until, timeout), self.loop)
+        return future.result()
+
+    async def render_async(self, url, wait_until='networkidle', timeout=RENDER_TIMEOUT):
+        slot, page = await self.acquire()
+        try:
+            await page.goto(url, wait_until=wait_until, timeout=timeout)
+            return await page.content()
+        except Exception:
+            # A page left in an unknown state is not reused
+            try:
+                await page.close()
+            except Exception:
+                pass
+            page = None
+            raise
+        finally:
+            await self.release(slot, page)
+
+    async def start(self):
+        async with self.page_available:
+            if self.playwright is None:
+                self.playwright = await async_playwright().start()
+
+    async def new_slot(self):
+        browser = await self.playwright.chromium.launch()
+        context = await browser.new_context()
+        if self.blocked_resources:
+            await context.route('**/*', self.route_request)
+        slot = BrowserSlot(browser, context)
+        self.slots.append(slot)
+        return slot
+
+    async def route_request(self, route):
+        if route.request.resource_type in self.blocked_resources:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def acquire(self):
+        await self.start()
+        async with self.page_available:
+            while True:
+                slot = self.free_slot()
+                if slot is None and len(self.slots) < self.max_browsers:
+                    slot = await self.new_slot()
+                if slot is not None:
+                    break
+                await self.page_available.wait()
+
+            slot.in_use += 1
+            slot.navigations += 1
+            if slot.navigations >= self.recycle_after:
+                slot.retiring = True
+
+            if slot.idle_pages:
+                return slot, slot.idle_pages.pop()
+
+        try:
+            page = await slot.context.new_page()
+        except Exception:
+            await self.release(slot, None)
+            raise
+        return slot, page
+
+    def free_slot(self):
+        # Caller holds the slot lock; prefer the busiest browser with room
+        candidates = [slot for slot in self.slots
+                      if not slot.retiring and slot.in_use < self.pages_per_browser]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda slot: slot.in_use)
+
+    async def release(self, slot, page):
+        async with self.page_available:
+            slot.in_use -= 1
+            if page is not None and not slot.retiring:
+                slot.idle_pages.append(page)
+            retire = slot.retiring and slot.in_use == 0
+            if retire:
+                self.slots.remove(slot)
+            self.page_available.notify_all()
+
+        if retire:
+            await self.close_slot(slot)
+
+    async def close_slot(self, slot):
+        try:
+            await slot.context.close()
+            await slot.browser.close()
+        except Exception as e:
+            logger.error(f"Error closing browser: {str(e)}")
+
+    def stats(self):
+        return {
+            'browsers': len(self.slots),
+            'pages_in_use': sum(slot.in_use for slot in self.slots),
+            'idle_pages': sum(len(slot.idle_pages) for slot in self.slots),
+            'navigations': [slot.navigations for slot in self.slots]
+        }
+
+    async def shutdown(self):
+        for slot in list(self.slots):
+            await self.close_slot(slot)
+        self.slots = []
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+
+    def close(self):
+        if self.loop.is_closed() or not self.thread.is_alive():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result(timeout=10)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
+        except Exception as e:
+            logger.error(f"Error closing browser pool: {str(e)}")
+
+
+shared_pool = None
+shared_pool_lock = threading.Lock()
+
+
+def get_browser_pool():
+    """Return the process-wide browser pool, creating it on first use"""
+    global shared_pool
+    with shared_pool_lock:
+        if shared_pool is None:
+            shared_pool = BrowserPool()
+        return shared_pool
@@ -0,0 +1,276 @@
+"""
+Lazily loaded optional capabilities for the advanced GUI.
+
+Each capability (NLP, OCR, video, headless browser, ...) imports and
+initialises its heavy dependencies on first use instead of at module import,
+so the window appears straight away and a plain text scrape never pays for
+models it does not need.
+
+Run this file to see what each capability costs to load:
+
+    python capabilities.py
+    python capabilities.py nlp ocr
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import threading
+import subprocess
+from types import SimpleNamespace
+
+logger = logging.getLogger(__name__)
+
+# Comma separated capabilities to load in the background once the GUI is up
+WARM_CAPABILITIES = [name for name in os.environ.get('SCRAPER_WARM_CAPABILITIES', '').split(',') if name]
+
+
+def peak_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Capability:
+    """
+    One optional feature and the loader that imports and initialises it.
+    get() runs the loader once; concurrent callers wait for the same load.
+    """
+
+    def __init__(self, name, loader, description=""):
+        self.name = name
+        self.loader = loader
+        self.description = description
+        self.value = None
+        self.error = None
+        self.loaded = False
+        self.load_seconds = None
+        self.modules_imported = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if not self.loaded:
+                self.load()
+            if self.error is not None:
+                raise self.error
+            return self.value
+
+    def load(self):
+        # Caller holds the lock
+        modules_before = len(sys.modules)
+        start = time.perf_counter()
+        try:
+            self.value = self.loader()
+        except Exception as e:
+            logger.error(f"Error loading {self.name} support: {str(e)}")
+            self.error = e
+        self.load_seconds = time.perf_counter() - start
+        self.modules_imported = len(sys.modules) - modules_before
+        self.loaded = True
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'description': self.description,
+            'loaded': self.loaded,
+            'ok': self.loaded and self.error is None,
+            'error': str(self.error) if self.error else None,
+            'load_seconds': round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            'modules_imported': self.modules_imported
+        }
+
+
+class CapabilityRegistry:
+    """Named capabilities, loaded on demand or warmed on a background thread"""
+
+    def __init__(self):
+        self.capabilities = {}
+
+    def register(self, name, loader, description=""):
+        self.capabilities[name] = Capability(name, loader, description)
+
+    def get(self, name):
+        """Return the loaded capability, importing it now if needed"""
+        return self.capabilities[name].get()
+
+    def is_loaded(self, name):
+        return self.capabilities[name].loaded
+
+    def warm(self, names, on_done=None):
+        """
+        Load names on a daemon thread so later calls to get() return at once.
+        on_done(name, ok) is called from that thread after each one.
+        """
+        def run():
+            for name in names:
+                capability = self.capabilities.get(name)
+                if capability is None:
+                    logger.error(f"Unknown capability: {name}")
+                    continue
+                try:
+                    capability.get()
+                    ok = True
+                except Exception:
+                    ok = False
+                if on_done:
+                    on_done(name, ok)
+
+        thread = threading.Thread(target=run, name="capability-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def report(self):
+        """What each capability has cost in this process so far"""
+        return [capability.to_dict() for capability in self.capabilities.values()]
+
+
+def load_nlp():
+    import nltk
+    import spacy
+    import numpy as np
+    from nltk.sentiment import SentimentIntensityAnalyzer
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.cluster import KMeans
+    from transformers import pipeline
+
+    nltk.download('vader_lexicon', quiet=True)
+    return SimpleNamespace(
+        nlp=spacy.load('en_core_web_sm'),
+        sentiment=SentimentIntensityAnalyzer(),
+        summarizer=pipeline('summarization'),
+        TfidfVectorizer=TfidfVectorizer,
+        KMeans=KMeans,
+        np=np
+    )
+
+
+def load_llm():
+    from langchain.llms import OpenAI
+    from langchain.chains import LLMChain
+    from langchain.prompts import PromptTemplate
+    return SimpleNamespace(OpenAI=OpenAI, LLMChain=LLMChain, PromptTemplate=PromptTemplate)
+
+
+def load_ocr():
+    import cv2
+    import pytesseract
+    return SimpleNamespace(cv2=cv2, pytesseract=pytesseract)
+
+
+def load_video():
+    import moviepy.editor as mp
+    from pytube import YouTube
+    return SimpleNamespace(YouTube=YouTube, mp=mp)
+
+
+def load_browser():
+    from browser_pool import get_browser_pool
+    return SimpleNamespace(get_browser_pool=get_browser_pool)
+
+
+def load_selenium():
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from webdriver_manager.chrome import ChromeDriverManager
+    return SimpleNamespace(
+        webdriver=webdriver,
+        Options=Options,
+        By=By,
+        WebDriverWait=WebDriverWait,
+        EC=EC,
+        ChromeDriverManager=ChromeDriverManager
+    )
+
+
+def load_crawler():
+    import scrapy
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+    return SimpleNamespace(scrapy=scrapy, CrawlerProcess=CrawlerProcess,
+                           get_project_settings=get_project_settings)
+
+
+def load_dataframes():
+    import pandas as pd
+    return SimpleNamespace(pd=pd)
+
+
+def build_registry():
+    registry = CapabilityRegistry()
+    registry.register('nlp', load_nlp, "spaCy, transformers, NLTK and scikit-learn models")
+    registry.register('llm', load_llm, "LangChain OpenAI chains")
+    registry.register('ocr', load_ocr, "OpenCV and Tesseract OCR")
+    registry.register('video', load_video, "pytube and moviepy")
+    registry.register('browser', load_browser, "Playwright browser pool")
+    registry.register('selenium', load_selenium, "Selenium Chrome driver")
+    registry.register('crawler', load_crawler, "Scrapy crawler")
+    registry.register('dataframes', load_dataframes, "pandas")
+    return registry
+
+
+def measure_capability(name):
+    """Load one capability in this (fresh) process and return what it cost"""
+    registry = build_registry()
+    rss_before = peak_rss_kb()
+    try:
+        registry.get(name)
+    except Exception:
+        pass
+    result = registry.capabilities[name].to_dict()
+    result['peak_rss_delta_kb'] = peak_rss_kb() - rss_before
+    return result
+
+
+def import_cost_report(names=None):
+    """
+    Measure every capability in its own interpreter, so shared dependencies
+    are counted against each capability that needs them
+    """
+    names = names or list(build_registry().capabilities)
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = []
+    for name in names:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--measure', name],
+            capture_output=True, text=True, cwd=here)
+        try:
+            results.append(json.loads(output.stdout.strip().splitlines()[-1]))
+        except (ValueError, IndexError):
+            results.append({'name': name, 'ok': False, 'error': output.stderr.strip()[-200:]})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report what each optional capability costs to load")
+    parser.add_argument('names', nargs='*', help="capabilities to measure (default: all)")
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(measure_capability(args.measure)))
+        return
+
+    report = import_cost_report(args.names)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{'capability':<12} {'seconds':>8} {'modules':>8} {'rss MB':>8}  status")
+    for result in report:
+        seconds = result.get('load_seconds')
+        modules = result.get('modules_imported')
+        rss = result.get('peak_rss_delta_kb')
+        status = 'ok' if result.get('ok') else f"unavailable: {result.get('error')}"
+        print(f"{result['name']:<12} {seconds if seconds is not None else '-':>8} "
+              f"{modules if modules is not None else '-':>8} "
+              f"{round(rss / 1024, 1) if rss is not None else '-':>8}  {status}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+import io
+import os
+import time
+import shutil
+import logging
+import tarfile
+import zipfile
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Local exports go under this directory unless the target is inside it already
+DEFAULT_EXPORT_DIR = Path(os.environ.get('SCRAPER_EXPORT_DIR') or Path.home() / 'web_scraper_exports')
+
+ARCHIVE_FORMATS = ('zip', 'tar')
+ARCHIVE_TYPES = {'zip': 'application/zip', 'tar': 'application/x-tar'}
+CHUNK_SIZE = 64 * 1024
+
+# Already compressed files are stored in a ZIP as they are
+STORED_SUFFIXES = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp4', '.webm', '.mkv', '.mp3',
+                   '.zip', '.gz', '.parquet'}
+
+# ioctl that clones a file's extents on btrfs, XFS and other copy-on-write filesystems
+FICLONE = 0x40049409
+
+
+def resolve_export_dir(save_dir, root=DEFAULT_EXPORT_DIR):
+    """
+    Resolve a requested export directory inside root; relative paths are
+    taken from root. Returns None for a path that would leave root.
+    """
+    root = Path(root).resolve()
+    target = (root / save_dir).resolve()
+    if target != root and root not in target.parents:
+        return None
+    return target
+
+
+def reflink(source, target):
+    """Clone source into target without copying its data; raises OSError where unsupported"""
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    try:
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        Path(target).unlink(missing_ok=True)
+        raise
+    shutil.copystat(source, target)
+
+
+def link_or_copy(source, target):
+    """
+    Put source at target without duplicating its data where the filesystem
+    allows: a copy-on-write reflink first, then a hardlink, then a plain copy.
+    Scraped files and blobs are never modified in place, so sharing their
+    data with the export is safe. Returns the method used.
+    """
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.unlink(missing_ok=True)
+    try:
+        reflink(source, target)
+        return 'reflink'
+    except OSError:
+        pass
+    try:
+        os.link(source, target)
+        return 'hardlink'
+    except OSError:
+        pass
+    shutil.copy2(source, target)
+    return 'copy'
+
+
+def export_files(files, target_dir):
+    """
+    Export (source path, relative name) pairs into target_dir and return how
+    many files were reflinked, hardlinked and copied
+    """
+    target_dir = Path(target_dir)
+    counts = {'reflink': 0, 'hardlink': 0, 'copy': 0}
+    for source, name in files:
+        counts[link_or_copy(source, target_dir / name)] += 1
+    return counts
+
+
+def read_chunks(path):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+class ChunkBuffer(io.RawIOBase):
+    """Write-only, unseekable stream that hands out whatever was written since the last drain()"""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(files, extra=()):
+    """
+    Yield a ZIP archive of (source path, name) files and extra (name, bytes)
+    entries chunk by chunk, so neither the archive nor a whole file is ever
+    held in memory or staged on disk
+    """
+    buffer = ChunkBuffer()
+    # An unseekable output makes zipfile write sizes after each entry's data
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in extra:
+            archive.writestr(name, data, zipfile.ZIP_DEFLATED)
+            yield buffer.drain()
+
+        for source, name in files:
+            info = zipfile.ZipInfo.from_file(source, name)
+            if Path(name).suffix.lower() in STORED_SUFFIXES:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, 'w') as entry:
+                for chunk in read_chunks(source):
+                    entry.write(chunk)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            yield buffer.drain()
+    yield buffer.drain()
+
+
+def tar_header(name, size, mtime):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    info.mode = 0o644
+    return info.tobuf(tarfile.PAX_FORMAT)
+
+
+def tar_padding(size):
+    return tarfile.NUL * (-size % tarfile.BLOCKSIZE)
+
+
+def stream_tar(files, extra=()):
+    """
+    Yield an uncompressed tar archive of (source path, name) files and extra
+    (name, bytes) entries chunk by chunk. Headers are written by hand so each
+    file's data can be streamed straight from disk.
+    """
+    now = time.time()
+    for name, data in extra:
+        yield tar_header(name, len(data), now) + data + tar_padding(len(data))
+
+    for source, name in files:
+        stat = os.stat(source)
+        yield tar_header(name, stat.st_size, stat.st_mtime)
+        remaining = stat.st_size
+        for chunk in read_chunks(source):
+            # The header promised st_size bytes; stop there even if the file grew
+            chunk = chunk[:remaining]
+            remaining -= len(chunk)
+            yield chunk
+            if not remaining:
+                break
+        if remaining:
+            raise IOError(f"{source} shrank while it was being archived")
+        yield tar_padding(stat.st_size)
+
+    # End of archive: two empty blocks
+    yield tarfile.NUL * (2 * tarfile.BLOCKSIZE)
+
+
+def stream_archive(fmt, files, extra=()):
+    """Yield an archive in one of ARCHIVE_FORMATS chunk by chunk"""
+    if fmt == 'zip':
+        return stream_zip(files, extra)
+    if fmt == 'tar':
+        return stream_tar(files, extra)
+    raise ValueError(f"Unknown archive format {fmt}")
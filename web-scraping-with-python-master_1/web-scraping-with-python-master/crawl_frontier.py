@@ -0,0 +1,419 @@
+import os
+import re
+import json
+import math
+import shutil
+import hashlib
+import sqlite3
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, urljoin, parse_qsl, urlencode, quote
+from fetch_engine import decode_body
+from response_cache import get_header
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CRAWL_DIR = os.environ.get(
+    'SCRAPER_CRAWL_DIR', str(Path.home() / '.cache' / 'web_scraper' / 'crawls'))
+MAX_DEPTH = 5
+DEFAULT_MAX_PAGES = 1000
+
+# Pages fetched at once per batch; the frontier is checkpointed after each
+CRAWL_BATCH = 16
+
+# The seen-set starts sized for this many URLs and grows by doubling
+SEEN_CAPACITY = 100000
+SEEN_ERROR_RATE = 0.001
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|dclid|msclkid|mc_cid|mc_eid|_ga|_hsenc|_hsmi)$', re.I)
+PERCENT_ESCAPE = re.compile(r'%([0-9A-Fa-f]{2})')
+UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+PATH_SAFE = "/%:@!$&'()*+,;=~"
+
+# Links to these are never HTML pages, so they are not crawled
+SKIP_EXTENSIONS = re.compile(
+    r'\.(jpe?g|png|gif|webp|svg|ico|bmp|tiff?|pdf|zip|gz|tgz|rar|7z|exe|dmg|msi|'
+    r'mp[34]|m4a|avi|mov|mkv|webm|wav|ogg|css|js|json|xml|rss|woff2?|ttf|eot)$', re.I)
+
+
+def normalize_escape(match):
+    # Escaped unreserved characters are decoded, every other escape is uppercased
+    char = chr(int(match.group(1), 16))
+    return char if char in UNRESERVED else '%' + match.group(1).upper()
+
+
+def remove_dot_segments(path):
+    output = []
+    for segment in path.split('/'):
+        if segment == '..':
+            if len(output) > 1:
+                output.pop()
+        elif segment != '.':
+            output.append(segment)
+    if path.endswith(('/.', '/..')):
+        output.append('')
+    return '/'.join(output) or '/'
+
+
+def canonicalize_url(url, base=None):
+    """
+    Reduce a URL to one canonical spelling, so the same page is only crawled
+    once: resolved against base, lowercase scheme and host, no default port,
+    fragment or tracking parameters, dot segments removed, percent escapes
+    normalised and query parameters sorted. Returns None for anything that is
+    not an http(s) URL.
+    """
+    try:
+        if base:
+            url = urljoin(base, url.strip())
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').rstrip('.')
+    if scheme not in DEFAULT_PORTS or not host:
+        return None
+    try:
+        host = host.encode('idna').decode('ascii')
+    except UnicodeError:
+        return None
+    if ':' in host:
+        host = f"[{host}]"
+    netloc = host if port in (None, DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+
+    path = quote(PERCENT_ESCAPE.sub(normalize_escape, parts.path), safe=PATH_SAFE)
+    path = remove_dot_segments(path)
+    params = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+              if not TRACKING_PARAMS.match(key)]
+    query = urlencode(sorted(params))
+    return urlunsplit((scheme, netloc, path, query, ''))
+
+
+def site_of(url):
+    """The host a crawl of url stays on, without a leading www."""
+    host = urlsplit(url).hostname or ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def crawl_target(url, base, site=None):
+    """
+    The canonical URL a crawl should visit for a link, or None when it is
+    not a page or (with site given) not on that site, subdomains included
+    """
+    url = canonicalize_url(url, base)
+    if url is None or SKIP_EXTENSIONS.search(urlsplit(url).path):
+        return None
+    if site is not None:
+        host = urlsplit(url).hostname or ''
+        if host != site and not host.endswith('.' + site):
+            return None
+    return url
+
+
+def crawl_dir_for(url, max_depth, root=DEFAULT_CRAWL_DIR):
+    """Where the frontier of a crawl of url to max_depth is kept"""
+    key = f"{canonicalize_url(url) or url}|{max_depth}"
+    return Path(root) / hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def key_hashes(key):
+    # Double hashing: every filter derives its k positions from two 64-bit
+    # halves of one digest, so a key is hashed once however many filters exist
+    digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter: about 1.8 bytes per URL at a 0.1% false
+    positive rate. A false positive means a new URL is taken as seen and
+    skipped, never that a page is crawled twice.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def contains_hashed(self, first, second):
+        bits = self.bits
+        size = self.size
+        for i in range(self.hashes):
+            position = (first + i * second) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add_hashed(self, first, second):
+        bits = self.bits
+        size = self.size
+        for i in range(self.hashes):
+            position = (first + i * second) % size
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return self.contains_hashed(*key_hashes(key))
+
+    def add(self, key):
+        self.add_hashed(*key_hashes(key))
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+
+class SeenSet:
+    """
+    Scalable Bloom filter: when the current filter is full a new one twice
+    the size with a tighter error rate is added, so memory grows with the
+    crawl while the overall false positive rate stays below error_rate.
+    """
+
+    def __init__(self, capacity=SEEN_CAPACITY, error_rate=SEEN_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.filters = []
+
+    def __contains__(self, key):
+        hashes = key_hashes(key)
+        return any(bloom.contains_hashed(*hashes) for bloom in self.filters)
+
+    def __len__(self):
+        return sum(bloom.count for bloom in self.filters)
+
+    def add(self, key):
+        """Add key and return True, or return False if it was already seen"""
+        hashes = key_hashes(key)
+        if any(bloom.contains_hashed(*hashes) for bloom in self.filters):
+            return False
+        if not self.filters or self.filters[-1].full:
+            level = len(self.filters)
+            self.filters.append(BloomFilter(self.capacity * 2 ** level,
+                                            self.error_rate / 2 ** (level + 1)))
+        self.filters[-1].add_hashed(*hashes)
+        return True
+
+    def save(self, path):
+        # Header line, then the raw bits of every filter; replaced atomically
+        path = Path(path)
+        header = [{'capacity': bloom.capacity, 'error_rate': bloom.error_rate, 'count': bloom.count}
+                  for bloom in self.filters]
+        temp_path = path.with_suffix('.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(json.dumps({'capacity': self.capacity, 'error_rate': self.error_rate,
+                                'filters': header}).encode('utf-8') + b'\n')
+            for bloom in self.filters:
+                f.write(bloom.bits)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            seen = cls(header['capacity'], header['error_rate'])
+            for entry in header['filters']:
+                bloom = BloomFilter(entry['capacity'], entry['error_rate'])
+                bloom.bits = bytearray(f.read(len(bloom.bits)))
+                bloom.count = entry['count']
+                seen.filters.append(bloom)
+        return seen
+
+
+class CrawlFrontier:
+    """
+    The URLs a crawl has still to visit, kept in SQLite in its directory so a
+    crawl can be paused and resumed, even after a restart. URLs come out
+    breadth first, and within a depth round-robin across hosts so no single
+    host fills a batch. Only URLs on the seed's site (subdomains included) are
+    queued, up to max_depth (the seed is depth 1) and max_pages in total.
+
+    Changes are committed together with the seen-set by checkpoint(); after
+    a crash the crawl resumes from the last checkpoint.
+    """
+
+    def __init__(self, directory, seed=None, max_depth=1, max_pages=DEFAULT_MAX_PAGES, same_site=True):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.seen_file = self.directory / 'seen.bloom'
+        self.connection = sqlite3.connect(self.directory / 'frontier.db', check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                seq INTEGER PRIMARY KEY,
+                url TEXT,
+                depth INTEGER,
+                host TEXT,
+                round INTEGER
+            )
+        """)
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS frontier_order ON frontier (depth, round, seq)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.commit()
+
+        settings = self.load_settings()
+        if settings:
+            # Resuming: the saved settings win over the arguments
+            self.seed = settings['seed']
+            self.max_depth = settings['max_depth']
+            self.max_pages = settings['max_pages']
+            self.same_site = settings['same_site']
+            self.visited = settings['visited']
+            self.seen = SeenSet.load(self.seen_file) if self.seen_file.exists() else SeenSet()
+        else:
+            if seed is None:
+                raise ValueError(f"No crawl to resume in {self.directory}")
+            self.seed = canonicalize_url(seed)
+            if self.seed is None:
+                raise ValueError(f"Cannot crawl {seed}: not an http(s) URL")
+            self.max_depth = max(1, min(int(max_depth), MAX_DEPTH))
+            self.max_pages = max_pages
+            self.same_site = same_site
+            self.visited = 0
+            self.seen = SeenSet()
+
+        self.site = site_of(self.seed)
+        # Next round number per (depth, host) for the round-robin order
+        self.rounds = {(depth, host): last + 1 for depth, host, last in self.connection.execute(
+            "SELECT depth, host, MAX(round) FROM frontier GROUP BY depth, host")}
+
+        if not settings:
+            self.add(self.seed, 1)
+            self.checkpoint()
+
+    @classmethod
+    def exists(cls, directory):
+        return (Path(directory) / 'frontier.db').exists()
+
+    @classmethod
+    def remove(cls, directory):
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def load_settings(self):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'settings'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add(self, url, depth, base=None):
+        """Queue url (resolved against base) at depth; returns True if it was new"""
+        if depth > self.max_depth:
+            return False
+        url = crawl_target(url, base, self.site if self.same_site else None)
+        if url is None:
+            return False
+        if not self.seen.add(url):
+            return False
+        host = urlsplit(url).netloc
+        key = (depth, host)
+        round_number = self.rounds.get(key, 0)
+        self.rounds[key] = round_number + 1
+        self.connection.execute(
+            "INSERT INTO frontier (url, depth, host, round) VALUES (?, ?, ?, ?)",
+            (url, depth, host, round_number))
+        return True
+
+    def add_links(self, links, depth, base):
+        """Queue the links found on base, a page at depth - 1; returns how many were new"""
+        if depth > self.max_depth:
+            return 0
+        return sum(1 for link in links if link and self.add(link, depth, base))
+
+    def pop_batch(self, count=CRAWL_BATCH):
+        """Take the next (url, depth) pairs to visit, at most max_pages in total"""
+        if self.max_pages is not None:
+            count = min(count, self.max_pages - self.visited)
+        if count <= 0:
+            return []
+        rows = self.connection.execute(
+            "SELECT seq, url, depth FROM frontier ORDER BY depth, round, seq LIMIT ?",
+            (count,)).fetchall()
+        self.connection.executemany("DELETE FROM frontier WHERE seq = ?", [(row[0],) for row in rows])
+        self.visited += len(rows)
+        return [(url, depth) for _, url, depth in rows]
+
+    def pending(self):
+        return self.connection.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+
+    @property
+    def finished(self):
+        return self.pending() == 0 or (self.max_pages is not None and self.visited >= self.max_pages)
+
+    def checkpoint(self):
+        """Commit the queue and save the seen-set, so a resume starts from here"""
+        settings = {'seed': self.seed, 'max_depth': self.max_depth, 'max_pages': self.max_pages,
+                    'same_site': self.same_site, 'visited': self.visited}
+        self.seen.save(self.seen_file)
+        self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('settings', ?)", (json.dumps(settings),))
+        self.connection.commit()
+
+    def stats(self):
+        return {
+            'seed': self.seed,
+            'max_depth': self.max_depth,
+            'visited': self.visited,
+            'pending': self.pending(),
+            'seen': len(self.seen)
+        }
+
+    def close(self):
+        self.checkpoint()
+        self.connection.close()
+
+
+def engine_page_loader(engine):
+    """
+    A load_page for run_crawl that fetches through an AsyncFetchEngine, so
+    the engine's host scheduler paces the crawl. URLs disallowed by
+    robots.txt and responses that are not HTML are skipped.
+    """
+    def load_page(url):
+        if not engine.scheduler.can_fetch(url):
+            logger.info(f"Skipping {url}: disallowed by robots.txt")
+            return None
+        result = engine.run(engine.fetch(url))
+        if result is None or result['status'] != 200:
+            return None
+        if 'html' not in (get_header(result['headers'], 'Content-Type') or 'text/html'):
+            return None
+        return decode_body(result)
+    return load_page
+
+
+def run_crawl(frontier, load_page, handle_page, pause_event=None, on_batch=None,
+              batch_size=CRAWL_BATCH):
+    """
+    Drive a crawl until the frontier is exhausted or pause_event is set.
+    load_page(url) returns the page HTML or None, and runs batch_size at a
+    time on worker threads (per-host pacing is the fetcher's job).
+    handle_page(url, depth, html) is called for each page in order on this
+    thread and returns the links found on it. on_batch(stats) is called after
+    every checkpoint. Returns 'paused' or 'done'.
+    """
+    with ThreadPoolExecutor(max_workers=batch_size) as executor:
+        while True:
+            if pause_event is not None and pause_event.is_set():
+                return 'paused'
+            batch = frontier.pop_batch(batch_size)
+            if not batch:
+                return 'done'
+
+            contents = executor.map(lambda entry: load_page(entry[0]), batch)
+            for (url, depth), content in zip(batch, contents):
+                if not content:
+                    continue
+                try:
+                    links = handle_page(url, depth, content)
+                    frontier.add_links(links or (), depth + 1, url)
+                except Exception as e:
+                    logger.error(f"Error crawling {url}: {str(e)}")
+
+            frontier.checkpoint()
+            if on_batch:
+                on_batch(frontier.stats())
@@ -0,0 +1,602 @@
+import os
+import json
+import asyncio
+import time
+import uuid
+import hashlib
+import sqlite3
+import logging
+import argparse
+import multiprocessing
+import concurrent.futures
+from datetime import datetime
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from crawl_frontier import canonicalize_url, crawl_target, site_of, MAX_DEPTH, CRAWL_BATCH
+from extraction import extract_page, collectors_for_options
+from fetch_engine import AsyncFetchEngine, decode_body
+from parsing import make_soup
+from response_cache import get_header
+from scrape_store import ScrapeStore
+from tables import typed_tables
+
+logger = logging.getLogger(__name__)
+
+# URLs are spread over this many shards by a hash of their host; a shard is
+# worked by one worker at a time, so each host is only fetched by one worker
+NUM_SHARDS = 64
+SHARDS_PER_WORKER = 8
+
+# A worker that stops renewing its leases loses its shards and claimed URLs
+# to the other workers after this many seconds
+LEASE_SECONDS = 60
+IDLE_SLEEP = 1.0
+
+# A batch paced by a crawl delay can outlast a lease, so its leases are
+# renewed this often (as a share of the lease) while it is being fetched
+RENEW_FRACTION = 1 / 3
+
+DEFAULT_QUEUE = 'sqlite:///crawl_queue.db'
+WORKER_OPTIONS = {'text': True, 'images': True, 'links': True, 'tables': True, 'metadata': True}
+
+
+def shard_for(url, num_shards=NUM_SHARDS):
+    # A stable hash, so every process and machine agrees on the shard
+    host = urlsplit(url).netloc.encode('utf-8')
+    return int.from_bytes(hashlib.sha1(host).digest()[:8], 'big') % num_shards
+
+
+class SQLiteQueue:
+    """
+    Crawl queue in one SQLite file, shared by worker processes on one
+    machine (or on a filesystem with working locks). The urls table is also
+    the seen-set: a URL is only ever inserted once. Results are written to
+    the scraped_data table of the same file, as read by ScrapeStore.
+    """
+
+    # URL states
+    QUEUED, CLAIMED, DONE = 0, 1, 2
+
+    def __init__(self, path, num_shards=NUM_SHARDS):
+        self.path = path
+        self.num_shards = num_shards
+        # Autocommit; claims and leases take the write lock with BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                shard INTEGER,
+                depth INTEGER,
+                state INTEGER DEFAULT 0,
+                lease_until REAL DEFAULT 0,
+                worker TEXT
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS urls_shard ON urls (shard, state, depth)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS urls_state ON urls (state)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS shards (shard INTEGER PRIMARY KEY, worker TEXT, lease_until REAL)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.store = None
+
+    @contextmanager
+    def transaction(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def configure(self, settings):
+        self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('settings', ?)", (json.dumps(settings),))
+
+    def settings(self):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'settings'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def push(self, entries):
+        """Queue (url, depth) pairs not seen before; returns how many were new"""
+        rows = [(url, shard_for(url, self.num_shards), depth) for url, depth in entries]
+        with self.transaction() as connection:
+            before = connection.total_changes
+            connection.executemany("INSERT OR IGNORE INTO urls (url, shard, depth) VALUES (?, ?, ?)", rows)
+            return connection.total_changes - before
+
+    def has_work(self, connection, shard):
+        return connection.execute(
+            "SELECT 1 FROM urls WHERE shard = ? AND state < ? LIMIT 1", (shard, self.DONE)).fetchone() is not None
+
+    def lease_shards(self, worker, count=SHARDS_PER_WORKER, lease=LEASE_SECONDS):
+        """
+        Renew this worker's leases on shards that still have work, give up the
+        drained ones and take free shards with work, up to count
+        """
+        now = time.time()
+        with self.transaction() as connection:
+            owned = []
+            held = [row[0] for row in connection.execute(
+                "SELECT shard FROM shards WHERE worker = ? AND lease_until >= ?", (worker, now))]
+            for shard in held:
+                if self.has_work(connection, shard):
+                    connection.execute("UPDATE shards SET lease_until = ? WHERE shard = ?", (now + lease, shard))
+                    owned.append(shard)
+                else:
+                    # A drained shard counts against nobody's limit
+                    connection.execute("UPDATE shards SET worker = NULL, lease_until = 0 WHERE shard = ?", (shard,))
+            taken = {row[0] for row in connection.execute(
+                "SELECT shard FROM shards WHERE lease_until >= ?", (now,))}
+            for shard in range(self.num_shards):
+                if len(owned) >= count:
+                    break
+                if shard in taken:
+                    continue
+                if self.has_work(connection, shard):
+                    connection.execute("INSERT OR REPLACE INTO shards VALUES (?, ?, ?)", (shard, worker, now + lease))
+                    owned.append(shard)
+        return owned
+
+    def release_shards(self, worker):
+        with self.transaction() as connection:
+            connection.execute("UPDATE shards SET worker = NULL, lease_until = 0 WHERE worker = ?", (worker,))
+
+    def renew(self, worker, shards, urls, lease=LEASE_SECONDS):
+        """
+        Extend this worker's leases on its shards and on the URLs it claimed
+        from them, while a batch is still being worked
+        """
+        if not shards:
+            return
+        lease_until = time.time() + lease
+        marks = ','.join('?' * len(shards))
+        with self.transaction() as connection:
+            # A shard another worker has taken since is left alone
+            connection.execute(
+                f"UPDATE shards SET lease_until = ? WHERE worker = ? AND shard IN ({marks})",
+                (lease_until, worker, *shards))
+            connection.executemany(
+                "UPDATE urls SET lease_until = ? WHERE url = ? AND worker = ? AND state = ?",
+                [(lease_until, url, worker, self.CLAIMED) for url in urls])
+
+    def claim(self, worker, shards, count=CRAWL_BATCH, lease=LEASE_SECONDS):
+        """Take up to count (url, depth) pairs from shards, shallowest first"""
+        if not shards:
+            return []
+        now = time.time()
+        marks = ','.join('?' * len(shards))
+        with self.transaction() as connection:
+            # URLs claimed by a worker whose lease ran out are handed out again
+            connection.execute(
+                f"UPDATE urls SET state = ? WHERE state = ? AND lease_until < ? AND shard IN ({marks})",
+                (self.QUEUED, self.CLAIMED, now, *shards))
+            rows = connection.execute(
+                f"SELECT url, depth FROM urls WHERE state = ? AND shard IN ({marks}) ORDER BY depth LIMIT ?",
+                (self.QUEUED, *shards, count)).fetchall()
+            connection.executemany(
+                "UPDATE urls SET state = ?, lease_until = ?, worker = ? WHERE url = ?",
+                [(self.CLAIMED, now + lease, worker, url) for url, _ in rows])
+        return rows
+
+    def complete(self, urls):
+        with self.transaction() as connection:
+            connection.executemany("UPDATE urls SET state = ? WHERE url = ?", [(self.DONE, url) for url in urls])
+
+    def store_results(self, records):
+        if self.store is None:
+            self.store = ScrapeStore(self.path, timeout=60)
+        self.store.insert_many(records)
+
+    def idle(self):
+        """True once nothing is queued or claimed anywhere"""
+        return self.connection.execute(
+            "SELECT 1 FROM urls WHERE state < ? LIMIT 1", (self.DONE,)).fetchone() is None
+
+    def stats(self):
+        counts = dict(self.connection.execute("SELECT state, COUNT(*) FROM urls GROUP BY state").fetchall())
+        workers = self.connection.execute(
+            "SELECT COUNT(DISTINCT worker) FROM shards WHERE lease_until >= ?", (time.time(),)).fetchone()[0]
+        return {
+            'queued': counts.get(self.QUEUED, 0),
+            'claimed': counts.get(self.CLAIMED, 0),
+            'done': counts.get(self.DONE, 0),
+            'workers': workers
+        }
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+        self.connection.close()
+
+
+class RedisQueue:
+    """
+    Crawl queue in Redis, for workers spread over several machines. Each
+    shard is a sorted set scored by depth, claimed URLs wait in a per-shard
+    hash until completed, and shard leases are keys that expire. Results are
+    kept in a hash keyed by URL.
+    """
+
+    # Lease keys are only extended or deleted by the worker holding them; the
+    # check and the change are one script, so a lease another worker took in
+    # between is never touched
+    EXTEND_LEASE = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('pexpire', KEYS[1], ARGV[2])
+        end
+        return 0
+    """
+    DROP_LEASE = """
+        if redis.call('get', KEYS[1]) == ARGV[1] then
+            return redis.call('del', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, url, num_shards=NUM_SHARDS, prefix='scraper'):
+        # redis comes with scrapy-redis; only needed for this backend
+        import redis
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.num_shards = num_shards
+        self.prefix = prefix
+        self.extend_lease_script = self.redis.register_script(self.EXTEND_LEASE)
+        self.drop_lease_script = self.redis.register_script(self.DROP_LEASE)
+
+    def key(self, *parts):
+        return ':'.join((self.prefix,) + tuple(str(part) for part in parts))
+
+    def extend_lease(self, worker, shard, lease=LEASE_SECONDS):
+        """Extend worker's lease on shard; False if it no longer holds it"""
+        return bool(self.extend_lease_script(keys=[self.key('lease', shard)], args=[worker, int(lease * 1000)]))
+
+    def drop_lease(self, worker, shard):
+        self.drop_lease_script(keys=[self.key('lease', shard)], args=[worker])
+
+    def configure(self, settings):
+        self.redis.set(self.key('settings'), json.dumps(settings))
+
+    def settings(self):
+        value = self.redis.get(self.key('settings'))
+        return json.loads(value) if value else None
+
+    def push(self, entries):
+        entries = list(entries)
+        pipe = self.redis.pipeline()
+        for url, _ in entries:
+            pipe.sadd(self.key('seen'), url)
+        added = pipe.execute()
+        pipe = self.redis.pipeline()
+        for (url, depth), new in zip(entries, added):
+            if new:
+                pipe.zadd(self.key('queue', shard_for(url, self.num_shards)), {url: depth})
+        pipe.execute()
+        return sum(added)
+
+    def lease_shards(self, worker, count=SHARDS_PER_WORKER, lease=LEASE_SECONDS):
+        shards = range(self.num_shards)
+        pipe = self.redis.pipeline()
+        for shard in shards:
+            pipe.get(self.key('lease', shard))
+            pipe.zcard(self.key('queue', shard))
+            pipe.hlen(self.key('claimed', shard))
+        replies = pipe.execute()
+
+        owned = []
+        for shard in shards:
+            holder, queued, claimed = replies[3 * shard:3 * shard + 3]
+            if holder != worker:
+                continue
+            if queued or claimed:
+                # The lease may have run out and been taken since it was read
+                if self.extend_lease(worker, shard, lease):
+                    owned.append(shard)
+            else:
+                # A drained shard counts against nobody's limit
+                self.drop_lease(worker, shard)
+        for shard in shards:
+            if len(owned) >= count:
+                break
+            holder, queued, claimed = replies[3 * shard:3 * shard + 3]
+            if holder is None and (queued or claimed):
+                if self.redis.set(self.key('lease', shard), worker, nx=True, px=int(lease * 1000)):
+                    owned.append(shard)
+        return owned
+
+    def release_shards(self, worker):
+        for shard in range(self.num_shards):
+            self.drop_lease(worker, shard)
+
+    def renew(self, worker, shards, urls, lease=LEASE_SECONDS):
+        """
+        Extend this worker's leases on its shards and on the URLs it claimed
+        from them, while a batch is still being worked
+        """
+        lease_until = time.time() + lease
+        held = {shard for shard in shards if self.extend_lease(worker, shard, lease)}
+        urls = [url for url in urls if shard_for(url, self.num_shards) in held]
+        pipe = self.redis.pipeline()
+        for url in urls:
+            pipe.hget(self.key('claimed', shard_for(url, self.num_shards)), url)
+        values = pipe.execute()
+        # Claims of a held shard are only changed by its holder, and a URL
+        # already completed is not claimed again
+        pipe = self.redis.pipeline()
+        for url, value in zip(urls, values):
+            if value is not None:
+                depth = value.split()[1]
+                pipe.hset(self.key('claimed', shard_for(url, self.num_shards)), url, f"{lease_until} {depth}")
+        pipe.execute()
+
+    def claim(self, worker, shards, count=CRAWL_BATCH, lease=LEASE_SECONDS):
+        now = time.time()
+        rows = []
+        for shard in shards:
+            # Only from shards this worker still holds, with the lease
+            # extended so it cannot run out under the new claims
+            if not self.extend_lease(worker, shard, lease):
+                continue
+            claimed_key = self.key('claimed', shard)
+            queue_key = self.key('queue', shard)
+            # URLs claimed by a worker whose lease ran out are handed out again
+            for url, value in self.redis.hgetall(claimed_key).items():
+                lease_until, depth = value.split()
+                if float(lease_until) < now:
+                    self.redis.zadd(queue_key, {url: int(depth)})
+                    self.redis.hdel(claimed_key, url)
+            if len(rows) >= count:
+                continue
+            for url, depth in self.redis.zpopmin(queue_key, count - len(rows)):
+                self.redis.hset(claimed_key, url, f"{now + lease} {int(depth)}")
+                rows.append((url, int(depth)))
+        return rows
+
+    def complete(self, urls):
+        pipe = self.redis.pipeline()
+        for url in urls:
+            pipe.hdel(self.key('claimed', shard_for(url, self.num_shards)), url)
+        pipe.execute()
+
+    def store_results(self, records):
+        pipe = self.redis.pipeline()
+        for record in records:
+            pipe.hset(self.key('results'), record['url'], json.dumps(record))
+        pipe.execute()
+
+    def idle(self):
+        pipe = self.redis.pipeline()
+        for shard in range(self.num_shards):
+            pipe.zcard(self.key('queue', shard))
+            pipe.hlen(self.key('claimed', shard))
+        return not any(pipe.execute())
+
+    def stats(self):
+        pipe = self.redis.pipeline()
+        for shard in range(self.num_shards):
+            pipe.zcard(self.key('queue', shard))
+            pipe.hlen(self.key('claimed', shard))
+            pipe.get(self.key('lease', shard))
+        replies = pipe.execute()
+        return {
+            'queued': sum(replies[0::3]),
+            'claimed': sum(replies[1::3]),
+            'done': self.redis.hlen(self.key('results')),
+            'workers': len({holder for holder in replies[2::3] if holder})
+        }
+
+    def close(self):
+        self.redis.close()
+
+
+def sqlite_queue(url):
+    # sqlite:///relative/path.db or sqlite:////absolute/path.db
+    return SQLiteQueue(url[len('sqlite:///'):])
+
+
+# Queue backends by URL scheme; register another factory here to add one
+QUEUE_BACKENDS = {
+    'sqlite': sqlite_queue,
+    'redis': RedisQueue,
+    'rediss': RedisQueue
+}
+
+
+def open_queue(url=DEFAULT_QUEUE):
+    """Open a queue backend from a URL such as sqlite:///crawl.db or redis://host:6379/0"""
+    scheme = url.split('://', 1)[0]
+    if scheme not in QUEUE_BACKENDS:
+        raise ValueError(f"Unknown queue backend {scheme}, expected one of {', '.join(QUEUE_BACKENDS)}")
+    return QUEUE_BACKENDS[scheme](url)
+
+
+def seed_crawl(queue, url, max_depth=1, options=None):
+    """Queue the seed of a crawl and save the settings every worker follows"""
+    seed = canonicalize_url(url)
+    if seed is None:
+        raise ValueError(f"Cannot crawl {url}: not an http(s) URL")
+    queue.configure({
+        'seed': seed,
+        'site': site_of(seed),
+        'max_depth': max(1, min(int(max_depth), MAX_DEPTH)),
+        'options': dict(WORKER_OPTIONS, **(options or {}))
+    })
+    return queue.push([(seed, 1)])
+
+
+def page_record(url, depth, content, options, parser=None):
+    """
+    Extract one page into a record for the results store, in the layout the
+    command line tool stores, and return it with the links found on the page
+    """
+    enabled = dict(options, links=True)
+    collectors = collectors_for_options(enabled)
+    page = extract_page(make_soup(content, parser, collectors), collectors)
+    record = {
+        'alias': url,
+        'name': page.get('title', ''),
+        'url': url,
+        'domain': urlsplit(url).netloc,
+        'title': page.get('title', ''),
+        'scraped_at': datetime.now().strftime("%d/%m/%Y %H:%M:%S"),
+        'status': True,
+        'depth': depth,
+        'all_anchor_href': [link['url'] for link in page['links'] if link['url']]
+    }
+    if 'images' in page:
+        record['all_images_source_data'] = [img['src'] for img in page['images'] if img['src']]
+    if 'headings' in page:
+        for tag in ('h1', 'h2', 'h3'):
+            record[f'all_{tag}_data'] = page['headings'][tag]
+    if 'paragraphs' in page:
+        record['all_p_data'] = page['paragraphs']
+    if 'meta' in page:
+        record['meta'] = page['meta']
+    if 'tables' in page:
+        record['all_tables'] = typed_tables(page['tables'])
+    return record, record['all_anchor_href']
+
+
+class CrawlWorker:
+    """
+    One worker of a sharded crawl: leases shards from the queue, fetches the
+    URLs it claims from them through its own fetch engine (whose host
+    scheduler keeps each host polite, since no other worker has its shard),
+    extracts each page, queues the links found and stores the records.
+    """
+
+    def __init__(self, queue, worker_id=None, shards=SHARDS_PER_WORKER, batch_size=CRAWL_BATCH,
+                 lease=LEASE_SECONDS):
+        self.queue = queue
+        self.id = worker_id or f"{os.uname().nodename}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.max_shards = shards
+        self.batch_size = batch_size
+        self.lease = lease
+        self.engine = AsyncFetchEngine()
+        self.shards = []
+        self.pages = 0
+
+    def run(self, stop_event=None):
+        """Work until the whole crawl is finished or stop_event is set; returns pages done"""
+        settings = self.queue.settings()
+        if settings is None:
+            raise ValueError("The queue has no crawl; seed it first")
+        try:
+            while stop_event is None or not stop_event.is_set():
+                self.shards = self.queue.lease_shards(self.id, self.max_shards, self.lease)
+                batch = self.queue.claim(self.id, self.shards, self.batch_size, self.lease)
+                if batch:
+                    self.process_batch(batch, settings)
+                elif self.queue.idle():
+                    break
+                else:
+                    # Other workers hold the remaining shards
+                    time.sleep(IDLE_SLEEP)
+        finally:
+            self.queue.release_shards(self.id)
+            self.engine.close()
+        return self.pages
+
+    def process_batch(self, batch, settings):
+        depths = dict(batch)
+        # robots.txt is read by the scheduler on the first request to a host
+        allowed = [url for url in depths if self.engine.scheduler.can_fetch(url)]
+        results = self.fetch_renewing(allowed, list(depths))
+        records = []
+        found = []
+        for url, result in results:
+            content = None
+            if result is not None and result['status'] == 200 and \
+                    'html' in (get_header(result['headers'], 'Content-Type') or 'text/html'):
+                content = decode_body(result)
+            if not content:
+                continue
+            try:
+                record, links = page_record(url, depths[url], content, settings['options'])
+            except Exception as e:
+                logger.error(f"Error extracting {url}: {str(e)}")
+                continue
+            records.append(record)
+
+            depth = depths[url] + 1
+            if depth <= settings['max_depth']:
+                for link in links:
+                    target = crawl_target(link, url, settings['site'])
+                    if target is not None:
+                        found.append((target, depth))
+
+        # Links are queued before the batch is completed, so a crash in
+        # between can only repeat work, never lose it
+        if found:
+            self.queue.push(found)
+        if records:
+            self.queue.store_results(records)
+        self.queue.complete(list(depths))
+        self.pages += len(records)
+
+
+    def fetch_renewing(self, urls, claimed):
+        """
+        Fetch urls, renewing the leases on this worker's shards and claimed
+        URLs while it waits: the host scheduler paces a batch from one host by
+        its crawl delay, and no other worker may take the host meanwhile
+        """
+        future = asyncio.run_coroutine_threadsafe(self.engine.fetch_all(urls), self.engine.loop)
+        while True:
+            try:
+                return future.result(timeout=self.lease * RENEW_FRACTION)
+            except concurrent.futures.TimeoutError:
+                self.queue.renew(self.id, self.shards, claimed, self.lease)
+
+
+def run_worker(queue_url, worker_id=None, stop_event=None):
+    queue = open_queue(queue_url)
+    try:
+        pages = CrawlWorker(queue, worker_id).run(stop_event)
+        logger.info(f"Worker {worker_id or os.getpid()} finished after {pages} pages")
+        return pages
+    finally:
+        queue.close()
+
+
+def run_workers(queue_url, processes=None):
+    """Run worker processes on this machine until the crawl is finished"""
+    processes = processes or os.cpu_count() or 1
+    workers = [multiprocessing.Process(target=run_worker, args=(queue_url,)) for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sharded crawl workers. Seed a crawl once, then start workers on any number of "
+                    "machines pointed at the same queue.")
+    parser.add_argument('--queue', default=DEFAULT_QUEUE,
+                        help="queue backend URL: sqlite:///path.db or redis://host:port/db")
+    commands = parser.add_subparsers(dest='command', required=True)
+    seed = commands.add_parser('seed', help="queue the first URL of a crawl")
+    seed.add_argument('url')
+    seed.add_argument('--depth', type=int, default=2)
+    work = commands.add_parser('work', help="run worker processes until the crawl is finished")
+    work.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    commands.add_parser('status', help="show queue counts")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'work':
+        run_workers(args.queue, args.processes)
+        return
+
+    queue = open_queue(args.queue)
+    try:
+        if args.command == 'seed':
+            added = seed_crawl(queue, args.url, args.depth)
+            print(f"Queued {args.url} to depth {args.depth}" if added else f"{args.url} is already queued")
+        print(json.dumps(queue.stats()))
+    finally:
+        queue.close()
+
+
+if __name__ == '__main__':
+    main()
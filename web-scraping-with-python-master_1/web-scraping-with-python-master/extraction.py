@@ -0,0 +1,244 @@
+from bs4 import Tag
+
+# Every collector the extractor knows about
+COLLECTORS = ('title', 'text', 'headings', 'links', 'images', 'videos', 'meta', 'tables')
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+
+# Tags each collector reads, used to build partial-parse strainers
+COLLECTOR_TAGS = {
+    'title': ('title',),
+    'text': ('p',),
+    'headings': HEADING_TAGS,
+    'links': ('a',),
+    'images': ('img',),
+    'videos': ('video', 'iframe'),
+    'meta': ('meta',),
+    'tables': ('table',)
+}
+
+# Upper bound for rowspan/colspan, so a malformed attribute cannot blow up a table
+MAX_SPAN = 1000
+
+# Collectors needed by each scraping option shown in the front ends
+OPTION_COLLECTORS = {
+    'text': ('title', 'text', 'headings'),
+    'links': ('links',),
+    'images': ('images',),
+    'videos': ('videos',),
+    'metadata': ('title', 'meta'),
+    'tables': ('tables',)
+}
+
+
+def collectors_for_options(options):
+    """
+    Turn an options dict of {option name: enabled} into the list of collectors it needs
+    """
+    collectors = []
+    for option, enabled in options.items():
+        if enabled:
+            for collector in OPTION_COLLECTORS.get(option, ()):
+                if collector not in collectors:
+                    collectors.append(collector)
+    return collectors
+
+
+def new_page_record(collectors=COLLECTORS):
+    """
+    Build the empty result dict for the enabled collectors
+    """
+    page = {}
+    if 'title' in collectors:
+        page['title'] = ''
+    if 'text' in collectors:
+        page['paragraphs'] = []
+    if 'headings' in collectors:
+        page['headings'] = {tag: [] for tag in HEADING_TAGS}
+    if 'links' in collectors:
+        page['links'] = []
+    if 'images' in collectors:
+        page['images'] = []
+    if 'videos' in collectors:
+        page['videos'] = []
+    if 'meta' in collectors:
+        page['meta'] = {}
+    if 'tables' in collectors:
+        page['tables'] = []
+    return page
+
+
+def cell_span(cell, attribute):
+    value = cell.attrs.get(attribute)
+    if value is None:
+        return 1
+    try:
+        return min(max(int(value), 1), MAX_SPAN)
+    except (TypeError, ValueError):
+        return 1
+
+
+def table_rows(node, in_head=False):
+    """
+    Yield (tr, in_thead) for the rows of a table, walking child tags directly
+    rather than through find_all() and skipping tables nested in cells
+    """
+    for child in node.children:
+        name = child.name
+        if name == 'tr':
+            yield child, in_head
+        elif name in ('thead', 'tbody', 'tfoot'):
+            yield from table_rows(child, name == 'thead')
+
+
+def read_table(table):
+    """
+    Lay a <table> out on a grid with rowspan and colspan resolved, and return it
+    column by column: {'caption', 'columns': header names, 'data': [column values]}.
+    Leading rows made only of <th> cells (or inside <thead>) become the header;
+    stacked header rows are joined as "Top / Sub". Rows of nested tables are
+    left to those tables.
+    """
+    grid = []
+    header_rows = 0
+    in_header = True
+    spans = {}
+
+    for row, in_head_section in table_rows(table):
+        values = []
+        header_cells = []
+        column = 0
+
+        def take_spanned():
+            remaining, text, is_header = spans[column]
+            values.append(text)
+            header_cells.append(is_header)
+            if remaining == 1:
+                del spans[column]
+            else:
+                spans[column] = (remaining - 1, text, is_header)
+
+        for cell in row.children:
+            if cell.name != 'td' and cell.name != 'th':
+                continue
+            while column in spans:
+                take_spanned()
+                column += 1
+            text = cell.get_text(' ', strip=True)
+            is_header = cell.name == 'th'
+            rowspan = cell_span(cell, 'rowspan')
+            for _ in range(cell_span(cell, 'colspan')):
+                values.append(text)
+                header_cells.append(is_header)
+                if rowspan > 1:
+                    spans[column] = (rowspan - 1, text, is_header)
+                column += 1
+
+        # Cells spanning down past the end of this row's own cells
+        while spans and column <= max(spans):
+            if column in spans:
+                take_spanned()
+            else:
+                values.append('')
+                header_cells.append(False)
+            column += 1
+
+        if not values:
+            continue
+        if in_header and (all(header_cells) or in_head_section):
+            header_rows += 1
+        else:
+            in_header = False
+        grid.append(values)
+
+    width = max((len(values) for values in grid), default=0)
+    for values in grid:
+        values.extend([''] * (width - len(values)))
+
+    columns = []
+    for index in range(width):
+        parts = []
+        for values in grid[:header_rows]:
+            if values[index] and values[index] not in parts:
+                parts.append(values[index])
+        columns.append(' / '.join(parts) or f"Column {index + 1}")
+
+    body = grid[header_rows:]
+    caption = table.find('caption', recursive=False)
+    return {
+        'caption': caption.get_text(' ', strip=True) if caption else '',
+        'columns': columns,
+        'data': [[values[index] for values in body] for index in range(width)]
+    }
+
+
+def extract_page(soup, collectors=COLLECTORS, keep_html=False):
+    """
+    Walk the parsed document once and feed every enabled collector from that
+    single pass. Text values are kept exactly as get_text() returns them so each
+    front end can format them the way it always has. When keep_html is True the
+    raw markup of anchors and images is kept as well.
+    """
+    page = new_page_record(collectors)
+    handlers = {}
+
+    if 'title' in collectors:
+        def on_title(tag):
+            if not page['title']:
+                page['title'] = tag.get_text()
+
+        handlers['title'] = on_title
+
+    if 'text' in collectors:
+        handlers['p'] = lambda tag: page['paragraphs'].append(tag.get_text())
+
+    if 'headings' in collectors:
+        def on_heading(tag):
+            page['headings'][tag.name].append(tag.get_text())
+
+        for name in HEADING_TAGS:
+            handlers[name] = on_heading
+
+    if 'links' in collectors:
+        def on_link(tag):
+            link = {'url': tag.get('href'), 'text': tag.get_text()}
+            if keep_html:
+                link['html'] = str(tag)
+            page['links'].append(link)
+
+        handlers['a'] = on_link
+
+    if 'images' in collectors:
+        def on_image(tag):
+            image = {'src': tag.get('src'), 'alt': tag.get('alt', '')}
+            if keep_html:
+                image['html'] = str(tag)
+            page['images'].append(image)
+
+        handlers['img'] = on_image
+
+    if 'videos' in collectors:
+        def on_video(tag):
+            page['videos'].append({'tag': tag.name, 'src': tag.get('src')})
+
+        handlers['video'] = on_video
+        handlers['iframe'] = on_video
+
+    if 'meta' in collectors:
+        def on_meta(tag):
+            name = tag.get('name', '') or tag.get('property', '')
+            # First occurrence wins, matching soup.find()
+            if name and name not in page['meta']:
+                page['meta'][name] = tag.get('content', '')
+
+        handlers['meta'] = on_meta
+
+    if 'tables' in collectors:
+        handlers['table'] = lambda tag: page['tables'].append(read_table(tag))
+
+    for node in soup.descendants:
+        # Text nodes have no name, so they fall through the lookup
+        handler = handlers.get(node.name)
+        if handler is not None and isinstance(node, Tag):
+            handler(node)
+
+    return page
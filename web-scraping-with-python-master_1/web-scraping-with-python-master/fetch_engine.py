@@ -0,0 +1,271 @@
+import asyncio
+import aiohttp
+import atexit
+import logging
+import os
+import threading
+from host_scheduler import HostScheduler, THROTTLE_STATUSES
+from text_encoding import decode_html
+
+logger = logging.getLogger(__name__)
+
+# Default limits for the shared connection pool
+MAX_CONNECTIONS = 1000
+MAX_CONNECTIONS_PER_HOST = 50
+REQUEST_TIMEOUT = 10
+CHUNK_SIZE = 64 * 1024
+
+# Chunks a BodyStream holds before the download waits for its reader
+STREAM_QUEUE_CHUNKS = 16
+USER_AGENT = 'Mozilla/5.0 (compatible; WebScraper/1.0)'
+
+# A 429/503 is retried this many times, after the wait the host asked for
+THROTTLE_RETRIES = 2
+
+
+class AsyncFetchEngine:
+    """
+    Runs one asyncio event loop on a background thread with one shared
+    aiohttp.ClientSession. Blocking callers (Flask handlers, worker threads)
+    submit coroutines with run(); all requests share the same connection pool,
+    which enforces both the global and the per-host connection limits.
+    Every request first takes a slot from the HostScheduler, which paces each
+    host and adapts how many requests it gets at once.
+    """
+
+    def __init__(self, max_connections=MAX_CONNECTIONS,
+                 max_connections_per_host=MAX_CONNECTIONS_PER_HOST,
+                 timeout=REQUEST_TIMEOUT, respect_robots=True):
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = timeout
+        self.session = None
+        self.scheduler = HostScheduler(robots_fetcher=self.fetch_robots if respect_robots else None)
+
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+        # Close the session while the loop thread is still alive
+        atexit.register(self.close)
+
+    def run(self, coro):
+        """Run a coroutine on the engine loop and block until it finishes"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def get_session(self):
+        # The session must be created on the engine loop, so it is built lazily
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                ttl_dns_cache=300
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={'User-Agent': USER_AGENT}
+            )
+        return self.session
+
+    async def fetch_robots(self, url):
+        """Fetch a robots.txt outside the scheduler; returns its text or None"""
+        session = await self.get_session()
+        try:
+            async with session.get(url) as response:
+                if response.status == 200:
+                    return await response.text(errors='replace')
+        except Exception as e:
+            logger.error(f"Error fetching {url}: {str(e)}")
+        return None
+
+    async def fetch(self, url, headers=None):
+        """
+        Fetch a URL and return a dict with the final url, status, response
+        headers and raw body bytes, or None if the request failed.
+        """
+        session = await self.get_session()
+        for attempt in range(THROTTLE_RETRIES + 1):
+            ticket = await self.scheduler.acquire(url)
+            status = None
+            response_headers = None
+            try:
+                async with session.get(url, headers=headers) as response:
+                    ticket.responded()
+                    status = response.status
+                    response_headers = response.headers
+                    if status in THROTTLE_STATUSES and attempt < THROTTLE_RETRIES:
+                        continue
+                    content = await response.read()
+                    return {
+                        'url': str(response.url),
+                        'status': response.status,
+                        'headers': dict(response.headers),
+                        'encoding': response.charset,
+                        'content': content
+                    }
+            except Exception as e:
+                logger.error(f"Error fetching {url}: {str(e)}")
+                return None
+            finally:
+                await self.scheduler.release(ticket, status, response_headers)
+
+    async def stream(self, url, write, chunk_size=CHUNK_SIZE, on_response=None):
+        """
+        Stream the body of a 200 response to write(chunk) without holding it in
+        memory; on_response(status, headers) is called once the final response
+        is in, before the first chunk. write may
+        be a coroutine function, awaited for every chunk, so a slow reader holds
+        the download back. Returns the response status, or None if the request
+        failed.
+        """
+        session = await self.get_session()
+        is_async = asyncio.iscoroutinefunction(write)
+        # A streamed body may take longer than the timeout as a whole, as long
+        # as data keeps coming; reads paused for a slow writer do not count
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout)
+        for attempt in range(THROTTLE_RETRIES + 1):
+            ticket = await self.scheduler.acquire(url)
+            status = None
+            response_headers = None
+            hung_up = False
+            try:
+                async with session.get(url, timeout=timeout) as response:
+                    ticket.responded()
+                    response_headers = response.headers
+                    # Known before the body is read, so a reader that stops
+                    # early still reports how the host answered
+                    status = response.status
+                    if status in THROTTLE_STATUSES and attempt < THROTTLE_RETRIES:
+                        continue
+                    if on_response is not None:
+                        on_response(status, response.headers)
+                    if status == 200:
+                        async for chunk in response.content.iter_chunked(chunk_size):
+                            if is_async:
+                                await write(chunk)
+                            else:
+                                write(chunk)
+                    return status
+            except asyncio.CancelledError:
+                # The caller hung up (BodyStream.close), which says nothing
+                # about the host
+                hung_up = True
+                raise
+            except Exception as e:
+                logger.error(f"Error streaming {url}: {str(e)}")
+                status = None
+                return None
+            finally:
+                if hung_up and status is None:
+                    await self.scheduler.abandon(ticket)
+                else:
+                    await self.scheduler.release(ticket, status, response_headers)
+
+    def open_stream(self, url, chunk_size=CHUNK_SIZE):
+        """Start streaming a body to a blocking caller; see BodyStream"""
+        return BodyStream(self, url, chunk_size)
+
+    async def download(self, url, filepath):
+        """Download a URL to filepath, returning True on a 200 response"""
+        with open(filepath, 'wb') as f:
+            status = await self.stream(url, f.write)
+        if status != 200:
+            os.remove(filepath)
+            return False
+        return True
+
+    async def fetch_all(self, urls, callback=None):
+        """
+        Fetch many URLs concurrently. Results are returned in completion order
+        and passed to callback(url, result) as each one finishes.
+        """
+        async def fetch_one(url):
+            return url, await self.fetch(url)
+
+        results = []
+        for task in asyncio.as_completed([fetch_one(url) for url in urls]):
+            url, result = await task
+            if callback:
+                callback(url, result)
+            results.append((url, result))
+        return results
+
+    def host_stats(self):
+        """Current per-host limits and counters from the scheduler"""
+        return self.scheduler.stats()
+
+    async def close_session(self):
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    def close(self):
+        if self.loop.is_closed() or not self.thread.is_alive():
+            return
+        try:
+            # Bounded waits: during interpreter shutdown the loop thread may
+            # already be frozen and would never answer
+            future = asyncio.run_coroutine_threadsafe(self.close_session(), self.loop)
+            future.result(timeout=5)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
+        except Exception as e:
+            logger.error(f"Error closing fetch engine: {str(e)}")
+
+
+def decode_body(result):
+    """
+    Decode a fetch result body once, with the encoding resolved from its BOM,
+    the charset from the response headers or its <meta charset>
+    """
+    if not result:
+        return None
+    return decode_html(result['content'], result['encoding'])
+
+
+class BodyStream:
+    """
+    Iterates, on a blocking thread, over the chunks of a body the engine loop
+    streams, so the caller can work on each chunk while the rest downloads.
+    At most max_chunks wait between the two: past that the download stalls
+    until the reader catches up, so a slow reader never has the whole body
+    buffered. status and headers are set as soon as the response is in, before
+    the first chunk. close() cancels a download that is no longer wanted.
+    """
+
+    # Marks the end of the body in the queue
+    END = object()
+
+    def __init__(self, engine, url, chunk_size=CHUNK_SIZE, max_chunks=STREAM_QUEUE_CHUNKS):
+        self.url = url
+        self.loop = engine.loop
+        self.headers = {}
+        self.status = None
+        self.closed = False
+        self.chunks = asyncio.Queue(maxsize=max_chunks)
+        self.future = asyncio.run_coroutine_threadsafe(self.produce(engine, chunk_size), self.loop)
+
+    async def produce(self, engine, chunk_size):
+        try:
+            return await engine.stream(self.url, self.chunks.put, chunk_size, self.set_response)
+        finally:
+            # Nobody reads the end marker of a closed stream, and it could wait forever
+            if not self.closed:
+                await self.chunks.put(self.END)
+
+    def set_response(self, status, headers):
+        self.status = status
+        self.headers = dict(headers)
+
+    def __iter__(self):
+        while True:
+            chunk = asyncio.run_coroutine_threadsafe(self.chunks.get(), self.loop).result()
+            if chunk is self.END:
+                break
+            yield chunk
+        if not self.future.cancelled():
+            self.status = self.future.result()
+
+    def close(self):
+        self.closed = True
+        self.future.cancel()
@@ -0,0 +1,269 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+logger = logging.getLogger(__name__)
+
+# Concurrency per host starts here and moves between the bounds with AIMD
+INITIAL_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 32
+DECREASE_FACTOR = 0.5
+
+# Token bucket per host: sustained requests per second and burst size. The
+# burst covers a typical page and its images; Crawl-delay lowers the rate
+REQUEST_RATE = 50.0
+BURST = 50
+
+# Latency above this multiple of the host's best observed latency counts as
+# congestion, just like a 429 or 503
+LATENCY_TOLERANCE = 2.0
+LATENCY_SMOOTHING = 0.2
+
+# Back-off when a throttling response carries no Retry-After
+DEFAULT_BACKOFF = 1.0
+MAX_BACKOFF = 300.0
+
+THROTTLE_STATUSES = (429, 503)
+ROBOTS_AGENT = 'WebScraper'
+MAX_HOSTS = 10000
+
+
+def host_of(url):
+    return urlsplit(url).netloc.lower()
+
+
+def retry_after_seconds(value):
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostState:
+    """Scheduling state and counters for one host"""
+
+    def __init__(self, host, limit, rate, burst):
+        self.host = host
+        self.limit = float(limit)
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.refilled_at = time.monotonic()
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.backoff = DEFAULT_BACKOFF
+        self.crawl_delay = None
+        self.robots = None
+        self.robots_ready = None
+
+        self.latency = None
+        self.best_latency = None
+        self.last_decrease = 0.0
+
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.changed = asyncio.Condition()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def wait_time(self, now):
+        """Seconds until a request may start, ignoring the concurrency limit"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def decrease(self, now):
+        # At most one decrease per round trip, so one burst of bad responses
+        # does not collapse the limit to the floor
+        if now - self.last_decrease >= (self.latency or 0):
+            self.limit = max(MIN_CONCURRENCY, self.limit * DECREASE_FACTOR)
+            self.last_decrease = now
+
+    def increase(self):
+        # Additive increase: about one more slot per window of successes
+        self.limit = min(MAX_CONCURRENCY, self.limit + 1 / self.limit)
+
+    def to_dict(self, now):
+        return {
+            'limit': round(self.limit, 2),
+            'in_flight': self.in_flight,
+            'rate': self.rate,
+            'crawl_delay': self.crawl_delay,
+            'blocked_for': round(max(0.0, self.blocked_until - now), 2),
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'requests': self.requests,
+            'throttled': self.throttled,
+            'errors': self.errors
+        }
+
+
+class Ticket:
+    """Permission for one request to one host, returned by acquire()"""
+
+    def __init__(self, state):
+        self.state = state
+        self.started_at = time.monotonic()
+        self.responded_at = None
+
+    def responded(self):
+        """Mark the response headers as received, for latency measurement"""
+        self.responded_at = time.monotonic()
+
+
+class HostScheduler:
+    """
+    Per-host politeness and concurrency control for the fetch engine. Each host
+    gets a token bucket (capped further by robots.txt Crawl-delay) and a
+    concurrency limit that grows additively while responses stay fast and is
+    halved on 429/503, errors or a latency spike. Retry-After pauses the host
+    for the time it asks for. Must be used from a single event loop.
+    """
+
+    def __init__(self, initial_limit=INITIAL_CONCURRENCY, rate=REQUEST_RATE, burst=BURST,
+                 robots_fetcher=None, max_hosts=MAX_HOSTS):
+        self.initial_limit = initial_limit
+        self.rate = rate
+        self.burst = burst
+        self.robots_fetcher = robots_fetcher
+        self.max_hosts = max_hosts
+        self.hosts = OrderedDict()
+
+    async def host_state(self, url):
+        parts = urlsplit(url)
+        host = parts.netloc.lower()
+        state = self.hosts.get(host)
+        if state is None:
+            state = HostState(host, self.initial_limit, self.rate, self.burst)
+            self.hosts[host] = state
+            self.forget_idle_hosts()
+            if self.robots_fetcher is not None and parts.scheme in ('http', 'https'):
+                robots_url = f"{parts.scheme}://{parts.netloc}/robots.txt"
+                state.robots_ready = asyncio.ensure_future(self.load_robots(state, robots_url))
+        else:
+            self.hosts.move_to_end(host)
+
+        if state.robots_ready is not None:
+            await asyncio.shield(state.robots_ready)
+        return state
+
+    def forget_idle_hosts(self):
+        for host in list(self.hosts):
+            if len(self.hosts) <= self.max_hosts:
+                return
+            state = self.hosts[host]
+            if state.in_flight == 0 and time.monotonic() >= state.blocked_until:
+                del self.hosts[host]
+
+    async def load_robots(self, state, robots_url):
+        try:
+            text = await self.robots_fetcher(robots_url)
+        except Exception as e:
+            logger.error(f"Error loading {robots_url}: {str(e)}")
+            text = None
+        if not text:
+            return
+
+        parser = RobotFileParser(robots_url)
+        parser.parse(text.splitlines())
+        # The parser answers nothing until it is marked as loaded
+        parser.modified()
+        state.robots = parser
+        delay = parser.crawl_delay(ROBOTS_AGENT)
+        if delay:
+            state.crawl_delay = float(delay)
+            state.rate = min(state.rate, 1 / float(delay))
+            state.burst = 1
+            state.tokens = min(state.tokens, 1.0)
+
+    def can_fetch(self, url):
+        """Whether robots.txt (if already loaded for the host) allows url"""
+        state = self.hosts.get(host_of(url))
+        if state is None or state.robots is None:
+            return True
+        return state.robots.can_fetch(ROBOTS_AGENT, url)
+
+    async def acquire(self, url):
+        """Wait until the host of url may take another request"""
+        state = await self.host_state(url)
+        async with state.changed:
+            while True:
+                now = time.monotonic()
+                wait = state.wait_time(now)
+                if wait <= 0 and state.in_flight < max(MIN_CONCURRENCY, int(state.limit)):
+                    state.tokens -= 1
+                    state.in_flight += 1
+                    state.requests += 1
+                    return Ticket(state)
+                try:
+                    await asyncio.wait_for(state.changed.wait(), wait if wait > 0 else None)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, ticket, status=None, headers=None):
+        """
+        Report how the request went: status None means it failed outright.
+        Adjusts the host's limit and honours Retry-After.
+        """
+        state = ticket.state
+        now = time.monotonic()
+        async with state.changed:
+            state.in_flight -= 1
+
+            if status is None or status in THROTTLE_STATUSES:
+                if status is None:
+                    state.errors += 1
+                else:
+                    state.throttled += 1
+                    retry_after = retry_after_seconds((headers or {}).get('Retry-After'))
+                    delay = retry_after if retry_after is not None else state.backoff
+                    state.blocked_until = max(state.blocked_until, now + min(delay, MAX_BACKOFF))
+                    state.backoff = min(state.backoff * 2, MAX_BACKOFF)
+                state.decrease(now)
+            else:
+                state.backoff = DEFAULT_BACKOFF
+                latency = (ticket.responded_at or now) - ticket.started_at
+                if state.latency is None:
+                    state.latency = latency
+                else:
+                    state.latency += LATENCY_SMOOTHING * (latency - state.latency)
+                if state.best_latency is None or state.latency < state.best_latency:
+                    state.best_latency = state.latency
+
+                if state.latency > LATENCY_TOLERANCE * state.best_latency:
+                    state.decrease(now)
+                else:
+                    state.increase()
+
+            state.changed.notify_all()
+
+    async def abandon(self, ticket):
+        """Give back the slot of a request the caller cancelled, without judging the host by it"""
+        state = ticket.state
+        async with state.changed:
+            state.in_flight -= 1
+            state.changed.notify_all()
+
+    def limit_for(self, url_or_host):
+        state = self.hosts.get(host_of(url_or_host) if '/' in url_or_host else url_or_host.lower())
+        return state.limit if state is not None else float(self.initial_limit)
+
+    def stats(self):
+        now = time.monotonic()
+        return {host: state.to_dict(now) for host, state in list(self.hosts.items())}
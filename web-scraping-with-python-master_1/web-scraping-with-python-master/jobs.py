@@ -0,0 +1,225 @@
+import uuid
+import queue
+import shutil
+import logging
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = 4
+MAX_QUEUED_JOBS = 100
+MAX_RETAINED_JOBS = 500
+STREAM_HEARTBEAT = 15
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    """
+    State for one scrape request: its own id, output directory and results,
+    so concurrent requests never share mutable scraper state.
+    """
+
+    def __init__(self, url, options, base_dir):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.options = options
+        self.status = 'queued'
+        self.error = None
+        self.scraped_data = {}
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+
+        # Crawl jobs stop at the next checkpoint once a pause is requested,
+        # and set paused if work was left in their frontier
+        self.pause_requested = threading.Event()
+        self.paused = False
+
+        # Extraction results in the order they were produced, for streaming
+        self.events = []
+        self.events_closed = False
+        self.events_changed = threading.Condition()
+
+        self.output_dir = base_dir / self.id
+        self.text_dir = self.output_dir / "text"
+        self.metadata_dir = self.output_dir / "metadata"
+        self.videos_dir = self.output_dir / "videos"
+        for directory in (self.text_dir, self.metadata_dir, self.videos_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed', 'paused')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'url': self.url,
+            'status': self.status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+    def publish(self, event, last=False):
+        with self.events_changed:
+            self.events.append(event)
+            self.events_closed = self.events_closed or last
+            self.events_changed.notify_all()
+
+    def stream_events(self, heartbeat=STREAM_HEARTBEAT):
+        """
+        Yield every event published so far and then each new one as it
+        arrives, until the final event is published. A heartbeat event is yielded when
+        nothing happened for heartbeat seconds, to keep connections open.
+        """
+        position = 0
+        while True:
+            with self.events_changed:
+                if position >= len(self.events) and not self.events_closed:
+                    self.events_changed.wait(heartbeat)
+                new_events = self.events[position:]
+                position = len(self.events)
+                finished = self.events_closed
+
+            if not new_events and not finished:
+                yield {'type': 'heartbeat'}
+            for event in new_events:
+                yield event
+            if finished and not new_events:
+                return
+
+    def reopen(self):
+        # A resumed job streams new events after the ones already sent
+        self.status = 'queued'
+        self.pause_requested.clear()
+        self.paused = False
+        with self.events_changed:
+            self.events_closed = False
+
+    def cleanup(self):
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+
+class JobManager:
+    """
+    Bounded job queue served by a fixed pool of worker threads. submit()
+    refuses new work with JobQueueFull once max_queued jobs are waiting, and
+    only the most recent max_retained jobs are kept for status lookups.
+    """
+
+    def __init__(self, run_job, base_dir, max_workers=MAX_WORKERS,
+                 max_queued=MAX_QUEUED_JOBS, max_retained=MAX_RETAINED_JOBS,
+                 on_finished=None):
+        self.run_job = run_job
+        self.on_finished = on_finished
+        self.base_dir = base_dir
+        self.max_retained = max_retained
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self.worker_loop, name=f"scrape-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, url, options):
+        job = Job(url, options, self.base_dir)
+        with self.lock:
+            self.jobs[job.id] = job
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job.id]
+            job.cleanup()
+            raise JobQueueFull(f"{self.queue.maxsize} jobs already waiting")
+
+        with self.lock:
+            self.forget_old_jobs()
+        return job
+
+    def resume(self, job):
+        """Queue a paused job again; it continues from its saved frontier"""
+        job.reopen()
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            job.status = 'paused'
+            job.paused = True
+            with job.events_changed:
+                job.events_closed = True
+            raise JobQueueFull(f"{self.queue.maxsize} jobs already waiting")
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def latest(self, finished=True):
+        """Return the most recently submitted job, optionally only finished ones"""
+        with self.lock:
+            for job in reversed(self.jobs.values()):
+                if job.finished or not finished:
+                    return job
+        return None
+
+    def list(self):
+        with self.lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def stats(self):
+        with self.lock:
+            statuses = [job.status for job in self.jobs.values()]
+        return {
+            'queued': self.queue.qsize(),
+            'max_queued': self.queue.maxsize,
+            'workers': len(self.workers),
+            'running': statuses.count('running'),
+            'done': statuses.count('done'),
+            'paused': statuses.count('paused'),
+            'failed': statuses.count('failed')
+        }
+
+    def forget_old_jobs(self):
+        # Caller holds the lock; only finished jobs are dropped. Paused jobs
+        # are kept, since dropping one deletes the frontier it resumes from
+        excess = len(self.jobs) - self.max_retained
+        for job_id in list(self.jobs):
+            if excess <= 0:
+                break
+            job = self.jobs[job_id]
+            if job.finished and job.status != 'paused':
+                del self.jobs[job_id]
+                job.cleanup()
+                excess -= 1
+
+    def worker_loop(self):
+        while True:
+            job = self.queue.get()
+            job.status = 'running'
+            job.started_at = datetime.now().isoformat()
+            try:
+                success = self.run_job(job)
+                if success:
+                    job.status = 'paused' if job.paused else 'done'
+                else:
+                    job.status = 'failed'
+            except Exception as e:
+                logger.error(f"Error running job {job.id}: {str(e)}")
+                job.status = 'failed'
+                job.error = str(e)
+            finally:
+                job.finished_at = datetime.now().isoformat()
+                job.publish({'type': 'status', 'status': job.status, 'error': job.error}, last=True)
+                self.queue.task_done()
+            if self.on_finished:
+                self.on_finished(job)
@@ -0,0 +1,131 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from extraction import extract_page, COLLECTORS
+from parsing import make_soup
+from text_encoding import decode_html
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for parsing; 0 parses every page in the calling thread
+PARSE_WORKERS = int(os.environ.get('SCRAPER_PARSE_WORKERS') or os.cpu_count() or 1)
+
+# Pages smaller than this are parsed in the calling thread, where that is
+# cheaper than shipping the bytes to a worker and the record back
+INLINE_PARSE_BYTES = 16 * 1024
+
+# The pool is started from processes already running fetch threads and event
+# loops, and forking those can copy a lock held by another thread into a
+# worker; workers are started fresh instead (forkserver, or spawn where that
+# is not available)
+START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Imported once by the fork server, so workers forked from it start with the
+# parser loaded. The default would also run the main script in the fork server.
+FORKSERVER_PRELOAD = ['parse_pool']
+
+
+def worker_context():
+    context = multiprocessing.get_context(START_METHOD)
+    if START_METHOD == 'forkserver':
+        context.set_forkserver_preload(FORKSERVER_PRELOAD)
+    return context
+
+
+def parse_and_extract(content, encoding=None, parser=None, collectors=COLLECTORS, keep_html=False):
+    """
+    Decode, parse and extract one page. Runs in a worker process, so it takes
+    the raw body and returns only the picklable extraction record (never the
+    tree) together with the seconds spent on it.
+    """
+    started = time.perf_counter()
+    # encoding is the charset from the response headers, if any; the BOM and
+    # <meta charset> are checked here, off the fetching threads
+    content = decode_html(content, encoding)
+    page = extract_page(make_soup(content, parser, collectors), collectors, keep_html)
+    return page, time.perf_counter() - started
+
+
+class ParsePool:
+    """
+    Runs parse_and_extract on a pool of worker processes, so parsing scales
+    with the number of cores while fetching stays on threads and the event
+    loop. Callers block in extract() without holding the GIL, and a broken
+    pool falls back to parsing in the calling thread.
+    """
+
+    def __init__(self, workers=PARSE_WORKERS, inline_bytes=INLINE_PARSE_BYTES):
+        self.workers = workers
+        self.inline_bytes = inline_bytes
+        self.executor = None
+        self.lock = threading.Lock()
+        self.counters = {
+            'pages': 0,
+            'inline': 0,
+            'bytes': 0,
+            'parse_seconds': 0.0,
+            'transfer_seconds': 0.0,
+            'failures': 0
+        }
+
+    def get_executor(self):
+        # Workers are started on first use, so importing this costs nothing
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context())
+            return self.executor
+
+    def extract(self, content, encoding=None, parser=None, collectors=COLLECTORS, keep_html=False):
+        """
+        Parse and extract one page; content is the raw body (with the charset
+        from its headers, if any) or already decoded HTML. Returns (page,
+        parse_seconds).
+        """
+        args = (content, encoding, parser, tuple(collectors), keep_html)
+        started = time.perf_counter()
+        inline = self.workers <= 0 or len(content) < self.inline_bytes
+        if not inline:
+            try:
+                page, seconds = self.get_executor().submit(parse_and_extract, *args).result()
+            except BrokenProcessPool as e:
+                logger.error(f"Error in parse pool: {str(e)}")
+                self.reset()
+                inline = True
+        if inline:
+            page, seconds = parse_and_extract(*args)
+
+        with self.lock:
+            self.counters['pages'] += 1
+            self.counters['bytes'] += len(content)
+            self.counters['parse_seconds'] += seconds
+            if inline:
+                self.counters['inline'] += 1
+            else:
+                # Pickling and queueing, the price of parsing out of process
+                self.counters['transfer_seconds'] += time.perf_counter() - started - seconds
+        return page, seconds
+
+    def reset(self):
+        with self.lock:
+            self.counters['failures'] += 1
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats['workers'] = self.workers
+        stats['parse_seconds'] = round(stats['parse_seconds'], 3)
+        stats['transfer_seconds'] = round(stats['transfer_seconds'], 3)
+        return stats
+
+    def close(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown()
@@ -0,0 +1,69 @@
+import os
+import re
+import logging
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+from extraction import COLLECTOR_TAGS
+
+logger = logging.getLogger(__name__)
+
+# Parser backends the front ends let you choose from, fastest first
+PARSER_BACKENDS = ('lxml', 'html.parser', 'html5lib')
+DEFAULT_PARSER = os.environ.get('SCRAPER_PARSER', 'lxml')
+
+# Collectors that only ever read the document <head>
+HEAD_COLLECTORS = {'title', 'meta'}
+
+HEAD_END_RE = re.compile(r'</head\s*>', re.IGNORECASE)
+HEAD_END_BYTES_RE = re.compile(rb'</head\s*>', re.IGNORECASE)
+
+
+def resolve_parser(parser=None):
+    """
+    Return the requested parser backend, falling back to the built-in
+    html.parser when it is unknown or not installed
+    """
+    parser = parser or DEFAULT_PARSER
+    if parser not in PARSER_BACKENDS or builder_registry.lookup(parser) is None:
+        logger.warning(f"Parser backend {parser} is not available, using html.parser")
+        return 'html.parser'
+    return parser
+
+
+def build_strainer(collectors):
+    """
+    Build a SoupStrainer that keeps only the tags the given collectors read
+    """
+    names = []
+    for collector in collectors:
+        for name in COLLECTOR_TAGS.get(collector, ()):
+            if name not in names:
+                names.append(name)
+    return SoupStrainer(names) if names else None
+
+
+def cut_after_head(content):
+    """
+    Drop everything after the closing </head> tag, if there is one
+    """
+    pattern = HEAD_END_BYTES_RE if isinstance(content, bytes) else HEAD_END_RE
+    match = pattern.search(content)
+    return content[:match.end()] if match else content
+
+
+def make_soup(content, parser=None, collectors=None):
+    """
+    Parse content with the selected backend. When collectors are given only the
+    tags they read are built into the tree, and a request that only needs the
+    <head> stops parsing at </head>. html5lib cannot parse partially, so it
+    always builds the full tree.
+    """
+    parser = resolve_parser(parser)
+    if collectors is None:
+        return BeautifulSoup(content, parser)
+
+    if set(collectors) <= HEAD_COLLECTORS:
+        content = cut_after_head(content)
+    if parser == 'html5lib':
+        return BeautifulSoup(content, parser)
+    return BeautifulSoup(content, parser, parse_only=build_strainer(collectors))
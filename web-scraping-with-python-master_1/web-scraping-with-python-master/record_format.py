@@ -0,0 +1,261 @@
+"""
+Compact on-disk format for scraped records.
+
+A file is a header followed by independently compressed blocks of records:
+
+    b'SCRP' | version | encoding (b'm' msgpack, b'j' JSON) | compression (b'z' zstd, b'd' zlib)
+    then per block: 4-byte big-endian length | compressed {'urls': [...], 'records': [...]}
+
+Every block interns the URLs of its records in a sorted, front-coded table
+(shared prefix length and suffix per entry) and the records refer to URLs by
+index. Raw tag HTML (all_anchors, all_images_data) is left out unless asked
+for. msgpack and zstandard are used when installed, with JSON and zlib from
+the standard library as the fallback; the header tells readers which.
+
+ScrapeStore keeps the page data of every stored record as a one-record block
+of the same format (see pack_record), prefixed with its encoding and
+compression bytes.
+
+Convert existing data with:
+
+    python record_format.py convert scraped_data.json scraped_data.scrp
+    python record_format.py convert scraped_data.db scraped_data.scrp
+    python record_format.py dump scraped_data.scrp
+"""
+import os
+import sys
+import json
+import zlib
+import struct
+import argparse
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b'SCRP'
+VERSION = 1
+BLOCK_HEADER = struct.Struct('>I')
+
+# Records per compressed block; readers hold one block in memory at a time
+BLOCK_RECORDS = 64
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 9
+
+# Fields holding one URL or a list of URLs, interned in the block's URL table
+URL_FIELDS = {'url': False, 'all_anchor_href': True, 'all_images_source_data': True}
+
+# Raw tag HTML, kept only when asked for; the URLs in it are stored anyway
+HTML_FIELDS = ('all_anchors', 'all_images_data')
+
+
+def front_code(urls):
+    """Encode sorted URLs as a flat [shared prefix length, suffix, ...] list"""
+    coded = []
+    previous = ''
+    for url in urls:
+        shared = len(os.path.commonprefix((previous, url)))
+        coded += [shared, url[shared:]]
+        previous = url
+    return coded
+
+
+def front_decode(coded):
+    urls = []
+    append = urls.append
+    previous = ''
+    for shared, suffix in zip(coded[0::2], coded[1::2]):
+        previous = previous[:shared] + suffix
+        append(previous)
+    return urls
+
+
+def default_codec():
+    """The (encoding, compression) pair new data is written with"""
+    return (b'm' if msgpack is not None else b'j'), (b'z' if zstandard is not None else b'd')
+
+
+def compact_block(records, keep_html=False):
+    """Intern the URLs of records in a front-coded table and drop raw tag HTML unless kept"""
+    urls = set()
+    for record in records:
+        for field, is_list in URL_FIELDS.items():
+            value = record.get(field)
+            if value is None:
+                continue
+            urls.update(value if is_list else (value,))
+    table = sorted(urls)
+    index = {url: position for position, url in enumerate(table)}
+
+    compact_records = []
+    for record in records:
+        compact = {}
+        for field, value in record.items():
+            if field in HTML_FIELDS and not keep_html:
+                continue
+            if field in URL_FIELDS and value is not None:
+                value = [index[url] for url in value] if URL_FIELDS[field] else index[value]
+            compact[field] = value
+        compact_records.append(compact)
+    return {'urls': front_code(table), 'records': compact_records}
+
+
+def encode_block(block, encoding, compression, compressor=None):
+    if encoding == b'm':
+        data = msgpack.packb(block, use_bin_type=True)
+    else:
+        data = json.dumps(block, separators=(',', ':')).encode('utf-8')
+    if compression == b'z':
+        return (compressor or zstandard.ZstdCompressor(level=ZSTD_LEVEL)).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def block_records(block):
+    """The records of a decoded block, with their URLs restored"""
+    table = front_decode(block['urls'])
+    for record in block['records']:
+        for field, is_list in URL_FIELDS.items():
+            value = record.get(field)
+            if value is not None:
+                record[field] = [table[i] for i in value] if is_list else table[value]
+    return block['records']
+
+
+def pack_record(record, keep_html=True):
+    """Encode one record as a self-describing compressed block, for a database column"""
+    encoding, compression = default_codec()
+    return encoding + compression + encode_block(compact_block([record], keep_html), encoding, compression)
+
+
+def unpack_record(data):
+    """Decode a record packed by pack_record"""
+    return block_records(decode_block(data[2:], data[:1], data[1:2]))[0]
+
+
+class RecordWriter:
+    """
+    Streams records into the compact format. Records are buffered one block
+    at a time, so memory stays bounded however many are written.
+    """
+
+    def __init__(self, path, keep_html=False, block_records=BLOCK_RECORDS):
+        self.keep_html = keep_html
+        self.block_records = block_records
+        self.block = []
+        self.count = 0
+        self.encoding, self.compression = default_codec()
+        self.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL) if zstandard is not None else None
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC + bytes([VERSION]) + self.encoding + self.compression)
+
+    def write(self, record):
+        self.block.append(record)
+        self.count += 1
+        if len(self.block) >= self.block_records:
+            self.flush_block()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def flush_block(self):
+        if not self.block:
+            return
+        data = encode_block(compact_block(self.block, self.keep_html),
+                            self.encoding, self.compression, self.compressor)
+        self.file.write(BLOCK_HEADER.pack(len(data)) + data)
+        self.block = []
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush_block()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def decode_block(data, encoding, compression):
+    if compression == b'z':
+        if zstandard is None:
+            raise ValueError("This file is zstd compressed; install zstandard to read it")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        data = zlib.decompress(data)
+    if encoding == b'm':
+        if msgpack is None:
+            raise ValueError("This file is msgpack encoded; install msgpack to read it")
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+    return json.loads(data)
+
+
+def read_records(path):
+    """Yield the records of a compact file one at a time, with their URLs restored"""
+    with open(path, 'rb') as f:
+        header = f.read(len(MAGIC) + 3)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a compact record file")
+        if header[len(MAGIC)] != VERSION:
+            raise ValueError(f"{path} has unsupported version {header[len(MAGIC)]}")
+        encoding, compression = header[-2:-1], header[-1:]
+
+        while True:
+            size = f.read(BLOCK_HEADER.size)
+            if not size:
+                return
+            block = decode_block(f.read(BLOCK_HEADER.unpack(size)[0]), encoding, compression)
+            yield from block_records(block)
+
+
+def source_records(path):
+    """Yield the records of an existing scraped_data.json or SQLite store, alias included"""
+    if path.endswith('.json'):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        for alias, record in data.get('scraped_data', {}).items():
+            yield dict(record, alias=alias)
+    else:
+        from scrape_store import ScrapeStore
+        store = ScrapeStore(path)
+        try:
+            yield from store.records()
+        finally:
+            store.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert scraped data to and from the compact record format")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert = commands.add_parser('convert', help="convert scraped_data.json or a SQLite store")
+    convert.add_argument('source', help="scraped_data.json or scraped_data.db")
+    convert.add_argument('target', help="compact file to write")
+    convert.add_argument('--keep-html', action='store_true', help="keep the raw anchor and image tag HTML")
+
+    dump = commands.add_parser('dump', help="print the records of a compact file as JSON lines")
+    dump.add_argument('source')
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        with RecordWriter(args.target, keep_html=args.keep_html) as writer:
+            writer.write_many(source_records(args.source))
+        before, after = os.path.getsize(args.source), os.path.getsize(args.target)
+        print(f"Converted {writer.count} records: {before} -> {after} bytes "
+              f"({writer.encoding.decode()}/{writer.compression.decode()})")
+    else:
+        for record in read_records(args.source):
+            sys.stdout.write(json.dumps(record) + '\n')
+
+
+if __name__ == '__main__':
+    main()
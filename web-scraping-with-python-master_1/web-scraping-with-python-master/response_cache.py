@@ -0,0 +1,255 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'SCRAPER_CACHE_DIR', str(Path.home() / '.cache' / 'web_scraper' / 'responses'))
+DEFAULT_TTL = 300
+MAX_MEMORY_BYTES = 64 * 1024 * 1024
+MAX_DISK_BYTES = 1024 * 1024 * 1024
+
+# Response headers kept with each cache entry
+CACHED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Expires', 'Content-Type')
+
+MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+def get_header(headers, name):
+    """Case-insensitive header lookup on a plain dict"""
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def freshness_lifetime(headers, default_ttl=DEFAULT_TTL):
+    """
+    Work out how long a response may be served without revalidation, from its
+    Cache-Control and Expires headers. Returns None when it must not be stored.
+    """
+    cache_control = (get_header(headers, 'Cache-Control') or '').lower()
+    if 'no-store' in cache_control:
+        return None
+    if 'no-cache' in cache_control:
+        return 0
+    match = MAX_AGE_RE.search(cache_control)
+    if match:
+        return int(match.group(1))
+    expires = get_header(headers, 'Expires')
+    if expires:
+        try:
+            return max(0, int(parsedate_to_datetime(expires).timestamp() - time.time()))
+        except (TypeError, ValueError):
+            return 0
+    return default_ttl
+
+
+class ResponseCache:
+    """
+    Two-tier HTTP response cache. A size-bounded in-memory LRU sits in front of
+    an on-disk store; stale entries are revalidated with If-None-Match /
+    If-Modified-Since so an unchanged page costs a 304 instead of a download.
+    Only 200 responses are stored.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, default_ttl=DEFAULT_TTL,
+                 max_memory_bytes=MAX_MEMORY_BYTES, max_disk_bytes=MAX_DISK_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.default_ttl = default_ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.disk_bytes = sum(f.stat().st_size for f in self.cache_dir.glob('*.body'))
+        self.lock = threading.Lock()
+        self.counters = {'hits': 0, 'misses': 0, 'revalidations': 0, 'stores': 0, 'evictions': 0}
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self.memory)
+            stats['memory_bytes'] = self.memory_bytes
+            stats['disk_bytes'] = self.disk_bytes
+            return stats
+
+    def key_for(self, url):
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def get(self, url):
+        """Return the cached entry for url from memory or disk, fresh or not"""
+        key = self.key_for(url)
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                return entry
+
+        entry = self.read_disk(key)
+        if entry is not None:
+            with self.lock:
+                self.remember(key, entry)
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() < entry['expires_at']
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry is None:
+            return headers
+        if entry['headers'].get('ETag'):
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if entry['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+
+    def fetch(self, url, fetcher):
+        """
+        Serve url from the cache, revalidating or refetching through
+        fetcher(url, headers) when needed. fetcher returns a fetch result dict
+        (see fetch_engine.AsyncFetchEngine.fetch) or None on failure.
+        """
+        entry = self.get(url)
+        if entry is not None and self.is_fresh(entry):
+            with self.lock:
+                self.counters['hits'] += 1
+            return entry
+
+        result = fetcher(url, self.conditional_headers(entry))
+        if result is None:
+            # Failures are never cached
+            return None
+
+        if result['status'] == 304 and entry is not None:
+            with self.lock:
+                self.counters['revalidations'] += 1
+            # A 304 may carry updated validators and freshness headers
+            headers = dict(result['headers'])
+            for name, value in entry['headers'].items():
+                if get_header(headers, name) is None:
+                    headers[name] = value
+            # The body is unchanged, so only the entry's meta file is rewritten
+            return self.store(url, dict(entry, headers=headers), write_body=False)
+
+        with self.lock:
+            self.counters['misses'] += 1
+        if result['status'] == 200:
+            return self.store(url, result)
+        return result
+
+    def store(self, url, result, write_body=True):
+        ttl = freshness_lifetime(result['headers'], self.default_ttl)
+        if ttl is None:
+            return result
+
+        entry = {
+            'url': result['url'],
+            'status': result['status'],
+            'headers': {},
+            'encoding': result['encoding'],
+            'content': result['content'],
+            'expires_at': time.time() + ttl
+        }
+        for name in CACHED_HEADERS:
+            value = get_header(result['headers'], name)
+            if value:
+                entry['headers'][name] = value
+
+        key = self.key_for(url)
+        try:
+            self.write_disk(key, entry, write_body)
+        except OSError as e:
+            logger.error(f"Error writing cache entry: {str(e)}")
+        with self.lock:
+            self.remember(key, entry)
+            self.counters['stores'] += 1
+        return entry
+
+    def remember(self, key, entry):
+        # Caller holds the lock
+        old = self.memory.pop(key, None)
+        if old is not None:
+            self.memory_bytes -= len(old['content'])
+        self.memory[key] = entry
+        self.memory_bytes += len(entry['content'])
+        while self.memory_bytes > self.max_memory_bytes and len(self.memory) > 1:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted['content'])
+            self.counters['evictions'] += 1
+
+    def read_disk(self, key):
+        meta_path = self.cache_dir / f"{key}.json"
+        body_path = self.cache_dir / f"{key}.body"
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            with open(body_path, 'rb') as f:
+                entry['content'] = f.read()
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    def replace_file(self, path, data):
+        """
+        Write data to a temp file of its own, then move it over path, so
+        readers never see a half-written file and concurrent writers of the
+        same entry never share one
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def write_disk(self, key, entry, write_body=True):
+        meta = {name: value for name, value in entry.items() if name != 'content'}
+        if not write_body:
+            self.replace_file(self.cache_dir / f"{key}.json", json.dumps(meta).encode('utf-8'))
+            return
+
+        body_path = self.cache_dir / f"{key}.body"
+        old_size = body_path.stat().st_size if body_path.exists() else 0
+        self.replace_file(body_path, entry['content'])
+        self.replace_file(self.cache_dir / f"{key}.json", json.dumps(meta).encode('utf-8'))
+
+        with self.lock:
+            self.disk_bytes += len(entry['content']) - old_size
+            over_limit = self.disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self.prune_disk()
+
+    def prune_disk(self):
+        """Delete the least recently written entries until the disk tier fits"""
+        bodies = sorted(self.cache_dir.glob('*.body'), key=lambda f: f.stat().st_mtime)
+        for body_path in bodies:
+            with self.lock:
+                if self.disk_bytes <= self.max_disk_bytes:
+                    return
+                self.disk_bytes -= body_path.stat().st_size
+                self.counters['evictions'] += 1
+            body_path.unlink(missing_ok=True)
+            body_path.with_suffix('.json').unlink(missing_ok=True)
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            self.memory_bytes = 0
+            self.disk_bytes = 0
+        for path in self.cache_dir.glob('*'):
+            path.unlink(missing_ok=True)
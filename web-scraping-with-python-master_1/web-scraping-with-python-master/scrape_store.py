@@ -0,0 +1,377 @@
+import re
+import json
+import hashlib
+import sqlite3
+from record_format import pack_record, unpack_record
+
+# Columns listed in the "existing scraped websites" table; everything else
+# in a record is kept in the data column, packed in the compact record format
+SUMMARY_FIELDS = ('alias', 'name', 'url', 'domain', 'title', 'scraped_at', 'status')
+
+# Record fields that describe the scrape rather than the page; every other
+# field is a section with its own fingerprint
+RECORD_FIELDS = ('alias', 'name', 'url', 'domain', 'scraped_at', 'status')
+
+# Columns of the full-text index and the record fields each one holds
+SEARCH_COLUMNS = {
+    'title': ('title',),
+    'headings': ('all_h1_data', 'all_h2_data', 'all_h3_data'),
+    'paragraphs': ('all_p_data',),
+    'links': ('all_anchor_href',)
+}
+SEARCHED_FIELDS = {field for fields in SEARCH_COLUMNS.values() for field in fields}
+
+# bm25 weight of each index column: a match in the title counts most
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0, 0.5)
+SEARCH_LIMIT = 20
+
+QUERY_TERM_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def fingerprint_hasher():
+    """
+    This function return the hash behind fingerprint(), for a body that arrives in
+    chunks: update() it with each one and take its hexdigest()
+    """
+    return hashlib.blake2b(digest_size=16)
+
+
+def fingerprint(data):
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    hasher = fingerprint_hasher()
+    hasher.update(data)
+    return hasher.hexdigest()
+
+
+def section_fingerprints(record):
+    """
+    This function return {section: fingerprint} for the scraped sections of a record
+    """
+    return {name: fingerprint(json.dumps(value, sort_keys=True))
+            for name, value in record.items() if name not in RECORD_FIELDS}
+
+
+def search_text(record, fields):
+    parts = []
+    for field in fields:
+        value = record.get(field)
+        if isinstance(value, list):
+            parts.extend(str(item) for item in value if item)
+        elif value:
+            parts.append(str(value))
+    return ' '.join(parts)
+
+
+def load_data(value):
+    # Stores written before the data column was packed hold JSON text
+    if isinstance(value, str):
+        return json.loads(value)
+    return unpack_record(value)
+
+
+def fts_query(text):
+    """
+    This function turn a search box query into an FTS5 query: every word must match,
+    "quoted words" must match as a phrase and a trailing * matches any word with that
+    prefix. Anything else is searched for literally, never read as FTS5 syntax
+    """
+    terms = []
+    for phrase, word in QUERY_TERM_RE.findall(text):
+        if phrase.strip():
+            terms.append('"{}"'.format(phrase))
+        elif word.rstrip('*'):
+            prefix = '*' if word.endswith('*') else ''
+            terms.append('"{}"{}'.format(word.rstrip('*').replace('"', '""'), prefix))
+    return ' '.join(terms)
+
+
+class ScrapeStore:
+    """
+    SQLite storage for scraped records, keyed on alias and indexed on domain.
+    Inserting a record touches one row, and listing reads only the summary
+    columns, so neither cost grows with the size of the stored pages.
+    """
+
+    def __init__(self, database_file="scraped_data.db", timeout=5):
+        self.database_file = database_file
+        # timeout is how long a write waits for another process's lock
+        self.connection = sqlite3.connect(database_file, timeout=timeout)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS scraped_data (
+                alias TEXT PRIMARY KEY,
+                name TEXT,
+                url TEXT,
+                domain TEXT,
+                title TEXT,
+                scraped_at TEXT,
+                status INTEGER,
+                data BLOB
+            )
+        """)
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS scraped_data_domain ON scraped_data (domain)")
+        # Fingerprints of the last scrape of every url, for incremental re-scrapes
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                url TEXT PRIMARY KEY,
+                alias TEXT,
+                body TEXT,
+                sections TEXT,
+                checked_at TEXT
+            )
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS changes (
+                id INTEGER PRIMARY KEY,
+                alias TEXT,
+                url TEXT,
+                changed_at TEXT,
+                sections TEXT
+            )
+        """)
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS changes_alias ON changes (alias)")
+        # Full-text index over the scraped text, one row per record sharing its rowid
+        is_new_index = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'search_index'").fetchone() is None
+        self.connection.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5({})".format(', '.join(SEARCH_COLUMNS)))
+        self.connection.commit()
+        if is_new_index:
+            self.rebuild_index()
+
+    def row_for(self, record):
+        data = {key: value for key, value in record.items() if key not in SUMMARY_FIELDS}
+        return (record['alias'], record.get('name'), record.get('url'), record.get('domain'),
+                record.get('title'), record.get('scraped_at'), int(bool(record.get('status'))),
+                pack_record(data))
+
+    def insert(self, record):
+        """
+        This function store a single scraped record under its alias
+        """
+        with self.connection:
+            self.write_record(record)
+
+    def insert_many(self, records):
+        """
+        This function store many records in one transaction
+        """
+        with self.connection:
+            for record in records:
+                self.write_record(record)
+
+    def write_record(self, record):
+        # Replacing a record gives it a new rowid, so its index row goes first
+        self.unindex(record['alias'])
+        cursor = self.connection.execute(
+            "INSERT OR REPLACE INTO scraped_data VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            self.row_for(record))
+        self.index(cursor.lastrowid, record)
+
+    def index(self, rowid, record):
+        self.connection.execute(
+            "INSERT INTO search_index (rowid, {}) VALUES (?{})".format(
+                ', '.join(SEARCH_COLUMNS), ', ?' * len(SEARCH_COLUMNS)),
+            [rowid] + [search_text(record, fields) for fields in SEARCH_COLUMNS.values()])
+
+    def unindex(self, alias):
+        self.connection.execute(
+            "DELETE FROM search_index WHERE rowid = (SELECT rowid FROM scraped_data WHERE alias = ?)", (alias,))
+
+    def rebuild_index(self):
+        """
+        This function index every stored record again, e.g. records stored before the index existed
+        """
+        with self.connection:
+            self.connection.execute("DELETE FROM search_index")
+            cursor = self.connection.execute(
+                "SELECT rowid, alias, name, url, domain, title, scraped_at, status, data FROM scraped_data")
+            for row in cursor:
+                self.index(row[0], self.record_for(row[1:]))
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """
+        This function return the records best matching query, best first, as
+        (alias, url, title, snippet) rows. Only the index and the summary
+        columns of the matches are read, never the stored page data
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        cursor = self.connection.execute(
+            "SELECT scraped_data.alias, scraped_data.url, scraped_data.title, "
+            "snippet(search_index, ?, '[', ']', '...', 12), snippet(search_index, -1, '[', ']', '...', 12) "
+            "FROM search_index JOIN scraped_data ON scraped_data.rowid = search_index.rowid "
+            "WHERE search_index MATCH ? ORDER BY bm25(search_index, ?, ?, ?, ?) LIMIT ?",
+            (list(SEARCH_COLUMNS).index('paragraphs'), match) + SEARCH_WEIGHTS + (limit,))
+        # The snippet comes from the paragraphs when they match, else from the best column
+        return [(alias, url, title, text if '[' in text else best)
+                for alias, url, title, text, best in cursor]
+
+    def fingerprints_for(self, url):
+        """
+        This function return the fingerprints of the last scrape of url
+        ({'alias', 'body', 'sections', 'checked_at'}), or None if it was never scraped
+        """
+        cursor = self.connection.execute(
+            "SELECT alias, body, sections, checked_at FROM fingerprints WHERE url = ?", (url,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return {'alias': row[0], 'body': row[1], 'sections': json.loads(row[2]), 'checked_at': row[3]}
+
+    def mark_checked(self, url, checked_at):
+        """
+        This function record that url was fetched again and found unchanged
+        """
+        with self.connection:
+            self.connection.execute("UPDATE fingerprints SET checked_at = ? WHERE url = ?", (checked_at, url))
+
+    def mark_checked_many(self, urls, checked_at):
+        """
+        This function record in one transaction that many urls were found unchanged
+        """
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE fingerprints SET checked_at = ? WHERE url = ?", [(checked_at, url) for url in urls])
+
+    def save_scrape(self, record, body_fingerprint):
+        """
+        This function store a record, with the fingerprint of the body it was scraped
+        from, against the fingerprints of the last scrape of its url and return the
+        names of the sections that changed. A new url is
+        stored whole; for a known one only the changed sections are written, into
+        the record under its alias, and the change is added to the change log
+        """
+        with self.connection:
+            return self.write_scrape(record, body_fingerprint)
+
+    def save_scrapes(self, scrapes):
+        """
+        This function store many (record, body fingerprint) pairs like save_scrape()
+        in one transaction and return the changed sections of each
+        """
+        with self.connection:
+            return [self.write_scrape(record, body_fingerprint) for record, body_fingerprint in scrapes]
+
+    def write_scrape(self, record, body_fingerprint):
+        sections = section_fingerprints(record)
+        previous = self.fingerprints_for(record['url'])
+        if previous is None:
+            changed = list(sections)
+            self.write_record(record)
+        else:
+            # A url keeps the alias it was first stored under
+            record = dict(record, alias=previous['alias'])
+            # A section the page no longer has counts as changed too
+            removed = [name for name in previous['sections'] if name not in sections]
+            changed = [name for name, value in sections.items() if previous['sections'].get(name) != value]
+            changed += removed
+            if changed:
+                self.update_sections(record, changed)
+            if SEARCHED_FIELDS.intersection(changed):
+                rowid = self.connection.execute(
+                    "SELECT rowid FROM scraped_data WHERE alias = ?", (record['alias'],)).fetchone()[0]
+                self.unindex(record['alias'])
+                self.index(rowid, record)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)",
+            (record['url'], record['alias'], body_fingerprint, json.dumps(sections), record.get('scraped_at')))
+        if changed:
+            self.connection.execute(
+                "INSERT INTO changes (alias, url, changed_at, sections) VALUES (?, ?, ?, ?)",
+                (record['alias'], record['url'], record.get('scraped_at'), json.dumps(changed)))
+        return changed
+
+    def update_sections(self, record, changed):
+        # The stored data is packed, so it is read back and only the changed
+        # sections are replaced before packing it again
+        row = self.connection.execute(
+            "SELECT data FROM scraped_data WHERE alias = ?", (record['alias'],)).fetchone()
+        data = load_data(row[0])
+        for name in changed:
+            if name in SUMMARY_FIELDS:
+                continue
+            if name in record:
+                data[name] = record[name]
+            else:
+                data.pop(name, None)
+        self.connection.execute(
+            "UPDATE scraped_data SET title = ?, scraped_at = ?, status = ?, data = ? WHERE alias = ?",
+            (record.get('title'), record.get('scraped_at'), int(bool(record.get('status'))),
+             pack_record(data), record['alias']))
+
+    def changes(self, alias):
+        """
+        This function return the change log of alias as (changed_at, url, sections) rows, newest first
+        """
+        cursor = self.connection.execute(
+            "SELECT changed_at, url, sections FROM changes WHERE alias = ? ORDER BY id DESC", (alias,))
+        return [(changed_at, url, json.loads(sections)) for changed_at, url, sections in cursor]
+
+    def contains(self, alias):
+        cursor = self.connection.execute("SELECT 1 FROM scraped_data WHERE alias = ?", (alias,))
+        return cursor.fetchone() is not None
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM scraped_data").fetchone()[0]
+
+    def summaries(self):
+        """
+        This function return (alias, domain, title, scraped_at, status) rows without reading page data
+        """
+        cursor = self.connection.execute(
+            "SELECT alias, domain, title, scraped_at, status FROM scraped_data ORDER BY rowid")
+        return [(alias, domain, title, scraped_at, bool(status))
+                for alias, domain, title, scraped_at, status in cursor]
+
+    def aliases_for_domain(self, domain):
+        cursor = self.connection.execute(
+            "SELECT alias FROM scraped_data WHERE domain = ? ORDER BY rowid", (domain,))
+        return [row[0] for row in cursor]
+
+    def get(self, alias):
+        """
+        This function return the full record stored under alias, or None
+        """
+        cursor = self.connection.execute(
+            "SELECT alias, name, url, domain, title, scraped_at, status, data FROM scraped_data WHERE alias = ?",
+            (alias,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return self.record_for(row)
+
+    def records(self):
+        """
+        This function yield every stored record, reading one row at a time
+        """
+        cursor = self.connection.execute(
+            "SELECT alias, name, url, domain, title, scraped_at, status, data FROM scraped_data ORDER BY rowid")
+        for row in cursor:
+            yield self.record_for(row)
+
+    def record_for(self, row):
+        record = dict(zip(SUMMARY_FIELDS, row[:7]))
+        record['status'] = bool(record['status'])
+        record.update(load_data(row[7]))
+        return record
+
+    def migrate_from_json(self, json_db):
+        """
+        This function import records from the old scraped_data.json layout
+        ({"scraped_data": {alias: record}}) and return how many were imported
+        """
+        records = []
+        for alias, record in json_db.get('scraped_data', {}).items():
+            record = dict(record)
+            record['alias'] = alias
+            records.append(record)
+        self.insert_many(records)
+        return len(records)
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,278 @@
+import time
+import codecs
+import logging
+from lxml import etree
+from extraction import COLLECTORS, HEADING_TAGS, new_page_record, read_table
+from parsing import HEAD_COLLECTORS
+from text_encoding import resolve_encoding, SNIFF_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Bodies larger than this, or of unknown length, are parsed while they download
+STREAM_THRESHOLD = 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Per-page memory cap: a body is read up to STREAM_MAX_BYTES, and at most
+# STREAM_MAX_ELEMENTS elements are held inside collected elements that are
+# still open. Past either the page is cut short and keeps what it has so far.
+STREAM_MAX_BYTES = 64 * 1024 * 1024
+STREAM_MAX_ELEMENTS = 200000
+
+
+def should_stream(content_length):
+    """Whether a body of this Content-Length (a header value or None) is parsed as it downloads"""
+    try:
+        return int(content_length) > STREAM_THRESHOLD
+    except (TypeError, ValueError):
+        return True
+
+
+def element_text(element):
+    # Same text as get_text(): comments are left out, tails of children kept
+    return ''.join(element.itertext())
+
+
+def element_html(element):
+    return etree.tostring(element, method='html', encoding='unicode', with_tail=False)
+
+
+class TableNode:
+    """The parts of the BeautifulSoup Tag interface read_table() uses, over an lxml element"""
+
+    __slots__ = ('element', 'name', 'attrs')
+
+    def __init__(self, element):
+        self.element = element
+        self.name = element.tag
+        self.attrs = element.attrib
+
+    @property
+    def children(self):
+        # Comments and processing instructions have no tag name
+        return (TableNode(child) for child in self.element if isinstance(child.tag, str))
+
+    def get_text(self, separator='', strip=False):
+        strings = self.element.itertext()
+        if strip:
+            strings = (string.strip() for string in strings)
+            strings = (string for string in strings if string)
+        return separator.join(strings)
+
+    def find(self, name, recursive=True):
+        found = self.element.iterdescendants(name) if recursive else self.element.iterchildren(name)
+        for element in found:
+            return TableNode(element)
+        return None
+
+
+class StreamingExtractor:
+    """
+    Builds the same record as extract_page() from a body fed chunk by chunk to
+    lxml's incremental HTML parser. Collected elements are read as they close,
+    and every finished subtree no open collected element still needs is freed
+    straight away, so memory follows the largest open table or paragraph
+    rather than the size of the page. Raw markup kept with keep_html is
+    lxml's serialization of the tag rather than BeautifulSoup's.
+    """
+
+    def __init__(self, collectors=COLLECTORS, keep_html=False, charset=None,
+                 max_bytes=STREAM_MAX_BYTES, max_elements=STREAM_MAX_ELEMENTS):
+        self.page = new_page_record(collectors)
+        self.handlers = self.build_handlers(collectors, keep_html)
+        self.charset = charset
+        self.max_bytes = max_bytes
+        self.max_elements = max_elements
+        self.parser = None
+        self.decoder = None
+        # Start of the body, held until the encoding can be resolved from it
+        self.head = b''
+        # (list, index) slots of the collected elements still open, innermost
+        # last; list items are reserved at the start tag to keep document order
+        self.open = []
+        self.held = 0
+        # Elements the parser has opened and not yet closed
+        self.depth = 0
+        self.bytes = 0
+        self.parse_seconds = 0.0
+        self.truncated = False
+        # Like make_soup(), a record of only <head> data stops at </head>
+        self.head_only = set(collectors) <= HEAD_COLLECTORS
+        self.done = False
+
+    def build_handlers(self, collectors, keep_html):
+        """
+        Map tag names to (list the value goes in, reader). Readers with no
+        list store their value themselves.
+        """
+        page = self.page
+        handlers = {}
+
+        if 'title' in collectors:
+            def on_title(element):
+                if not page['title']:
+                    page['title'] = element_text(element)
+
+            handlers['title'] = (None, on_title)
+
+        if 'text' in collectors:
+            handlers['p'] = (page['paragraphs'], element_text)
+
+        if 'headings' in collectors:
+            for name in HEADING_TAGS:
+                handlers[name] = (page['headings'][name], element_text)
+
+        if 'links' in collectors:
+            def on_link(element):
+                link = {'url': element.get('href'), 'text': element_text(element)}
+                if keep_html:
+                    link['html'] = element_html(element)
+                return link
+
+            handlers['a'] = (page['links'], on_link)
+
+        if 'images' in collectors:
+            def on_image(element):
+                image = {'src': element.get('src'), 'alt': element.get('alt', '')}
+                if keep_html:
+                    image['html'] = element_html(element)
+                return image
+
+            handlers['img'] = (page['images'], on_image)
+
+        if 'videos' in collectors:
+            def on_video(element):
+                return {'tag': element.tag, 'src': element.get('src')}
+
+            handlers['video'] = (page['videos'], on_video)
+            handlers['iframe'] = (page['videos'], on_video)
+
+        if 'meta' in collectors:
+            def on_meta(element):
+                name = element.get('name', '') or element.get('property', '')
+                # First occurrence wins, matching extract_page()
+                if name and name not in page['meta']:
+                    page['meta'][name] = element.get('content', '')
+
+            handlers['meta'] = (None, on_meta)
+
+        if 'tables' in collectors:
+            handlers['table'] = (page['tables'], lambda element: read_table(TableNode(element)))
+
+        return handlers
+
+    def start(self, complete):
+        encoding = resolve_encoding(self.head, self.charset, complete)
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        # huge_tree lifts libxml2's nesting limit from 256 levels to 2048
+        self.parser = etree.HTMLPullParser(events=('start', 'end'), huge_tree=True)
+        head, self.head = self.head, b''
+        return head
+
+    def cut_short(self, reason):
+        if not self.truncated:
+            logger.warning(f"Page cut short at {self.bytes} bytes: {reason}")
+            self.truncated = True
+
+    def feed(self, chunk):
+        """
+        Feed the next chunk of the body; returns False once no more of it is
+        needed, or the page hit its memory cap
+        """
+        if self.truncated or self.done:
+            return False
+        started = time.perf_counter()
+        if self.bytes + len(chunk) > self.max_bytes:
+            chunk = chunk[:self.max_bytes - self.bytes]
+            self.cut_short(f"body is over {self.max_bytes} bytes")
+        self.bytes += len(chunk)
+
+        if self.decoder is None:
+            self.head += chunk
+            if len(self.head) < SNIFF_BYTES and not self.truncated:
+                return True
+            chunk = self.start(complete=False)
+        self.parser.feed(self.decoder.decode(chunk))
+        self.handle_events()
+        self.parse_seconds += time.perf_counter() - started
+        return not (self.truncated or self.done)
+
+    def handle_events(self):
+        for event, element in self.parser.read_events():
+            handler = self.handlers.get(element.tag)
+            if event == 'start':
+                self.depth += 1
+                if self.open:
+                    self.held += 1
+                    if self.held > self.max_elements:
+                        self.cut_short(f"over {self.max_elements} elements open at once")
+                if handler is not None:
+                    target = handler[0]
+                    if target is not None:
+                        target.append(None)
+                        self.open.append((target, len(target) - 1))
+                    else:
+                        self.open.append((None, None))
+                continue
+
+            self.depth -= 1
+            if element.tag == 'head' and self.head_only:
+                self.done = True
+            if handler is not None:
+                target, index = self.open.pop()
+                value = handler[1](element)
+                if target is not None:
+                    target[index] = value
+            if not self.open:
+                # Nothing open needs this subtree any more: free it, and the
+                # finished siblings before it
+                self.held = 0
+                element.clear()
+                parent = element.getparent()
+                if parent is not None:
+                    while element.getprevious() is not None:
+                        del parent[0]
+
+    def hit_depth_limit(self):
+        # Past its nesting limit libxml2 stops building the tree without
+        # raising. Not every lxml version logs the error for a feed parser,
+        # but the elements still open then are never closed.
+        if self.depth > 0:
+            return True
+        return any('Excessive depth' in entry.message for entry in self.parser.error_log)
+
+    def close(self):
+        """Finish the page and return its record"""
+        started = time.perf_counter()
+        if self.decoder is None:
+            if not self.head:
+                return self.page
+            # A body shorter than SNIFF_BYTES is resolved from all of it
+            head = self.start(complete=True)
+            self.parser.feed(self.decoder.decode(head))
+        # Elements still open are closed by the parser and read like any other
+        self.parser.feed(self.decoder.decode(b'', final=True))
+        try:
+            self.parser.close()
+        except etree.XMLSyntaxError:
+            pass
+        self.handle_events()
+        if not self.done and self.hit_depth_limit():
+            self.cut_short("nested deeper than the parser allows")
+        self.parser = None
+        self.parse_seconds += time.perf_counter() - started
+        return self.page
+
+
+def extract_stream(chunks, charset=None, collectors=COLLECTORS, keep_html=False):
+    """
+    Extract a page from an iterable of body chunks, parsing each one as it
+    arrives. Reading stops as soon as the rest of the body is not needed or
+    the page hits its memory cap. Returns the extractor, whose page,
+    parse_seconds and truncated describe the result.
+    """
+    extractor = StreamingExtractor(collectors, keep_html, charset)
+    for chunk in chunks:
+        if not extractor.feed(chunk):
+            break
+    extractor.close()
+    return extractor
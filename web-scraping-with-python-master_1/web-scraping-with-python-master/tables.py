@@ -0,0 +1,159 @@
+import re
+import logging
+from pathlib import Path
+from itertools import chain
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'parquet')
+
+# Cell values treated as missing before a column's type is inferred
+MISSING_VALUES = ('', '-', '—', '–', 'n/a', 'na', 'none', 'null', '?')
+
+# Thousands separators, currency and percent signs stripped before a numeric parse
+NUMBER_NOISE = r'[,\s%$€£¥]'
+
+# Every value of a date column must carry a four digit year or a dd/mm/yy style date
+DATE_HINT = re.compile(r'\d{4}|\d{1,2}[-/.]\d{1,2}[-/.]\d{2}')
+
+# Larger whole numbers are kept as floats rather than risk Int64 overflow
+MAX_EXACT_INTEGER = 2 ** 53
+
+
+def unique_columns(columns):
+    # pandas, CSV readers and Parquet all want distinct, non-empty names
+    seen = {}
+    names = []
+    for index, name in enumerate(columns):
+        name = str(name) or f"Column {index + 1}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name} ({seen[name]})"
+        else:
+            seen[name] = 1
+        names.append(name)
+    return names
+
+
+def typed_tables(tables):
+    """
+    Infer column types for the table records extracted from a page (see
+    extraction.read_table) and return them with a dtypes list added. A column
+    is numeric (Int64 when every value is whole) or a date when all of its
+    non-empty cells convert, and text otherwise; placeholder cells become None.
+
+    The cells of every column of every table are flattened into one Series,
+    so each conversion is a single vectorised pass per page no matter how
+    many tables it has, and per-column verdicts come from a groupby.
+    """
+    columns = [values for table in tables for values in table['data']]
+    lengths = [len(values) for values in columns]
+    column_ids = np.repeat(np.arange(len(columns)), lengths)
+    every_column = range(len(columns))
+
+    def per_column(mask, empty):
+        return mask.groupby(column_ids).all().reindex(every_column, fill_value=empty).to_numpy()
+
+    cells = pd.Series(list(chain.from_iterable(columns)), dtype=object)
+    text = cells.str.strip()
+    text = text.mask(text.str.lower().isin(MISSING_VALUES))
+    present = text.notna()
+    has_values = ~per_column(~present, True)
+
+    cleaned = text.str.replace(NUMBER_NOISE, '', regex=True).str.replace('−', '-', regex=False)
+    numbers = pd.to_numeric(cleaned, errors='coerce')
+    numeric = per_column(numbers.notna() | ~present, True) & has_values
+    whole_values = (numbers % 1 == 0) & (numbers.abs() <= MAX_EXACT_INTEGER)
+    whole = per_column(whole_values | numbers.isna(), True)
+
+    # Dates are only tried for the cells of columns that look like dates
+    candidates = per_column(text.str.contains(DATE_HINT, na=True), True) & has_values & ~numeric
+    date_cells = present & candidates[column_ids] if len(cells) else present
+    dates = pd.to_datetime(text.where(date_cells), errors='coerce', format='mixed')
+    dated = per_column(dates.notna() | ~date_cells, True) & candidates
+
+    # Convert each representation to plain Python values once for all cells
+    text_values = text.astype(object).where(present, None).tolist()
+    float_values = numbers.astype(object).where(numbers.notna(), None).tolist()
+    integers = numbers.where(whole_values).astype('Int64')
+    integer_values = integers.astype(object).where(integers.notna(), None).tolist()
+    date_values = dates.dt.strftime('%Y-%m-%dT%H:%M:%S').astype(object).where(dates.notna(), None).tolist()
+
+    typed = []
+    column = 0
+    start = 0
+    for table in tables:
+        dtypes = []
+        data = []
+        for _ in table['data']:
+            end = start + lengths[column]
+            if numeric[column] and whole[column]:
+                dtypes.append('Int64')
+                data.append(integer_values[start:end])
+            elif numeric[column]:
+                dtypes.append('float64')
+                data.append(float_values[start:end])
+            elif dated[column]:
+                dtypes.append('datetime64[ns]')
+                data.append(date_values[start:end])
+            else:
+                dtypes.append('object')
+                data.append(text_values[start:end])
+            column += 1
+            start = end
+        typed.append({
+            'caption': table.get('caption', ''),
+            'columns': list(table['columns']),
+            'dtypes': dtypes,
+            'data': data
+        })
+    return typed
+
+
+def table_frame(table):
+    """
+    Build a DataFrame from a table record, inferring column types first if
+    the record does not carry them yet
+    """
+    if 'dtypes' not in table:
+        table = typed_tables([table])[0]
+    data = {}
+    columns = unique_columns(table['columns'])
+    for name, dtype, values in zip(columns, table['dtypes'], table['data']):
+        if dtype.startswith('datetime'):
+            data[name] = pd.to_datetime(pd.Series(values, dtype=object))
+        else:
+            data[name] = pd.Series(values, dtype=object if dtype == 'object' else dtype)
+    return pd.DataFrame(data, columns=columns)
+
+
+def export_table(table, path, fmt='csv'):
+    """Write one table record to path as CSV or Parquet; returns the path, or None on failure"""
+    try:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        frame = table_frame(table)
+        if fmt == 'parquet':
+            frame.to_parquet(path, index=False)
+        elif fmt == 'csv':
+            frame.to_csv(path, index=False)
+        else:
+            raise ValueError(f"Unknown export format {fmt}, expected one of {EXPORT_FORMATS}")
+        return Path(path)
+    except Exception as e:
+        # Parquet needs pyarrow or fastparquet installed
+        logger.error(f"Error exporting table to {path}: {str(e)}")
+        return None
+
+
+def export_tables(tables, directory, fmt='csv', prefix='table'):
+    """Write every table record to directory as <prefix>_<n>.<fmt> and return the paths written"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for index, table in enumerate(tables):
+        path = export_table(table, directory / f"{prefix}_{index + 1}.{fmt}", fmt)
+        if path is not None:
+            paths.append(path)
+    return paths
@@ -0,0 +1,50 @@
+import hashlib
+
+from blob_store import BlobStore
+
+
+def write_temp(store, data):
+    path = store.tmp_dir / hashlib.sha256(data).hexdigest()
+    path.write_bytes(data)
+    return path, hashlib.sha256(data).hexdigest()
+
+
+def test_same_url_stored_twice_keeps_its_blob(tmp_path):
+    store = BlobStore(tmp_path)
+    for _ in range(2):
+        tmp, digest = write_temp(store, b'image bytes')
+        path = store.put_file('http://x/a.png', tmp, digest)
+
+    assert path.exists()
+    assert store.lookup('http://x/a.png') == digest
+    assert store.refs == {digest: 1}
+
+
+def test_url_relinked_to_new_bytes_releases_old_blob(tmp_path):
+    store = BlobStore(tmp_path)
+    tmp, old_digest = write_temp(store, b'old')
+    old_path = store.put_file('http://x/a.png', tmp, old_digest)
+    tmp, new_digest = write_temp(store, b'new')
+    new_path = store.put_file('http://x/a.png', tmp, new_digest)
+
+    assert new_path.exists()
+    assert not old_path.exists()
+    assert store.refs == {new_digest: 1}
+
+
+def test_blob_shared_by_urls_lives_until_last_reference(tmp_path):
+    store = BlobStore(tmp_path, max_index_entries=2)
+    tmp, digest = write_temp(store, b'shared')
+    path = store.put_file('http://x/a.png', tmp, digest)
+    tmp, _ = write_temp(store, b'shared')
+    store.put_file('http://y/a.png', tmp, digest)
+    assert store.refs == {digest: 2}
+
+    # Two other URLs push both references out of the index
+    for name in (b'one', b'two'):
+        tmp, other = write_temp(store, name)
+        store.put_file('http://z/' + name.decode(), tmp, other)
+        if name == b'one':
+            assert path.exists() and store.refs[digest] == 1
+    assert not path.exists()
+    assert digest not in store.refs
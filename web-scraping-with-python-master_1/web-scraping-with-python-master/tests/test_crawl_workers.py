@@ -0,0 +1,128 @@
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from crawl_workers import SQLiteQueue, CrawlWorker, seed_crawl, shard_for
+
+
+def urls_on_distinct_shards(count, num_shards):
+    urls = {}
+    host = 0
+    while len(urls) < count:
+        url = f'http://host{host}.example/'
+        urls.setdefault(shard_for(url, num_shards), url)
+        host += 1
+    return list(urls.values())
+
+
+def test_worker_moves_on_from_drained_shards(tmp_path):
+    queue = SQLiteQueue(str(tmp_path / 'queue.db'), num_shards=16)
+    urls = urls_on_distinct_shards(6, 16)
+    queue.push([(url, 1) for url in urls])
+
+    done = []
+    for _ in range(len(urls)):
+        shards = queue.lease_shards('worker', count=2)
+        batch = queue.claim('worker', shards, count=10)
+        if not batch:
+            break
+        queue.complete([url for url, _ in batch])
+        done += [url for url, _ in batch]
+
+    assert sorted(done) == sorted(urls)
+    assert queue.idle()
+    # Nothing is left to work, so nothing stays leased
+    assert queue.lease_shards('worker', count=2) == []
+    queue.close()
+
+
+def test_drained_shard_is_released_to_other_workers(tmp_path):
+    queue = SQLiteQueue(str(tmp_path / 'queue.db'), num_shards=16)
+    first, second = urls_on_distinct_shards(2, 16)
+    queue.push([(first, 1)])
+    shards = queue.lease_shards('a', count=1)
+    batch = queue.claim('a', shards)
+    assert batch == [(first, 1)]
+    # Claimed but not completed: still a's work
+    assert queue.lease_shards('a', count=1) == shards
+
+    queue.complete([first])
+    queue.push([(second, 1)])
+    assert queue.lease_shards('a', count=1) == [shard_for(second, 16)]
+    assert queue.lease_shards('b', count=1) == []
+    assert queue.stats()['workers'] == 1
+    queue.close()
+
+
+def test_renewed_claims_outlive_their_first_lease(tmp_path):
+    path = str(tmp_path / 'queue.db')
+    queue = SQLiteQueue(path, num_shards=16)
+    url = urls_on_distinct_shards(1, 16)[0]
+    queue.push([(url, 1)])
+    shards = queue.lease_shards('a', count=1, lease=0.3)
+    assert queue.claim('a', shards, lease=0.3) == [(url, 1)]
+    time.sleep(0.2)
+    queue.renew('a', shards, [url], lease=0.3)
+    time.sleep(0.2)
+
+    other = SQLiteQueue(path, num_shards=16)
+    assert other.lease_shards('b', count=1, lease=0.3) == []
+    assert other.claim('b', shards, lease=0.3) == []
+    other.close()
+    queue.close()
+
+
+class PacedSiteHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/robots.txt':
+            body = b'User-agent: *\nCrawl-delay: 1\n'
+        else:
+            PacedSiteHandler.requests.append(self.path)
+            links = ''.join('<a href="/page{}">p</a>'.format(i) for i in range(3)) if self.path == '/' else ''
+            body = '<html><head><title>{}</title></head><body>{}</body></html>'.format(self.path, links).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html' if self.path != '/robots.txt' else 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_batch_paced_past_its_lease_keeps_its_host(tmp_path):
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), PacedSiteHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    path = str(tmp_path / 'queue.db')
+    queue = SQLiteQueue(path)
+    seed_crawl(queue, 'http://127.0.0.1:{}/'.format(httpd.server_port), max_depth=2)
+
+    queue.close()
+    result = []
+
+    def work():
+        # Three pages one second apart: the second batch outlasts a 1 s lease
+        worker_queue = SQLiteQueue(path)
+        try:
+            result.append(CrawlWorker(worker_queue, 'a', lease=1.0).run())
+        finally:
+            worker_queue.close()
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    other = SQLiteQueue(path)
+    try:
+        while other.stats()['workers'] == 0 and thread.is_alive():
+            time.sleep(0.01)
+        while thread.is_alive():
+            assert other.lease_shards('b', lease=1.0) == []
+            time.sleep(0.1)
+    finally:
+        thread.join()
+        other.close()
+        httpd.shutdown()
+
+    assert result == [4]
+    assert sorted(PacedSiteHandler.requests) == ['/', '/page0', '/page1', '/page2']
@@ -0,0 +1,50 @@
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+from fetch_engine import AsyncFetchEngine
+
+BODY = b'<p>chunk</p>' * 200000
+
+
+class BodyHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        try:
+            self.wfile.write(BODY)
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), BodyHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{}/'.format(httpd.server_port)
+    httpd.shutdown()
+
+
+def test_stream_closed_early_keeps_status_and_host_health(server):
+    engine = AsyncFetchEngine(respect_robots=False)
+    try:
+        for _ in range(3):
+            body = engine.open_stream(server)
+            next(iter(body))
+            body.close()
+            assert body.status == 200
+            assert body.headers['Content-Type'] == 'text/html'
+
+        engine.run(engine.fetch(server))
+        stats = engine.host_stats()[server.split('/')[2]]
+        assert stats['errors'] == 0
+        assert stats['in_flight'] == 0
+        assert stats['limit'] > 1
+    finally:
+        engine.close()
@@ -0,0 +1,70 @@
+import sys
+import runpy
+import subprocess
+import multiprocessing.forkserver
+from pathlib import Path
+
+import pytest
+
+from parse_pool import ParsePool, START_METHOD, FORKSERVER_PRELOAD, worker_context
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+MAIN_SCRIPT = '''
+import os
+import sys
+sys.path.insert(0, {project!r})
+with open({log!r}, 'a') as f:
+    f.write('{{}} {{}}\\n'.format(os.getpid(), __name__))
+
+if __name__ == '__main__':
+    from parse_pool import ParsePool
+    pool = ParsePool(workers=1, inline_bytes=0)
+    pool.extract(b'<p>para</p>' * 5000, 'utf-8')
+    print(' '.join(str(pid) for pid in pool.executor._processes))
+    pool.close()
+'''
+
+
+def test_workers_are_not_forked_and_match_inline_parse():
+    html = '<html><head><title>T</title></head><body>' + '<p>para</p>' * 2000 + '</body></html>'
+    pool = ParsePool(workers=1, inline_bytes=0)
+    try:
+        page, _ = pool.extract(html.encode('utf-8'), 'utf-8')
+        assert pool.executor._mp_context.get_start_method() == START_METHOD != 'fork'
+    finally:
+        pool.close()
+
+    inline, _ = ParsePool(workers=0).extract(html.encode('utf-8'), 'utf-8')
+    assert page == inline
+    assert pool.stats()['inline'] == 0
+
+
+@pytest.mark.skipif(START_METHOD != 'forkserver', reason="no fork server on this platform")
+def test_fork_server_does_not_run_main_script(tmp_path):
+    log = tmp_path / 'runs.log'
+    script = tmp_path / 'main_script.py'
+    script.write_text(MAIN_SCRIPT.format(project=str(PROJECT_DIR), log=str(log)))
+    output = subprocess.run([sys.executable, str(script)], capture_output=True, text=True, check=True)
+    workers = output.stdout.split()
+
+    runs = [line.split() for line in log.read_text().splitlines()]
+    # Only the script itself runs as __main__; workers import it as
+    # __mp_main__, where its guarded code does not run, and nothing else does
+    assert [pid for pid, name in runs if name == '__main__'] != []
+    assert len([name for pid, name in runs if name == '__main__']) == 1
+    assert all(pid in workers for pid, name in runs if name != '__main__')
+
+
+@pytest.mark.skipif(START_METHOD != 'forkserver', reason="no fork server on this platform")
+def test_fork_server_preloads_only_the_parser():
+    worker_context()
+    assert multiprocessing.forkserver._forkserver._preload_modules == FORKSERVER_PRELOAD
+    assert '__main__' not in FORKSERVER_PRELOAD
+
+
+def test_app_is_not_built_when_a_worker_imports_it():
+    # What a parse worker does with the main script of "python app.py"
+    namespace = runpy.run_path(str(PROJECT_DIR / 'app.py'), run_name='__mp_main__')
+    assert namespace['scraper'] is None
+    assert namespace['job_manager'] is None
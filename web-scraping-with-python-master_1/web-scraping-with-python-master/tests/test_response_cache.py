@@ -0,0 +1,49 @@
+import os
+import threading
+
+from response_cache import ResponseCache
+
+
+def page(url, content, max_age):
+    return {'url': url, 'status': 200, 'encoding': 'utf-8', 'content': content,
+            'headers': {'ETag': '"v1"', 'Cache-Control': 'max-age={}'.format(max_age)}}
+
+
+def test_not_modified_rewrites_only_meta(tmp_path):
+    cache = ResponseCache(tmp_path, default_ttl=0)
+    cache.store('http://x/', page('http://x/', b'body', 0))
+    body_path = tmp_path / (cache.key_for('http://x/') + '.body')
+    before = os.stat(body_path)
+
+    def not_modified(url, headers):
+        assert headers['If-None-Match'] == '"v1"'
+        return {'url': url, 'status': 304, 'encoding': None, 'content': b'',
+                'headers': {'Cache-Control': 'max-age=60'}}
+
+    entry = ResponseCache(tmp_path, default_ttl=0).fetch('http://x/', not_modified)
+
+    assert entry['content'] == b'body'
+    assert entry['headers']['ETag'] == '"v1"'
+    after = os.stat(body_path)
+    assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+    reread = ResponseCache(tmp_path).get('http://x/')
+    assert reread['headers']['Cache-Control'] == 'max-age=60'
+    assert ResponseCache(tmp_path).is_fresh(reread)
+
+
+def test_concurrent_stores_of_one_url_leave_a_whole_entry(tmp_path):
+    cache = ResponseCache(tmp_path)
+
+    def store_many(byte):
+        for _ in range(20):
+            cache.store('http://x/', page('http://x/', byte * 100000, 60))
+
+    threads = [threading.Thread(target=store_many, args=(bytes([65 + i]),)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    content = ResponseCache(tmp_path).get('http://x/')['content']
+    assert len(content) == 100000 and len(set(content)) == 1
+    assert not list(tmp_path.glob('*.tmp'))
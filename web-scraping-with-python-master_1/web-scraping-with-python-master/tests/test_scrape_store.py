@@ -0,0 +1,67 @@
+import json
+import sqlite3
+
+from scrape_store import ScrapeStore
+
+
+def make_record(alias, text):
+    return {
+        'alias': alias, 'name': alias, 'url': 'http://x/' + alias, 'domain': 'x',
+        'title': 'Title ' + alias, 'scraped_at': '01/01/2026 00:00:00', 'status': True,
+        'all_p_data': [text] * 50,
+        'all_anchor_href': ['http://x/page/{}'.format(i) for i in range(200)],
+        'all_images_source_data': ['http://x/img/{}.png'.format(i) for i in range(20)]
+    }
+
+
+def test_records_are_stored_packed_and_read_back(tmp_path):
+    store = ScrapeStore(str(tmp_path / 'store.db'))
+    record = make_record('a', 'some paragraph text')
+    store.insert(record)
+
+    stored = store.connection.execute("SELECT data FROM scraped_data").fetchone()[0]
+    assert isinstance(stored, bytes)
+    assert len(stored) * 5 < len(json.dumps(record))
+    assert store.get('a') == record
+    assert list(store.records()) == [record]
+    assert store.search('paragraph')[0][0] == 'a'
+
+
+def test_changed_sections_are_replaced_in_packed_data(tmp_path):
+    store = ScrapeStore(str(tmp_path / 'store.db'))
+    store.save_scrape(make_record('a', 'old text'), 'body-1')
+    changed = store.save_scrape(make_record('a', 'new text'), 'body-2')
+
+    assert changed == ['all_p_data']
+    record = store.get('a')
+    assert record['all_p_data'] == ['new text'] * 50
+    assert record['all_anchor_href'] == make_record('a', '')['all_anchor_href']
+
+
+def test_json_rows_of_older_stores_are_still_read(tmp_path):
+    path = str(tmp_path / 'store.db')
+    ScrapeStore(path).close()
+    record = make_record('old', 'stored as json')
+    data = {key: value for key, value in record.items()
+            if key not in ('alias', 'name', 'url', 'domain', 'title', 'scraped_at', 'status')}
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute("INSERT INTO scraped_data VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           ('old', 'old', record['url'], 'x', record['title'], record['scraped_at'], 1,
+                            json.dumps(data)))
+    connection.close()
+
+    store = ScrapeStore(path)
+    assert store.get('old') == record
+    store.save_scrape(make_record('old', 'rescraped'), 'body')
+    assert store.get('old')['all_p_data'] == ['rescraped'] * 50
+
+
+def test_section_missing_from_rescrape_is_removed_and_logged(tmp_path):
+    store = ScrapeStore(str(tmp_path / 'store.db'))
+    store.save_scrape(dict(make_record('a', 'text'), meta={'k': 'v'}), 'body-1')
+    changed = store.save_scrape(make_record('a', 'text'), 'body-2')
+
+    assert changed == ['meta']
+    assert 'meta' not in store.get('a')
+    assert store.changes('a')[0][2] == ['meta']
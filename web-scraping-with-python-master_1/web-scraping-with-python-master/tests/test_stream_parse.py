@@ -0,0 +1,30 @@
+from extraction import extract_page
+from parsing import make_soup
+from stream_parse import extract_stream
+
+
+def nested_page(levels):
+    return ('<html><head><title>T</title></head><body>' + '<div><p>para</p>' * levels +
+            '<h1>H</h1><table><tr><td>1</td></tr></table></body></html>').encode('utf-8')
+
+
+def chunked(body, size=65536):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def test_deeply_nested_page_matches_dom_parse():
+    body = nested_page(1000)
+    extractor = extract_stream(chunked(body))
+    page = extract_page(make_soup(body.decode('utf-8')))
+
+    assert not extractor.truncated
+    assert len(extractor.page['paragraphs']) == len(page['paragraphs']) == 1000
+    assert extractor.page['headings']['h1'] == ['H']
+    assert len(extractor.page['tables']) == 1
+
+
+def test_page_past_nesting_limit_is_marked_truncated():
+    extractor = extract_stream(chunked(nested_page(3000)))
+
+    assert extractor.truncated
+    assert 0 < len(extractor.page['paragraphs']) < 3000
@@ -0,0 +1,24 @@
+import pytest
+
+from stream_parse import extract_stream
+from text_encoding import decode_html, normalize_encoding
+
+UNDEFINED_IN_CP1252 = b'\x81\x8d\x8f\x90\x9d'
+
+
+@pytest.mark.parametrize('label', ['latin1', 'iso-8859-1', 'windows-1252', 'cp1252', 'us-ascii'])
+def test_windows_1252_labels_decode_every_byte(label):
+    assert normalize_encoding(label) == normalize_encoding('windows-1252')
+    text = decode_html(UNDEFINED_IN_CP1252 + b'caf\xe9 \x80', label)
+    assert text == '\x81\x8d\x8f\x90\x9dcafé €'
+
+
+def test_meta_charset_latin1():
+    assert decode_html(b'<meta charset="latin1">\x81caf\xe9') == '<meta charset="latin1">\x81café'
+
+
+def test_streamed_page_decodes_like_whole_body():
+    body = b'<html><head><meta charset="latin1"><title>\x81caf\xe9</title></head><body><p>\x9dok</p></body></html>'
+    page = extract_stream([body[:40], body[40:]]).page
+    assert page['title'] == '\x81café'
+    assert page['paragraphs'] == ['\x9dok']
@@ -0,0 +1,140 @@
+import re
+import codecs
+from encodings import cp1252
+
+# <meta charset> is only looked for this far into the document
+SNIFF_BYTES = 4096
+
+# Statistical detection sees at most this much of the body, never all of it
+DETECT_SAMPLE_BYTES = 32 * 1024
+
+# Checked in this order: the UTF-32 LE mark starts with the UTF-16 LE one
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16')
+)
+
+# windows-1252 as browsers decode it: Python's cp1252 leaves 0x81, 0x8D, 0x8F,
+# 0x90 and 0x9D undefined, and those decode to the C1 controls latin-1 gives
+# them instead, so every byte has a character
+WINDOWS_1252 = 'web_1252'
+WINDOWS_1252_DECODING_TABLE = ''.join(
+    chr(byte) if char == '\ufffe' else char for byte, char in enumerate(cp1252.decoding_table))
+WINDOWS_1252_ENCODING_TABLE = codecs.charmap_build(WINDOWS_1252_DECODING_TABLE)
+
+# Labels browsers read as windows-1252
+ENCODING_OVERRIDES = {'iso8859-1': WINDOWS_1252, 'ascii': WINDOWS_1252, 'cp1252': WINDOWS_1252}
+
+
+class Windows1252IncrementalDecoder(codecs.IncrementalDecoder):
+    def decode(self, data, final=False):
+        return codecs.charmap_decode(data, self.errors, WINDOWS_1252_DECODING_TABLE)[0]
+
+
+class Windows1252IncrementalEncoder(codecs.IncrementalEncoder):
+    def encode(self, text, final=False):
+        return codecs.charmap_encode(text, self.errors, WINDOWS_1252_ENCODING_TABLE)[0]
+
+
+WINDOWS_1252_CODEC = codecs.CodecInfo(
+    name=WINDOWS_1252,
+    encode=lambda text, errors='strict': codecs.charmap_encode(text, errors, WINDOWS_1252_ENCODING_TABLE),
+    decode=lambda data, errors='strict': codecs.charmap_decode(data, errors, WINDOWS_1252_DECODING_TABLE),
+    incrementalencoder=Windows1252IncrementalEncoder,
+    incrementaldecoder=Windows1252IncrementalDecoder
+)
+
+# Registered so bytes.decode() and codecs.getincrementaldecoder() find it by name
+codecs.register(lambda name: WINDOWS_1252_CODEC if name == WINDOWS_1252 else None)
+
+CHARSET_RE = re.compile(r'charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+META_CHARSET_RE = re.compile(rb'<meta[^>]*?charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+def normalize_encoding(label):
+    """Return the Python codec name for an encoding label, or None if it is unknown"""
+    if not label:
+        return None
+    if isinstance(label, bytes):
+        label = label.decode('ascii', errors='ignore')
+    try:
+        name = codecs.lookup(label.strip()).name
+    except LookupError:
+        return None
+    return ENCODING_OVERRIDES.get(name, name)
+
+
+def header_charset(content_type):
+    """The charset parameter of a Content-Type header, or None"""
+    match = CHARSET_RE.search(content_type or '')
+    return match.group(1) if match else None
+
+
+def bom_encoding(content):
+    for bom, encoding in BOMS:
+        if content.startswith(bom):
+            return encoding
+    return None
+
+
+def meta_encoding(content):
+    """Encoding declared by <meta charset> or <meta http-equiv> near the start of the document"""
+    match = META_CHARSET_RE.search(content, 0, SNIFF_BYTES)
+    encoding = normalize_encoding(match.group(1)) if match else None
+    # A UTF-16 label readable as ASCII cannot be right; browsers use UTF-8
+    if encoding and encoding.startswith('utf-16'):
+        return 'utf-8'
+    return encoding
+
+
+def detect_encoding(content, complete=True):
+    """
+    Guess the encoding of an undeclared body from a bounded sample: UTF-8 if
+    the sample is valid UTF-8 (as most pages are), otherwise charset_normalizer
+    or chardet on the sample, otherwise windows-1252. complete is False when
+    content is only the start of the body.
+    """
+    sample = content[:DETECT_SAMPLE_BYTES]
+    try:
+        sample.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError as e:
+        # The sample may end inside a multi-byte character
+        if e.start >= len(sample) - 3 and (len(sample) < len(content) or not complete):
+            return 'utf-8'
+
+    try:
+        from charset_normalizer import from_bytes
+        best = from_bytes(sample).best()
+        encoding = best.encoding if best else None
+    except ImportError:
+        try:
+            import chardet
+            encoding = chardet.detect(sample)['encoding']
+        except ImportError:
+            encoding = None
+    return normalize_encoding(encoding) or WINDOWS_1252
+
+
+def resolve_encoding(content, charset=None, complete=True):
+    """
+    Resolve the encoding of an HTML body from its bytes alone: the BOM, then
+    the charset from the HTTP headers, then <meta charset> in the first few
+    KB, then detection over a bounded sample. A streamed body is resolved
+    from its first chunks, with complete=False.
+    """
+    return (bom_encoding(content) or normalize_encoding(charset) or meta_encoding(content)
+            or detect_encoding(content, complete))
+
+
+def decode_html(content, charset=None):
+    """
+    Decode an HTML body exactly once, with the encoding resolve_encoding()
+    picks; already decoded text is returned as it is
+    """
+    if not isinstance(content, bytes):
+        return content
+    return content.decode(resolve_encoding(content, charset), errors='replace')
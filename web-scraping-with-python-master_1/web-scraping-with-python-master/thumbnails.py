@@ -0,0 +1,132 @@
+import os
+import queue
+import asyncio
+import logging
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from fetch_engine import AsyncFetchEngine
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (200, 200)
+MAX_CONNECTIONS = 16
+MAX_CONNECTIONS_PER_HOST = 8
+DECODE_WORKERS = min(4, os.cpu_count() or 1)
+
+# How often the Tk main thread drains finished thumbnails, and how many
+# widgets it builds per drain so the UI stays responsive
+DRAIN_INTERVAL_MS = 50
+DRAIN_BATCH = 12
+
+
+def make_thumbnail(content, size=THUMBNAIL_SIZE):
+    """
+    Decode image bytes into a thumbnail no larger than size. JPEGs are decoded
+    in draft mode, straight at 1/2, 1/4 or 1/8 scale, instead of at full size.
+    """
+    image = Image.open(BytesIO(content))
+    image.draft('RGB', size)
+    image.thumbnail(size)
+    return image
+
+
+class ThumbnailPipeline:
+    """
+    Downloads images concurrently over a capped connection pool, decodes them
+    into thumbnails on a small worker pool and queues the results. Tk widgets
+    must only be touched from the main thread, so the GUI drains the queue
+    with drain() from an after() callback.
+
+    Each start() begins a new batch; results still arriving from an earlier
+    batch are dropped. extend() adds to the current batch.
+    """
+
+    def __init__(self, size=THUMBNAIL_SIZE, max_connections=MAX_CONNECTIONS,
+                 max_connections_per_host=MAX_CONNECTIONS_PER_HOST, decode_workers=DECODE_WORKERS):
+        self.size = size
+        self.engine = AsyncFetchEngine(max_connections=max_connections,
+                                       max_connections_per_host=max_connections_per_host)
+        self.decode_pool = ThreadPoolExecutor(max_workers=decode_workers)
+        self.results = queue.Queue()
+        self.batch = 0
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def start(self, urls):
+        """Queue urls for download and decoding; returns immediately"""
+        urls = list(dict.fromkeys(urls))
+        with self.lock:
+            self.batch += 1
+            self.pending = len(urls)
+            batch = self.batch
+        if urls:
+            asyncio.run_coroutine_threadsafe(self.download_all(urls, batch), self.engine.loop)
+        return batch
+
+    def extend(self, urls):
+        """Add urls to the current batch, as a crawl finds more pages"""
+        urls = list(dict.fromkeys(urls))
+        with self.lock:
+            self.pending += len(urls)
+            batch = self.batch
+        if urls:
+            asyncio.run_coroutine_threadsafe(self.download_all(urls, batch), self.engine.loop)
+        return batch
+
+    @property
+    def busy(self):
+        with self.lock:
+            return self.pending > 0
+
+    async def download_all(self, urls, batch):
+        async def download(url):
+            result = await self.engine.fetch(url)
+            if batch != self.batch:
+                return
+            if result is None or result['status'] != 200:
+                self.finish(batch, url, None)
+                return
+            self.decode_pool.submit(self.decode, batch, url, result['content'])
+
+        await asyncio.gather(*(download(url) for url in urls))
+
+    def decode(self, batch, url, content):
+        if batch != self.batch:
+            return
+        try:
+            thumbnail = make_thumbnail(content, self.size)
+        except Exception as e:
+            logger.error(f"Error decoding image {url}: {str(e)}")
+            thumbnail = None
+        self.finish(batch, url, thumbnail)
+
+    def finish(self, batch, url, thumbnail):
+        with self.lock:
+            if batch != self.batch:
+                return
+            self.pending -= 1
+        self.results.put((batch, url, thumbnail))
+
+    def drain(self, handle, limit=DRAIN_BATCH):
+        """
+        Pass up to limit finished (url, thumbnail) pairs of the current batch
+        to handle(url, thumbnail). thumbnail is None if the image failed.
+        Call this from the Tk main thread only.
+        """
+        handled = 0
+        while handled < limit:
+            try:
+                batch, url, thumbnail = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if batch != self.batch:
+                continue
+            handle(url, thumbnail)
+            handled += 1
+        return handled
+
+    def close(self):
+        self.decode_pool.shutdown(wait=False)
+        self.engine.close()
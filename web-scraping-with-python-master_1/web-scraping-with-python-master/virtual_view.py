@@ -0,0 +1,252 @@
+import tkinter as tk
+from tkinter import ttk
+
+ROW_HEIGHT = 20
+HEADING_HEIGHT = 24
+WHEEL_ROWS = 3
+FILTER_DELAY_MS = 150
+
+
+def sort_key(value):
+    # Numbers sort numerically, everything else as case-insensitive text, and
+    # empty cells last
+    if value is None or value == '' or value != value:
+        return (2, '')
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value)
+    return (1, str(value).lower())
+
+
+def display_value(value):
+    if value is None or value != value:
+        return ''
+    return str(value)
+
+
+class RowModel:
+    """
+    The rows behind a virtual view. Filtering and sorting work on the data
+    itself; view holds the indices of the rows that pass the filter, in sort
+    order, and page() returns just the slice a widget needs to draw.
+    """
+
+    def __init__(self, columns=(), rows=()):
+        self.set_data(columns, rows)
+
+    def set_data(self, columns, rows, filter_text=''):
+        self.columns = list(columns)
+        self.rows = list(rows)
+        self.filter_text = filter_text.strip().lower()
+        self.sort_column = None
+        self.sort_reverse = False
+        self.search_keys = None
+        self.refresh()
+
+    def __len__(self):
+        return len(self.view)
+
+    def page(self, start, count):
+        return [self.rows[i] for i in self.view[start:start + count]]
+
+    def set_filter(self, text):
+        self.filter_text = text.strip().lower()
+        self.refresh()
+
+    def toggle_sort(self, column):
+        """Sort on column index, reversing the order on a second call"""
+        if self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+        self.refresh()
+
+    def refresh(self):
+        if self.filter_text:
+            if self.search_keys is None:
+                # One lowercase string per row, built once per data set
+                self.search_keys = ['\n'.join(display_value(value) for value in row).lower()
+                                    for row in self.rows]
+            view = [i for i, key in enumerate(self.search_keys) if self.filter_text in key]
+        else:
+            view = list(range(len(self.rows)))
+
+        if self.sort_column is not None:
+            column = self.sort_column
+            rows = self.rows
+            view.sort(key=lambda i: sort_key(rows[i][column] if column < len(rows[i]) else None),
+                      reverse=self.sort_reverse)
+        self.view = view
+
+
+class VirtualTreeview(ttk.Frame):
+    """
+    A Treeview that only holds the rows currently on screen. The scrollbar
+    moves an offset into the RowModel and the visible items are refilled from
+    that slice, so a list of 100k links costs the same to draw as a list of 30.
+    Click a heading to sort on it; type in the filter box to narrow the rows.
+    """
+
+    def __init__(self, parent, columns=(), column_width=150, show_filter=True):
+        super().__init__(parent)
+        self.model = RowModel(columns)
+        self.column_width = column_width
+        self.offset = 0
+        self.visible_rows = 1
+        self.filter_job = None
+
+        style = ttk.Style()
+        style.configure('Virtual.Treeview', rowheight=ROW_HEIGHT)
+
+        self.filter_var = tk.StringVar()
+        self.count_var = tk.StringVar()
+        if show_filter:
+            filter_frame = ttk.Frame(self)
+            filter_frame.pack(fill=tk.X)
+            ttk.Label(filter_frame, text="Filter:").pack(side=tk.LEFT)
+            ttk.Entry(filter_frame, textvariable=self.filter_var).pack(side=tk.LEFT, fill=tk.X, expand=True)
+            ttk.Label(filter_frame, textvariable=self.count_var).pack(side=tk.RIGHT)
+            self.filter_var.trace_add('write', lambda *args: self.schedule_filter())
+
+        body = ttk.Frame(self)
+        body.pack(fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(body, show='headings', style='Virtual.Treeview')
+        self.scrollbar = ttk.Scrollbar(body, orient=tk.VERTICAL, command=self.on_scrollbar)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree.bind('<Configure>', self.on_resize)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.tree.bind(sequence, self.on_wheel)
+        self.tree.bind('<Prior>', lambda event: self.scroll_to(self.offset - self.visible_rows))
+        self.tree.bind('<Next>', lambda event: self.scroll_to(self.offset + self.visible_rows))
+
+        self.set_columns(columns)
+
+    def set_columns(self, columns):
+        # Column ids are positional, since scraped headers repeat or are empty
+        ids = [f"c{i}" for i in range(len(columns))]
+        self.tree.configure(columns=ids)
+        for i, (column_id, name) in enumerate(zip(ids, columns)):
+            self.tree.heading(column_id, text=name, command=lambda i=i: self.sort_by(i))
+            self.tree.column(column_id, width=self.column_width)
+
+    def set_rows(self, rows, columns=None):
+        """Replace the data shown; the current filter text is kept"""
+        if columns is not None:
+            self.set_columns(columns)
+        self.model.set_data(columns if columns is not None else self.model.columns,
+                            rows, self.filter_var.get())
+        self.offset = 0
+        self.render()
+
+    def sort_by(self, column):
+        self.model.toggle_sort(column)
+        self.render()
+
+    def schedule_filter(self):
+        # Wait for a pause in typing before filtering a large data set
+        if self.filter_job is not None:
+            self.after_cancel(self.filter_job)
+        self.filter_job = self.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self):
+        self.filter_job = None
+        self.model.set_filter(self.filter_var.get())
+        self.offset = 0
+        self.render()
+
+    def on_resize(self, event):
+        visible = max(1, (event.height - HEADING_HEIGHT) // ROW_HEIGHT)
+        if visible != self.visible_rows:
+            self.visible_rows = visible
+            self.scroll_to(self.offset)
+
+    def on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.offset - WHEEL_ROWS)
+        else:
+            self.scroll_to(self.offset + WHEEL_ROWS)
+        return 'break'
+
+    def on_scrollbar(self, action, amount, unit=None):
+        total = len(self.model)
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * total))
+        elif unit == 'pages':
+            self.scroll_to(self.offset + int(amount) * self.visible_rows)
+        else:
+            self.scroll_to(self.offset + int(amount))
+
+    def scroll_to(self, offset):
+        last_offset = max(0, len(self.model) - self.visible_rows)
+        self.offset = min(max(0, offset), last_offset)
+        self.render()
+
+    def render(self):
+        rows = self.model.page(self.offset, self.visible_rows)
+        width = len(self.model.columns)
+        items = self.tree.get_children()
+
+        # Reuse the existing items, so scrolling only rewrites their values
+        for i, row in enumerate(rows):
+            values = [display_value(value) for value in row[:width]]
+            if i < len(items):
+                self.tree.item(items[i], values=values)
+            else:
+                self.tree.insert('', 'end', values=values)
+        if len(items) > len(rows):
+            self.tree.delete(*items[len(rows):])
+
+        total = len(self.model)
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.visible_rows) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        self.count_var.set(f"{total} of {len(self.model.rows)} rows")
+
+
+class TableBrowser(ttk.Frame):
+    """
+    Every scraped table behind one VirtualTreeview, with a selector to switch
+    between them. Tables are given as (title, columns, rows) tuples.
+    """
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.tables = []
+
+        selector_frame = ttk.Frame(self)
+        selector_frame.pack(fill=tk.X)
+        ttk.Label(selector_frame, text="Table:").pack(side=tk.LEFT)
+        self.selector = ttk.Combobox(selector_frame, state='readonly', width=40)
+        self.selector.pack(side=tk.LEFT, padx=5)
+        self.selector.bind('<<ComboboxSelected>>', lambda event: self.show(self.selector.current()))
+
+        self.view = VirtualTreeview(self, column_width=100)
+        self.view.pack(fill=tk.BOTH, expand=True)
+
+    def set_tables(self, tables):
+        self.tables = list(tables)
+        self.selector.configure(values=[title for title, _, _ in self.tables])
+        if self.tables:
+            self.selector.current(0)
+            self.show(0)
+        else:
+            self.selector.set('')
+            self.view.set_rows([], columns=[])
+
+    def set_records(self, records):
+        """
+        Show table records as built by extraction.read_table, or as returned
+        by tables.typed_tables (the form table_frame and export_tables read)
+        """
+        tables = []
+        for i, record in enumerate(records):
+            title = f"Table {i+1}: {record['caption']}" if record.get('caption') else f"Table {i+1}"
+            tables.append((title, record['columns'], list(zip(*record['data']))))
+        self.set_tables(tables)
+
+    def show(self, index):
+        _, columns, rows = self.tables[index]
+        self.view.set_rows(rows, columns=columns)
@@ -1,10 +1,40 @@
 # import required modules 
+import os
+import sys
 import json 
+import time
+import argparse
+import itertools
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
 from beautifultable import BeautifulTable
+from extraction import extract_page
+from parsing import make_soup
+from scrape_store import ScrapeStore, fingerprint, fingerprint_hasher
+from stream_parse import extract_stream, should_stream, STREAM_CHUNK_SIZE, STREAM_THRESHOLD
+from parse_pool import ParsePool
+from text_encoding import decode_html, header_charset
+from tables import typed_tables, export_tables, EXPORT_FORMATS
+
+# Collectors needed for one stored record
+SCRAPED_COLLECTORS = ('title', 'text', 'headings', 'links', 'images', 'tables')
+
+# The raw HTML of every anchor and image repeats the URLs already stored, so
+# it is only kept when SCRAPER_KEEP_HTML=1
+KEEP_TAG_HTML = os.environ.get('SCRAPER_KEEP_HTML') == '1'
+
+# Seconds to wait for a server to connect and to send data
+REQUEST_TIMEOUT = 10
+
+# Batch mode: URLs fetched at once, scraped records written per transaction,
+# and how often progress is reported
+BATCH_WORKERS = 16
+BATCH_WRITE_RECORDS = 500
+BATCH_PROGRESS_EVERY = 1000
 
 
 
@@ -21,25 +51,17 @@ def load_json(database_json_file="scraped_data.json"):
         return all_data_base
 
 
-def save_scraped_data_in_json(data, database_json_file="scraped_data.json"):
+def open_store(database_file="scraped_data.db", database_json_file="scraped_data.json"):
     """
-    This function Save the scraped data in json format. scraped_data.json file if it exist else create it.
-    if file already exist you can view previous scraped data
+    This function open the SQLite store for scraped data. The first time it is created
+    any records from the old scraped_data.json file are imported into it
     """
-    file_obj =  open(database_json_file, "w")
-    file_obj.write(json.dumps(data))
-    file_obj.close()
-
-
-def existing_scraped_data_init(json_db):
-    """
-    This function init data from json file if it exist have data else create an empty one 
-    """
-    scraped_data = json_db.get("scraped_data")
-    if scraped_data is None:
-        json_db['scraped_data'] = dict()
-
-    return None
+    is_new_store = not os.path.exists(database_file)
+    store = ScrapeStore(database_file)
+    if is_new_store and os.path.exists(database_json_file):
+        imported = store.migrate_from_json(load_json(database_json_file))
+        print("===> Imported {} records from {}".format(imported, database_json_file))
+    return store
 
 
 def scraped_time_is():
@@ -50,103 +72,393 @@ def scraped_time_is():
     dt_string = now.strftime("%d/%m/%Y %H:%M:%S")
     return dt_string
 
+def fetch_url(website_url):
+    """
+    This function get the provided URL using requets module and return the response, or None.
+    Only the headers are read here; the body is read when it is used
+    """
+    requets_data = requests.get(website_url, stream=True, timeout=REQUEST_TIMEOUT)
+    if requets_data.status_code == 200:
+        return requets_data
+    requets_data.close()
+    return None
+
+def response_html(requets_data):
+    """
+    This function decode the page once from its bytes, without the detection over the
+    whole body that requests runs when the server sends no charset
+    """
+    return decode_html(requets_data.content, header_charset(requets_data.headers.get('Content-Type')))
+
 def process_url_request(website_url):
     """
     This function process provided URL get its data using requets module
     and contrunct soup data using BeautifulSoup for scarping
     """
-    requets_data = requests.get(website_url)
-    if requets_data.status_code == 200:
-        soup = BeautifulSoup(requets_data.text,'html')
+    requets_data = fetch_url(website_url)
+    if requets_data is not None:
+        soup = make_soup(response_html(requets_data), collectors=SCRAPED_COLLECTORS)
         return soup
     return None
 
-def proccess_beautiful_soup_data(soup):
-    return {
-        'title': soup.find('title').text,
-        'all_anchor_href': [i['href'] for i in soup.find_all('a', href=True)],
-        'all_anchors': [str(i) for i in soup.find_all('a')],
-        'all_images_data': [ str(i) for i in soup.find_all('img')],
-        'all_images_source_data': [ i['src'] for i in soup.find_all('img')],
-        'all_h1_data': [i.text for i in soup.find_all('h1')],
-        'all_h2_data': [i.text for i in soup.find_all('h2')],
-        'all_h3_data': [i.text for i in soup.find_all('h3')],
-        'all_p_data': [i.text for i in soup.find_all('p')]
+def proccess_beautiful_soup_data(soup, keep_html=KEEP_TAG_HTML):
+    """
+    This function extract all the data we store from the soup in a single walk over the page.
+    The raw anchor and image tags are only included when keep_html is True
+    """
+    return page_data_packet(extract_page(soup, SCRAPED_COLLECTORS, keep_html=keep_html), keep_html)
+
+def stream_scraped_data(chunks, charset=None, keep_html=KEEP_TAG_HTML):
+    """
+    This function scrap a huge page from the chunks of its body while it downloads, so the
+    page is never held in memory whole, and return its data packet with the fingerprint of the body
+    """
+    hasher = fingerprint_hasher()
+
+    def body_chunks():
+        for chunk in chunks:
+            hasher.update(chunk)
+            yield chunk
+
+    extractor = extract_stream(body_chunks(), charset, SCRAPED_COLLECTORS, keep_html)
+    if extractor.truncated:
+        print(' =====> Page is too large, only its first {} bytes were scraped'.format(extractor.bytes))
+    return page_data_packet(extractor.page, keep_html), hasher.hexdigest()
+
+def page_data_packet(page, keep_html=KEEP_TAG_HTML):
+    """
+    This function turn an extracted page into the data packet we store
+    """
+    scraped_data_packet = {
+        'title': page['title'],
+        'all_anchor_href': [i['url'] for i in page['links'] if i['url'] is not None],
+        'all_images_source_data': [i['src'] for i in page['images'] if i['src'] is not None],
+        'all_h1_data': page['headings']['h1'],
+        'all_h2_data': page['headings']['h2'],
+        'all_h3_data': page['headings']['h3'],
+        'all_p_data': page['paragraphs'],
+        'all_tables': typed_tables(page['tables'])
     }
+    if keep_html:
+        scraped_data_packet['all_anchors'] = [i['html'] for i in page['links']]
+        scraped_data_packet['all_images_data'] = [i['html'] for i in page['images']]
+    return scraped_data_packet
 
 
+def make_session(workers=BATCH_WORKERS):
+    """
+    This function create the requests session batch workers share, with a connection
+    pool big enough for all of them and retries for throttled or failing servers
+    """
+    session = requests.Session()
+    retries = Retry(
+        total=2,
+        backoff_factor=0.2,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(max_retries=retries, pool_connections=100, pool_maxsize=workers)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
 
-# Here I used infinite loop because i don't want to run it again and again.
-while True:
+def read_urls(url_file):
+    """
+    This function yield the URLs listed one per line in url_file (- for stdin), skipping
+    blank lines, # comments and repeats. The list is read as it is scraped, never all at once
+    """
+    source = sys.stdin if url_file == '-' else open(url_file, 'r')
+    seen = set()
+    try:
+        for line in source:
+            url = line.strip()
+            if url and not url.startswith('#') and url not in seen:
+                seen.add(url)
+                yield url
+    finally:
+        if source is not sys.stdin:
+            source.close()
 
-    print("""  ================ Welcome to this scraping program =============
+
+def batch_scrape(session, parse_pool, url, previous_body):
+    """
+    This function fetch and scrap one URL of a batch on a worker thread. It return
+    ('scraped', data packet, body fingerprint), ('unchanged', None, body fingerprint)
+    or ('failed', reason, None)
+    """
+    try:
+        response = session.get(url, stream=True, timeout=REQUEST_TIMEOUT)
+        with response:
+            if response.status_code != 200:
+                return 'failed', 'HTTP {}'.format(response.status_code), None
+            charset = header_charset(response.headers.get('Content-Type'))
+            chunks = response.iter_content(STREAM_CHUNK_SIZE)
+            head = []
+            size = 0
+            for chunk in chunks:
+                head.append(chunk)
+                size += len(chunk)
+                if size > STREAM_THRESHOLD:
+                    break
+            if size > STREAM_THRESHOLD:
+                # A huge page: the rest of it is scraped while it downloads
+                scraped_data_packet, body_fingerprint = stream_scraped_data(itertools.chain(head, chunks), charset)
+                if body_fingerprint == previous_body:
+                    return 'unchanged', None, body_fingerprint
+                return 'scraped', scraped_data_packet, body_fingerprint
+
+        body = b''.join(head)
+        body_fingerprint = fingerprint(body)
+        if body_fingerprint == previous_body:
+            return 'unchanged', None, body_fingerprint
+        # Parsed in the parse pool's worker processes, so extraction runs on every core
+        page, _ = parse_pool.extract(body, charset, None, SCRAPED_COLLECTORS, KEEP_TAG_HTML)
+        return 'scraped', page_data_packet(page), body_fingerprint
+    except Exception as e:
+        return 'failed', str(e), None
+
+
+def run_batch(url_file, workers=BATCH_WORKERS):
+    """
+    This function scrap every URL listed in url_file without the menu: workers fetch them
+    concurrently over one connection pool, records are stored in bulk transactions and a
+    summary is printed. It return the exit status, 0 when no URL failed and 1 otherwise
+    """
+    store = open_store()
+    session = make_session(workers)
+    parse_pool = ParsePool()
+    counts = {'new': 0, 'changed': 0, 'unchanged': 0, 'failed': 0}
+    # Scraped records (with their body fingerprint and whether they are new) and
+    # unchanged URLs waiting to be written
+    scrapes = []
+    unchanged = []
+    started = time.perf_counter()
+
+    def write_results():
+        if scrapes:
+            changes = store.save_scrapes([(record, body_fingerprint) for record, body_fingerprint, _ in scrapes])
+            for (_, _, is_new), changed in zip(scrapes, changes):
+                if is_new:
+                    counts['new'] += 1
+                elif changed:
+                    counts['changed'] += 1
+                else:
+                    counts['unchanged'] += 1
+            del scrapes[:]
+        if unchanged:
+            store.mark_checked_many(unchanged, scraped_time_is())
+            counts['unchanged'] += len(unchanged)
+            del unchanged[:]
+
+    def take_result(future, url, previous):
+        outcome, scraped_data_packet, body_fingerprint = future.result()
+        if outcome == 'failed':
+            counts['failed'] += 1
+            print('===> Failed {}: {}'.format(url, scraped_data_packet), file=sys.stderr)
+        elif outcome == 'unchanged':
+            unchanged.append(url)
+        else:
+            # New URLs are stored under the URL itself; known ones keep their alias
+            alias = previous['alias'] if previous is not None else url
+            if previous is None:
+                scraped_data_packet['name'] = alias
+            scraped_data_packet['url'] = url
+            scraped_data_packet['scraped_at'] = scraped_time_is()
+            scraped_data_packet['alias'] = alias
+            scraped_data_packet['status'] = True
+            scraped_data_packet['domain'] = urlparse(url).netloc
+            scrapes.append((scraped_data_packet, body_fingerprint, previous is None))
+        if len(scrapes) + len(unchanged) >= BATCH_WRITE_RECORDS:
+            write_results()
+
+        done = sum(counts.values()) + len(scrapes) + len(unchanged)
+        if done % BATCH_PROGRESS_EVERY == 0:
+            print('===> {} URLs done ({:.1f} URLs/s)'.format(done, done / (time.perf_counter() - started)),
+                  file=sys.stderr)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight = {}
+            for url in read_urls(url_file):
+                # The store is only used on this thread
+                previous = store.fingerprints_for(url)
+                future = executor.submit(batch_scrape, session, parse_pool, url,
+                                         previous['body'] if previous is not None else None)
+                in_flight[future] = (url, previous)
+                # A few URLs per worker are queued at a time, however long the list is
+                if len(in_flight) >= workers * 2:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        take_result(future, *in_flight.pop(future))
+            for future in list(in_flight):
+                take_result(future, *in_flight.pop(future))
+    finally:
+        write_results()
+        parse_pool.close()
+        session.close()
+        store.close()
+
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    print('===> Scraped {} URLs in {:.1f}s ({:.1f} URLs/s)'.format(total, elapsed, total / elapsed if elapsed else 0))
+    print('     new: {new}  changed: {changed}  unchanged: {unchanged}  failed: {failed}'.format(**counts))
+    return 1 if counts['failed'] else 0
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape websites from an interactive menu, or a list of URLs with --batch")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="scrape every URL in FILE, one per line (- for stdin), without the menu")
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS,
+                        help="URLs fetched at once in batch mode (default {})".format(BATCH_WORKERS))
+    return parser.parse_args(argv)
+
+
+def main():
+    """
+    This function run the interactive menu
+    """
+    # The store is opened once; every menu action works on it directly
+    store = open_store()
+
+    # Here I used infinite loop because i don't want to run it again and again.
+    while True:
+
+        print("""  ================ Welcome to this scraping program =============
     ==>> press 1 for checking existing scraped websites
     ==>> press 2 for scrap a single website
     ==>> press 3 for exit
+    ==>> press 4 for export tables of a scraped website
+    ==>> press 5 for change log of a scraped website
+    ==>> press 6 for search scraped websites
     """)
 
-    choice = int(input("==>> Please enter your choice :"))
-
-    # Load json function called for fetching/creating data from json file.
-    local_json_db = load_json()
-    existing_scraped_data_init(local_json_db)
+        choice = int(input("==>> Please enter your choice :"))
 
-    if choice == 1:
-        # I used Beautiful table for presenting scraped data in a good way !!
-        # you guys can read more about from this link https://beautifultable.readthedocs.io/en/latest/index.html
-        scraped_websites_table = BeautifulTable()
-        scraped_websites_table.columns.header = ["Sr no.", "Allias name ", "Website domain", "title",   "Scraped at", "Status"]
-        scraped_websites_table.set_style(BeautifulTable.STYLE_BOX_DOUBLED)
+        if choice == 1:
+            # I used Beautiful table for presenting scraped data in a good way !!
+            # you guys can read more about from this link https://beautifultable.readthedocs.io/en/latest/index.html
+            scraped_websites_table = BeautifulTable()
+            scraped_websites_table.columns.header = ["Sr no.", "Allias name ", "Website domain", "title",   "Scraped at", "Status"]
+            scraped_websites_table.set_style(BeautifulTable.STYLE_BOX_DOUBLED)
         
 
-        local_json_db = load_json()
-        for count,  data in enumerate(local_json_db['scraped_data']):
-           scraped_websites_table.rows.append([count + 1, 
-                            local_json_db['scraped_data'][data]['alias'], 
-                            local_json_db['scraped_data'][data]['domain'], 
-                            local_json_db['scraped_data'][data]['title'], 
-                            local_json_db['scraped_data'][data]['scraped_at'], 
-                            local_json_db['scraped_data'][data]['status']])
-        # all_scraped_websites = [websites['name'] for websites in local_json_db['scraped_data']]
-        if not local_json_db['scraped_data']:
-            print('===> No existing data found !!!')
-        print(scraped_websites_table)
+            # Only the summary columns are read, never the stored page data
+            summaries = store.summaries()
+            for count, (alias, domain, title, scraped_at, status) in enumerate(summaries):
+               scraped_websites_table.rows.append([count + 1, alias, domain, title, scraped_at, status])
+            if not summaries:
+                print('===> No existing data found !!!')
+            print(scraped_websites_table)
     
-    elif choice == 2:
-        print()
-        url_for_scrap = input("===> Please enter url you want to scrap:")
-        is_accessable = process_url_request(url_for_scrap)
-        if is_accessable:
-            scraped_data_packet = proccess_beautiful_soup_data(is_accessable)
+        elif choice == 2:
             print()
-            print(' =====> Data scraped successfully !!!')
-            key_for_storing_data = input("enter alias name for saving scraped data :")
-            scraped_data_packet['url'] = url_for_scrap
-            scraped_data_packet['name'] = key_for_storing_data
-            scraped_data_packet['scraped_at'] = scraped_time_is()
-            if key_for_storing_data in  local_json_db['scraped_data']:
-                key_for_storing_data = key_for_storing_data + str(scraped_time_is())
-                print("Provided key is already exist so data stored as : {}".format(key_for_storing_data))
-            scraped_data_packet['alias'] = key_for_storing_data
-            scraped_data_packet['status'] = True
-            scraped_data_packet['domain'] = urlparse(url_for_scrap).netloc
-
-            local_json_db['scraped_data'][key_for_storing_data] = scraped_data_packet
-            print(
-                'scraped data is:', local_json_db['scraped_data'][key_for_storing_data]
-            )
-            save_scraped_data_in_json(local_json_db)
-            # load data
-            local_json_db = load_json()
-            print(' =====> Data saved successfully !!!')
-            print()
-    elif choice == 3:
-        print('Thank you for using !!!')
-        break
+            url_for_scrap = input("===> Please enter url you want to scrap:")
+            is_accessable = fetch_url(url_for_scrap)
+            if is_accessable:
+                previous = store.fingerprints_for(url_for_scrap)
+                # Huge pages (or pages of unknown size) are scraped while they download
+                is_streamed = should_stream(is_accessable.headers.get('Content-Length'))
+                if is_streamed:
+                    scraped_data_packet, body_fingerprint = stream_scraped_data(
+                        is_accessable.iter_content(STREAM_CHUNK_SIZE), header_charset(is_accessable.headers.get('Content-Type')))
+                    is_accessable.close()
+                else:
+                    body_fingerprint = fingerprint(is_accessable.content)
+                # A page scraped before is only stored again when its body changed; other
+                # pages are not even parsed then
+                if previous is not None and previous['body'] == body_fingerprint:
+                    store.mark_checked(url_for_scrap, scraped_time_is())
+                    print(' =====> Page is unchanged, data stored as {} is up to date !!!'.format(previous['alias']))
+                    print()
+                    continue
+                if not is_streamed:
+                    soup = make_soup(response_html(is_accessable), collectors=SCRAPED_COLLECTORS)
+                    scraped_data_packet = proccess_beautiful_soup_data(soup)
+                print()
+                print(' =====> Data scraped successfully !!!')
+                if previous is not None:
+                    key_for_storing_data = previous['alias']
+                else:
+                    key_for_storing_data = input("enter alias name for saving scraped data :")
+                    scraped_data_packet['name'] = key_for_storing_data
+                    if store.contains(key_for_storing_data):
+                        key_for_storing_data = key_for_storing_data + str(scraped_time_is())
+                        print("Provided key is already exist so data stored as : {}".format(key_for_storing_data))
+                scraped_data_packet['url'] = url_for_scrap
+                scraped_data_packet['scraped_at'] = scraped_time_is()
+                scraped_data_packet['alias'] = key_for_storing_data
+                scraped_data_packet['status'] = True
+                scraped_data_packet['domain'] = urlparse(url_for_scrap).netloc
+
+                print(
+                    'scraped data is:', scraped_data_packet
+                )
+                changed = store.save_scrape(scraped_data_packet, body_fingerprint)
+                if previous is None:
+                    print(' =====> Data saved successfully !!!')
+                elif changed:
+                    print(' =====> Changed sections saved to {}: {}'.format(key_for_storing_data, ', '.join(changed)))
+                else:
+                    print(' =====> No section changed, data stored as {} is up to date !!!'.format(key_for_storing_data))
+                print()
+        elif choice == 3:
+            print('Thank you for using !!!')
+            store.close()
+            break
+
+        elif choice == 4:
+            alias = input("===> Please enter alias name of the scraped website:")
+            record = store.get(alias)
+            if record is None:
+                print('===> No scraped data found for {} !!!'.format(alias))
+                continue
+            tables = record.get('all_tables', [])
+            if not tables:
+                print('===> No tables were scraped for {} !!!'.format(alias))
+                continue
+            fmt = input("===> Export format ({}):".format('/'.join(EXPORT_FORMATS))).strip().lower() or 'csv'
+            if fmt not in EXPORT_FORMATS:
+                print("enter a valid format ")
+                continue
+            directory = input("===> Directory to export into:").strip() or alias
+            paths = export_tables(tables, directory, fmt)
+            print(' =====> Exported {} of {} tables to {}'.format(len(paths), len(tables), directory))
+
+        elif choice == 5:
+            alias = input("===> Please enter alias name of the scraped website:")
+            changes = store.changes(alias)
+            if not changes:
+                print('===> No changes recorded for {} !!!'.format(alias))
+                continue
+            change_log_table = BeautifulTable()
+            change_log_table.columns.header = ["Changed at", "Url", "Changed sections"]
+            change_log_table.set_style(BeautifulTable.STYLE_BOX_DOUBLED)
+            for changed_at, url, sections in changes:
+                change_log_table.rows.append([changed_at, url, ', '.join(sections)])
+            print(change_log_table)
+
+        elif choice == 6:
+            query = input("===> Search for (\"quotes\" for a phrase, word* for a prefix):")
+            # Answered from the full-text index; page data is never loaded
+            results = store.search(query)
+            if not results:
+                print('===> Nothing found for {} !!!'.format(query))
+                continue
+            search_table = BeautifulTable()
+            search_table.columns.header = ["Allias name ", "Url", "title", "Match"]
+            search_table.set_style(BeautifulTable.STYLE_BOX_DOUBLED)
+            for alias, url, title, snippet in results:
+                search_table.rows.append([alias, url, title, snippet])
+            print(search_table)
+
+        else:
+            print("enter a valid choice ")
 
-    elif choice == 4:
-        print('Thank you for using !!!')
-        break
 
-    else:
-        print("enter a valid choice ")
\ No newline at end of file
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    if arguments.batch:
+        sys.exit(run_batch(arguments.batch, max(1, arguments.workers)))
+    main()
@@ -3,8 +3,15 @@ from tkinter import ttk, scrolledtext, messagebox, filedialog
 import json
 import requests
 from datetime import datetime
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urljoin
 from bs4 import BeautifulSoup
+from extraction import extract_page, collectors_for_options
+from parsing import make_soup, PARSER_BACKENDS, resolve_parser
+from text_encoding import decode_html, header_charset
+from thumbnails import ThumbnailPipeline, DRAIN_INTERVAL_MS
+from virtual_view import VirtualTreeview, TableBrowser
+from tables import typed_tables, export_tables, EXPORT_FORMATS
+from crawl_frontier import CrawlFrontier, crawl_dir_for, run_crawl, engine_page_loader, MAX_DEPTH
 import threading
 import os
 from PIL import Image, ImageTk
@@ -45,6 +52,18 @@ class WebScraperGUI:
         self.scraped_data = {}
         self.current_url = ""
         self.is_scraping = False
+        self.table_records = []
+        
+        # Set by the Pause button; a crawl stops at its next checkpoint
+        self.pause_event = threading.Event()
+        self.crawl_links = []
+        
+        # Images are downloaded and decoded off the Tk thread; finished
+        # thumbnails are picked up here in small batches
+        self.thumbnails = ThumbnailPipeline()
+        self.thumbnail_batch = None
+        self.image_count = 0
+        self.root.after(DRAIN_INTERVAL_MS, self.drain_thumbnails)
         
     def create_url_section(self):
         url_frame = ttk.LabelFrame(self.main_frame, text="URL Input", padding="10")
@@ -57,6 +76,9 @@ class WebScraperGUI:
         self.scrape_button = ttk.Button(url_frame, text="Scrape", command=self.start_scraping)
         self.scrape_button.pack(side=tk.LEFT, padx=5)
         
+        self.pause_button = ttk.Button(url_frame, text="Pause", command=self.pause_crawl, state='disabled')
+        self.pause_button.pack(side=tk.LEFT, padx=5)
+                
     def create_options_section(self):
         options_frame = ttk.LabelFrame(self.main_frame, text="Scraping Options", padding="10")
         options_frame.pack(fill=tk.X, pady=5)
@@ -79,6 +101,13 @@ class WebScraperGUI:
         depth_spinbox = ttk.Spinbox(options_frame, from_=1, to=5, textvariable=self.depth_var, width=5)
         depth_spinbox.pack(side=tk.LEFT, padx=5)
         
+        # Add parser backend option
+        ttk.Label(options_frame, text="Parser:").pack(side=tk.LEFT, padx=5)
+        self.parser_var = tk.StringVar(value=resolve_parser())
+        parser_combobox = ttk.Combobox(options_frame, values=PARSER_BACKENDS, textvariable=self.parser_var,
+                                       state='readonly', width=12)
+        parser_combobox.pack(side=tk.LEFT, padx=5)
+        
     def create_results_section(self):
         results_frame = ttk.Frame(self.main_frame)
         results_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -131,32 +160,28 @@ class WebScraperGUI:
         frame = ttk.Frame(self.notebook)
         self.notebook.add(frame, text="Links")
         
-        # Create treeview for links
-        columns = ('url', 'text')
-        tree = ttk.Treeview(frame, columns=columns, show='headings')
+        # Only the rows on screen exist as Treeview items
+        view = VirtualTreeview(frame, columns=('URL', 'Link Text'), column_width=400)
+        view.pack(fill=tk.BOTH, expand=True)
         
-        # Define headings
-        tree.heading('url', text='URL')
-        tree.heading('text', text='Link Text')
-        
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
-        
-        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        return tree
+        return view
         
     def create_tables_tab(self):
         frame = ttk.Frame(self.notebook)
         self.notebook.add(frame, text="Tables")
         
-        # Create treeview for tables
-        tree = ttk.Treeview(frame)
-        tree.pack(fill=tk.BOTH, expand=True)
+        # Export every table of the page at once
+        export_frame = ttk.Frame(frame)
+        export_frame.pack(fill=tk.X)
+        for fmt in EXPORT_FORMATS:
+            ttk.Button(export_frame, text=f"Export {fmt.upper()}",
+                       command=lambda fmt=fmt: self.export_tables(fmt)).pack(side=tk.RIGHT, padx=5)
+        
+        # One virtual view shared by every table on the page
+        browser = TableBrowser(frame)
+        browser.pack(fill=tk.BOTH, expand=True)
         
-        return tree
+        return browser
         
     def create_metadata_tab(self):
         frame = ttk.Frame(self.notebook)
@@ -183,19 +208,45 @@ class WebScraperGUI:
             url = 'https://' + url
             
         self.current_url = url
+        
+        # Depth 1 scrapes the page itself; deeper crawls follow its links
+        depth = self.crawl_depth()
+        target, args = self.scrape_website, ()
+        if depth > 1:
+            crawl_dir = crawl_dir_for(url, depth)
+            if CrawlFrontier.exists(crawl_dir) and not messagebox.askyesno(
+                    "Resume crawl", f"An unfinished crawl of {url} was found. Resume it?"):
+                CrawlFrontier.remove(crawl_dir)
+            target, args = self.crawl_website, (CrawlFrontier(crawl_dir, url, depth),)
+            
         self.is_scraping = True
         self.status_var.set("Scraping...")
         self.scrape_button.config(state='disabled')
         
         # Start scraping in a separate thread
-        threading.Thread(target=self.scrape_website, daemon=True).start()
+        threading.Thread(target=target, args=args, daemon=True).start()
         
+    def crawl_depth(self):
+        try:
+            return max(1, min(int(self.depth_var.get()), MAX_DEPTH))
+        except ValueError:
+            return 1
+            
+    def pause_crawl(self):
+        self.pause_event.set()
+        self.pause_button.config(state='disabled')
+        self.status_var.set("Pausing after the current pages...")
+                
     def scrape_website(self):
         try:
             response = requests.get(self.current_url)
             if response.status_code == 200:
-                soup = BeautifulSoup(response.text, 'html.parser')
-                self.process_scraped_data(soup)
+                # Only build the parts of the tree the enabled options need
+                collectors = collectors_for_options({name: var.get() for name, var in self.options.items()})
+                # Decoded once from the bytes; requests would run detection over the whole body
+                content = decode_html(response.content, header_charset(response.headers.get('Content-Type')))
+                soup = make_soup(content, self.parser_var.get(), collectors)
+                self.process_scraped_data(soup, collectors)
             else:
                 messagebox.showerror("Error", f"Failed to access URL. Status code: {response.status_code}")
         except Exception as e:
@@ -205,157 +256,224 @@ class WebScraperGUI:
             self.status_var.set("Ready")
             self.scrape_button.config(state='normal')
             
-    def process_scraped_data(self, soup):
-        # Clear previous data
-        for widget in self.tabs['images'].winfo_children():
-            widget.destroy()
+    def crawl_website(self, frontier):
+        self.pause_event.clear()
+        self.root.after(0, self.start_crawl_views)
+        self.root.after(0, lambda: self.pause_button.config(state='normal'))
+        
+        # Links are always collected, since the crawl follows them
+        enabled = {name: var.get() for name, var in self.options.items()}
+        enabled['links'] = True
+        collectors = collectors_for_options(enabled)
+        parser = self.parser_var.get()
+        
+        def handle_page(url, depth, content):
+            page = extract_page(make_soup(content, parser, collectors), collectors)
+            links = [(urljoin(url, link['url']), link['text'].strip()) for link in page['links'] if link['url']]
+            if enabled['tables']:
+                tables = typed_tables(page['tables'])
+            else:
+                tables = []
+            self.root.after(0, self.add_crawled_page, url, page, links, tables)
+            return [link for link, _ in links]
+            
+        def batch_done(stats):
+            message = f"Crawled {stats['visited']} pages, {stats['pending']} queued"
+            self.root.after(0, self.refresh_crawl_views, message)
+            
+        status = 'failed'
+        try:
+            status = run_crawl(frontier, engine_page_loader(self.thumbnails.engine), handle_page,
+                               self.pause_event, batch_done)
+            if frontier.finished:
+                status = 'done'
+        except Exception as e:
+            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+        finally:
+            frontier.close()
+            if status == 'done':
+                CrawlFrontier.remove(frontier.directory)
+            self.root.after(0, self.finish_crawl, status)
+            
+    def start_crawl_views(self):
+        self.crawl_links = []
+        self.table_records = []
+        self.crawled_images = set()
+        self.tabs['text'].delete(1.0, tk.END)
+        self.tabs['metadata'].delete(1.0, tk.END)
+        self.thumbnails.start([])
+        
+    def add_crawled_page(self, url, page, links, tables):
+        # Text and images are appended page by page; the links and tables
+        # views are refreshed once per batch
+        if self.options['text'].get():
+            self.tabs['text'].insert(tk.END, f"===== {url} =====\n\n{self.extract_text_content(page)}\n")
+            
+        if self.options['images'].get():
+            image_urls = [urljoin(url, img['src']) for img in page['images'] if img['src']]
+            new_urls = [img_url for img_url in image_urls if img_url not in self.crawled_images]
+            self.crawled_images.update(new_urls)
+            self.thumbnails.extend(new_urls)
+            
+        self.crawl_links.extend(links)
+        self.table_records.extend(tables)
+        
+        if self.options['metadata'].get() and page['title']:
+            self.tabs['metadata'].insert(tk.END, f"{url}: {page['title'].strip()}\n")
+            
+    def refresh_crawl_views(self, message):
+        if self.options['links'].get():
+            self.tabs['links'].set_rows(self.crawl_links)
+        if self.options['tables'].get():
+            self.tabs['tables'].set_records(self.table_records)
+        self.status_var.set(message)
+        
+    def finish_crawl(self, status):
+        self.is_scraping = False
+        self.scrape_button.config(state='normal')
+        self.pause_button.config(state='disabled')
+        if status == 'paused':
+            self.status_var.set("Crawl paused; scrape the same URL with the same depth to resume")
+        elif status == 'done':
+            self.status_var.set(f"Crawl finished: {self.status_var.get()}")
+        else:
+            self.status_var.set("Ready")
+            
+    def process_scraped_data(self, soup, collectors):
+        # Extract everything the enabled options need in one pass over the tree
+        page = extract_page(soup, collectors)
             
         # Process text content
         if self.options['text'].get():
-            text_content = self.extract_text_content(soup)
+            text_content = self.extract_text_content(page)
             self.tabs['text'].delete(1.0, tk.END)
             self.tabs['text'].insert(tk.END, text_content)
             
         # Process images
         if self.options['images'].get():
-            self.process_images(soup)
+            self.process_images(page)
+        else:
+            # An empty batch clears the previous images
+            self.thumbnails.start([])
             
         # Process links
         if self.options['links'].get():
-            self.process_links(soup)
+            self.process_links(page)
             
         # Process tables
         if self.options['tables'].get():
-            self.process_tables(soup)
+            self.process_tables(page)
             
         # Process metadata
         if self.options['metadata'].get():
-            self.process_metadata(soup)
+            self.process_metadata(page)
             
-    def extract_text_content(self, soup):
+    def extract_text_content(self, page):
         text_content = []
         
         # Extract headings
         for tag in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-            for heading in soup.find_all(tag):
-                text_content.append(f"{tag.upper()}: {heading.get_text().strip()}\n")
+            for heading in page['headings'][tag]:
+                text_content.append(f"{tag.upper()}: {heading.strip()}\n")
                 
         # Extract paragraphs
-        for paragraph in soup.find_all('p'):
-            text_content.append(paragraph.get_text().strip() + "\n")
+        for paragraph in page['paragraphs']:
+            text_content.append(paragraph.strip() + "\n")
             
         return "\n".join(text_content)
         
-    def process_images(self, soup):
-        images = soup.find_all('img')
-        row = 0
-        col = 0
-        max_cols = 3
+    def process_images(self, page):
+        image_urls = []
         
-        for img in images:
-            try:
-                img_url = img.get('src', '')
-                if not img_url:
-                    continue
-                    
-                if not img_url.startswith(('http://', 'https://')):
-                    img_url = urlparse(self.current_url).scheme + '://' + urlparse(self.current_url).netloc + img_url
-                    
-                # Download image
-                response = requests.get(img_url)
-                if response.status_code == 200:
-                    # Create image frame
-                    img_frame = ttk.Frame(self.tabs['images'])
-                    img_frame.grid(row=row, column=col, padx=5, pady=5)
-                    
-                    # Convert to PhotoImage
-                    img_data = Image.open(BytesIO(response.content))
-                    img_data.thumbnail((200, 200))
-                    photo = ImageTk.PhotoImage(img_data)
-                    
-                    # Create label with image
-                    label = ttk.Label(img_frame, image=photo)
-                    label.image = photo  # Keep reference
-                    label.pack()
-                    
-                    # Add URL label
-                    ttk.Label(img_frame, text=img_url, wraplength=200).pack()
-                    
-                    col += 1
-                    if col >= max_cols:
-                        col = 0
-                        row += 1
-            except Exception as e:
-                print(f"Error processing image: {str(e)}")
+        for img in page['images']:
+            img_url = img['src'] or ''
+            if not img_url:
+                continue
+                
+            if not img_url.startswith(('http://', 'https://')):
+                img_url = urlparse(self.current_url).scheme + '://' + urlparse(self.current_url).netloc + img_url
                 
-    def process_links(self, soup):
-        # Clear previous items
-        for item in self.tabs['links'].get_children():
-            self.tabs['links'].delete(item)
+            image_urls.append(img_url)
             
-        # Add new links
-        for link in soup.find_all('a'):
-            url = link.get('href', '')
-            text = link.get_text().strip()
+        # Downloads and decoding run in the background; see drain_thumbnails
+        self.thumbnails.start(image_urls)
+        
+    def drain_thumbnails(self):
+        if self.thumbnail_batch != self.thumbnails.batch:
+            # A new scrape started: clear the previous images
+            for widget in self.tabs['images'].winfo_children():
+                widget.destroy()
+            self.thumbnail_batch = self.thumbnails.batch
+            self.image_count = 0
+            
+        self.thumbnails.drain(self.add_thumbnail)
+        self.root.after(DRAIN_INTERVAL_MS, self.drain_thumbnails)
+        
+    def add_thumbnail(self, img_url, thumbnail):
+        if thumbnail is None:
+            return
+            
+        max_cols = 3
+        row, col = divmod(self.image_count, max_cols)
+        self.image_count += 1
+        
+        # Create image frame
+        img_frame = ttk.Frame(self.tabs['images'])
+        img_frame.grid(row=row, column=col, padx=5, pady=5)
+        
+        # Create label with image
+        photo = ImageTk.PhotoImage(thumbnail)
+        label = ttk.Label(img_frame, image=photo)
+        label.image = photo  # Keep reference
+        label.pack()
+        
+        # Add URL label
+        ttk.Label(img_frame, text=img_url, wraplength=200).pack()
+                
+    def process_links(self, page):
+        rows = []
+        for link in page['links']:
+            url = link['url'] or ''
+            text = link['text'].strip()
             
             if url:
                 if not url.startswith(('http://', 'https://')):
                     url = urlparse(self.current_url).scheme + '://' + urlparse(self.current_url).netloc + url
                     
-                self.tabs['links'].insert('', 'end', values=(url, text))
+                rows.append((url, text))
                 
-    def process_tables(self, soup):
-        # Clear previous items
-        for item in self.tabs['tables'].get_children():
-            self.tabs['tables'].delete(item)
-            
-        # Process tables
-        tables = soup.find_all('table')
-        for i, table in enumerate(tables):
-            # Create frame for table
-            table_frame = ttk.Frame(self.tabs['tables'])
-            table_frame.pack(fill=tk.X, padx=5, pady=5)
-            
-            # Add table number
-            ttk.Label(table_frame, text=f"Table {i+1}").pack()
-            
-            # Create treeview for table data
-            columns = []
-            for th in table.find_all('th'):
-                columns.append(th.get_text().strip())
-                
-            if not columns:
-                # If no headers, use column numbers
-                max_cols = max(len(row.find_all(['td', 'th'])) for row in table.find_all('tr'))
-                columns = [f"Column {i+1}" for i in range(max_cols)]
+        # Widgets are only touched from the Tk main thread
+        self.root.after(0, self.tabs['links'].set_rows, rows)
                 
-            tree = ttk.Treeview(table_frame, columns=columns, show='headings')
+    def process_tables(self, page):
+        # Types are inferred per column, so numbers and dates sort as such
+        self.table_records = typed_tables(page['tables'])
+        self.root.after(0, self.tabs['tables'].set_records, self.table_records)
+        
+    def export_tables(self, fmt):
+        if not self.table_records:
+            messagebox.showinfo("Export", "No tables to export")
+            return
             
-            # Configure columns
-            for col in columns:
-                tree.heading(col, text=col)
-                tree.column(col, width=100)
-                
-            # Add data
-            for row in table.find_all('tr')[1:]:  # Skip header row
-                cells = row.find_all(['td', 'th'])
-                values = [cell.get_text().strip() for cell in cells]
-                tree.insert('', 'end', values=values)
-                
-            tree.pack(fill=tk.X)
+        directory = filedialog.askdirectory()
+        if not directory:
+            return
+            
+        paths = export_tables(self.table_records, directory, fmt)
+        if len(paths) == len(self.table_records):
+            messagebox.showinfo("Export", f"Exported {len(paths)} tables to {directory}")
+        else:
+            messagebox.showerror("Export", f"Exported {len(paths)} of {len(self.table_records)} tables; see the log for errors")
             
-    def process_metadata(self, soup):
+    def process_metadata(self, page):
         metadata = []
         
         # Title
-        title = soup.find('title')
-        if title:
-            metadata.append(f"Title: {title.get_text().strip()}")
+        if page['title']:
+            metadata.append(f"Title: {page['title'].strip()}")
             
         # Meta tags
-        for meta in soup.find_all('meta'):
-            name = meta.get('name', '') or meta.get('property', '')
-            content = meta.get('content', '')
+        for name, content in page['meta'].items():
             if name and content:
                 metadata.append(f"{name}: {content}")
                 